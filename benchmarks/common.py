@@ -0,0 +1,63 @@
+"""
+Helpers for benchmarks run against local Postgres/Redis configured in .env:
+
+    PYTHONPATH=src python -m benchmarks.<name>
+"""
+
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from db import engine
+
+
+class RoundTrips:
+    """Counts statements and transaction control commands sent to the database"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _inc(self, *args, **kwargs):
+        self.count += 1
+
+
+@contextmanager
+def count_round_trips():
+    counter = RoundTrips()
+    sync_engine = engine.sync_engine
+    events = ('before_cursor_execute', 'begin', 'commit', 'rollback')
+    for name in events:
+        event.listen(sync_engine, name, counter._inc)
+    try:
+        yield counter
+    finally:
+        for name in events:
+            event.remove(sync_engine, name, counter._inc)
+
+
+async def measure(name: str, func: Callable[[int], Awaitable], iterations: int) -> dict:
+    """Run func(i) sequentially, report latency percentiles and round trips per call"""
+    timings = []
+    with count_round_trips() as round_trips:
+        for i in range(iterations):
+            started = time.perf_counter()
+            await func(i)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    result = {
+        'name': name,
+        'iterations': iterations,
+        'round_trips': round_trips.count / iterations,
+        'mean_ms': statistics.fmean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[int(len(timings) * 0.95) - 1],
+    }
+    print(
+        f'{name:<32} round trips: {result["round_trips"]:>5.1f}  '
+        f'mean: {result["mean_ms"]:>7.2f}ms  p50: {result["p50_ms"]:>7.2f}ms  p95: {result["p95_ms"]:>7.2f}ms'
+    )
+    return result
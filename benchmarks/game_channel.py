@@ -0,0 +1,156 @@
+"""
+Game channel fan-out: thousands of WebSocket subscribers of a game on a single uvicorn worker.
+The worker runs in a subprocess, subscribers share this one, so fan-out latency includes their receiving.
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import UTC, datetime
+
+import httpx
+import websockets
+from sqlalchemy import delete
+from sqlmodel import select
+
+from db import Game, Theme, User, async_session
+from utils.oauth import generate_aux_token
+
+SUBSCRIBERS = 2000
+UPDATES = 20
+CONNECT_CONCURRENCY = 100
+PORT = 8765
+EMAIL = 'bench-spectator@example.com'
+THEME = 'bench channel theme'
+
+# Regression bound, generous enough for a laptop
+MAX_P95_MS = 1000
+
+
+async def seed() -> tuple[str, int]:
+    """Token of the game owner and id of the game"""
+    async with async_session() as db:
+        user = User(email=EMAIL, picture='')
+        theme = Theme(name=THEME, language='en', description={'teams': []}, creator=user)
+        game = Game(
+            theme=theme,
+            started_at=datetime.now(UTC),
+            points=0,
+            info={'teams': [], 'current_team_index': 0, 'current_round': 0},
+            starter=user,
+        )
+        db.add(game)
+        await db.commit()
+        return await generate_aux_token(user), game.id
+
+
+async def cleanup():
+    async with async_session() as db:
+        user_ids = select(User.id).where(User.email == EMAIL)
+        await db.execute(delete(Game).where(Game.started_by.in_(user_ids)))
+        await db.execute(delete(Theme).where(Theme.name == THEME))
+        await db.execute(delete(User).where(User.email == EMAIL))
+        await db.commit()
+
+
+def start_worker() -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(PORT), '--log-level', 'warning'],
+        cwd=os.path.join(os.path.dirname(__file__), '..', 'src'),
+    )
+
+
+async def wait_for_worker(http: httpx.AsyncClient):
+    for _ in range(100):
+        try:
+            await http.get('/ping')
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('Worker has not started')
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+async def subscribe(game_id: int, token: str, arrivals: dict[int, list[float]], limit: asyncio.Semaphore):
+    async with limit:
+        websocket = await websockets.connect(f'ws://127.0.0.1:{PORT}/games/{game_id}/channel')
+        await websocket.send(json.dumps({'token': token}))
+        await websocket.recv()
+
+    async def receive():
+        async for message in websocket:
+            arrivals.setdefault(json.loads(message)['version'], []).append(time.perf_counter())
+
+    return websocket, asyncio.create_task(receive())
+
+
+async def main():
+    await cleanup()
+    token, game_id = await seed()
+    worker = start_worker()
+    subscribers = []
+
+    try:
+        async with httpx.AsyncClient(
+            base_url=f'http://127.0.0.1:{PORT}', headers={'Authorization': f'Bearer {token}'}, timeout=30
+        ) as http:
+            await wait_for_worker(http)
+            idle_rss = rss_bytes(worker.pid)
+
+            arrivals: dict[int, list[float]] = {}
+            started = time.perf_counter()
+            limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+            subscribers = await asyncio.gather(
+                *(subscribe(game_id, token, arrivals, limit) for _ in range(SUBSCRIBERS))
+            )
+            connect_s = time.perf_counter() - started
+            rss_per_subscriber = (rss_bytes(worker.pid) - idle_rss) / SUBSCRIBERS
+            print(f'{SUBSCRIBERS} subscribers connected in {connect_s:.1f}s, {rss_per_subscriber / 1024:.1f}KiB each')
+
+            timings = []
+            for seq in range(1, UPDATES + 1):
+                sent = time.perf_counter()
+                response = await http.post(
+                    f'/games/{game_id}/events',
+                    json={
+                        'first_seq': seq,
+                        'events': [{'kind': 'round_ended', 'occurred_at': datetime.now(UTC).isoformat()}],
+                    },
+                )
+                version = response.json()['version']
+                while len(arrivals.get(version, ())) < SUBSCRIBERS:
+                    if time.perf_counter() - sent > 10:
+                        raise RuntimeError(f'Update {version} reached {len(arrivals.get(version, ()))} subscribers')
+                    await asyncio.sleep(0.001)
+                timings.append((max(arrivals[version]) - sent) * 1000)
+
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(
+                f'fan-out to all subscribers  mean: {statistics.fmean(timings):>7.2f}ms  '
+                f'p50: {timings[len(timings) // 2]:>7.2f}ms  p95: {p95:>7.2f}ms'
+            )
+    finally:
+        for websocket, receiver in subscribers:
+            receiver.cancel()
+            await websocket.close()
+        worker.terminate()
+        worker.wait()
+        await cleanup()
+
+    assert p95 < MAX_P95_MS
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+Game listings of players among millions of games: with the game listing indexes vs. without.
+Games are seeded and the indexes are dropped inside a transaction which is rolled back; run VACUUM afterwards, as
+millions of dead rows are left behind and skew the query plans of a small local database.
+"""
+
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import measure
+from dal import apply_games_ordering, get_active_games, get_filtered_games, get_games_version
+from db import User, engine
+
+ITERATIONS = 50
+GAMES = 2_000_000
+USERS = 10_000
+PAGE_SIZE = 50
+RESUME_SIZE = 10
+EMAIL = 'bench-gamer-{}@example.com'
+INDEXES = ('ix_games_started_by', 'ix_games_started_by_theme', 'ix_games_started_by_active')
+
+# Regression bound of the resume path with the indexes, generous enough for a laptop
+MAX_P95_MS = 5
+
+# The first user has played a tenth of all games, the others a couple hundred each.
+# One game in a thousand is in progress.
+# Users and themes are analyzed before games are seeded, otherwise the foreign key checks scan them.
+SEED = [
+    """
+    INSERT INTO users (email, picture, admin, created_at, updated_at)
+    SELECT replace(:email, '{}', n::text), '', false, now(), now() FROM generate_series(0, :users - 1) n
+    """,
+    """
+    INSERT INTO themes (name, language, description, played_count, public, difficulty, verified, likes_count,
+                        created_at, updated_at)
+    SELECT 'bench gamer theme ' || n, 'en', '{}'::jsonb, 0, true, 1, true, 0, now(), now()
+    FROM generate_series(0, 99) n
+    """,
+    'ANALYZE users, themes',
+    """
+    INSERT INTO games (theme_id, started_by, started_at, ended_at, info, points, round, skip_penalty,
+                       created_at, updated_at)
+    SELECT :theme_id + n % 100, :user_id + CASE WHEN n % 10 = 0 THEN 0 ELSE n % :users END,
+           now(), CASE WHEN n % 1000 <> 0 THEN now() END, '{}'::jsonb, 0, 30, true, now(), now()
+    FROM generate_series(1, :games) n
+    """,
+    'ANALYZE games',
+]
+
+
+async def seed(db: AsyncSession) -> tuple[dict[str, User], int]:
+    """Players with a long and a short history and one of the themes"""
+    params = {'email': EMAIL, 'users': USERS, 'games': GAMES}
+    users, themes, analyze_references, games, analyze = SEED
+    for statement in users, themes, analyze_references:
+        await db.execute(text(statement), params)
+    user_id = await db.scalar(text('SELECT id FROM users WHERE email = :email'), {'email': EMAIL.format(0)})
+    theme_id = await db.scalar(text("SELECT min(id) FROM themes WHERE name LIKE 'bench gamer theme %'"))
+    await db.execute(text(games), params | {'user_id': user_id, 'theme_id': theme_id})
+    await db.execute(text(analyze))
+    players = {
+        'long history': User(id=user_id, email=EMAIL.format(0), admin=False),
+        'short history': User(id=user_id + 1, email=EMAIL.format(1), admin=False),
+    }
+    return players, theme_id
+
+
+async def measure_listings(db: AsyncSession, user: User, theme_id: int, label: str) -> dict:
+    async def resume(i: int):
+        await get_active_games(db, user, RESUME_SIZE)
+
+    async def page(query):
+        ordered = await apply_games_ordering(query, descending=True)
+        await db.execute(ordered.limit(PAGE_SIZE))
+
+    async def ended_page(i: int):
+        await page(await get_filtered_games(user, ended=True))
+
+    async def theme_page(i: int):
+        await page(await get_filtered_games(user, theme_id))
+
+    async def active_page(i: int):
+        await page(await get_filtered_games(user, ended=False))
+
+    async def ended_version(i: int):
+        await get_games_version(db, await get_filtered_games(user, ended=True))
+
+    result = await measure(f'{label}: resume', resume, ITERATIONS)
+    await measure(f'{label}: ended page', ended_page, ITERATIONS)
+    await measure(f'{label}: theme page', theme_page, ITERATIONS)
+    await measure(f'{label}: in progress page', active_page, ITERATIONS)
+    await measure(f'{label}: ended ETag', ended_version, ITERATIONS)
+    return result
+
+
+async def main():
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            db = AsyncSession(bind=conn)
+            players, theme_id = await seed(db)
+            indexed = [
+                await measure_listings(db, user, theme_id, f'indexed, {history}') for history, user in players.items()
+            ]
+
+            for name in INDEXES:
+                await db.execute(text(f'DROP INDEX {name}'))
+            for history, user in players.items():
+                await measure_listings(db, user, theme_id, f'no indexes, {history}')
+        finally:
+            await transaction.rollback()
+
+    assert all(result['p95_ms'] < MAX_P95_MS for result in indexed)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
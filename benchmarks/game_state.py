@@ -0,0 +1,92 @@
+"""Turn update of a game in progress: UPDATE ... RETURNING in Postgres vs. script on the game kept in Redis"""
+
+import asyncio
+import time
+import uuid
+from datetime import UTC, datetime
+
+from benchmarks.common import measure
+from benchmarks.game_update import EMAIL, GAME_SIZES, ITERATIONS, cleanup, seed_game, turn, update_game
+from cache import close_cache, get_cache, init_cache
+from dal import get_game_details
+from db import User, async_session
+from schemas.game import GameDetailsResponse, GameUpdatePayload
+from utils.game_states import GameState, GameStateStore
+
+FLUSHED_GAMES = 500
+INFO = {'teams': [{'name': 'a', 'score': 0}, {'name': 'b', 'score': 0}], 'current_team_index': 0, 'current_round': 1}
+
+# Regression bound of the Redis path on the largest game, generous enough for a laptop
+MAX_P95_MS = 20
+
+
+async def load(states: GameStateStore, user: User, game_id: int):
+    async with async_session() as db:
+        game, words_guessed, words_skipped = await get_game_details(db, user, game_id)
+    details = GameDetailsResponse.model_validate(
+        game, update={'theme_id': 0, 'info': INFO, 'words_guessed': words_guessed, 'words_skipped': words_skipped}
+    )
+    state = GameState(game=details, user_id=user.id, event_seq=0, updated_at=game.updated_at, theme_updated_at=None)
+    await states.load(await get_cache(), state)
+
+
+def update_state(states: GameStateStore, user: User, game_id: int):
+    async def run(i: int):
+        guessed, skipped = turn(i)
+        progress = GameUpdatePayload(info=INFO, words_guessed=guessed, words_skipped=skipped)
+        await states.update(await get_cache(), user.id, game_id, progress, datetime.now(UTC))
+
+    return run
+
+
+def update_row(user: User, game_id: int):
+    async def run(i: int):
+        async with async_session() as db:
+            await update_game(db, user, game_id, *turn(i))
+
+    return run
+
+
+async def main():
+    await cleanup()
+    await init_cache()
+    states = GameStateStore(f'bench:game:{uuid.uuid4().hex}', ttl=600, interval=5, batch_size=500, lock_ttl=60)
+    async with async_session() as db:
+        user = User(email=EMAIL, picture='')
+        db.add(user)
+        await db.commit()
+
+    try:
+        for size in GAME_SIZES:
+            async with async_session() as db:
+                row_game_id = await seed_game(db, user, size)
+                game_id = await seed_game(db, user, size)
+            await load(states, user, game_id)
+            await measure(f'{size} words, UPDATE RETURNING', update_row(user, row_game_id), ITERATIONS)
+            result = await measure(f'{size} words, Redis', update_state(states, user, game_id), ITERATIONS)
+
+        # Write-behind: many games updated within an interval are written in one batch
+        await states.flush(await get_cache(), states.save)
+        game_ids = []
+        async with async_session() as db:
+            for _ in range(FLUSHED_GAMES):
+                game_ids.append(await seed_game(db, user, 10))
+        for game_id in game_ids:
+            await load(states, user, game_id)
+            await update_state(states, user, game_id)(0)
+        started = time.perf_counter()
+        flushed = await states.flush(await get_cache(), states.save)
+        print(f'flushed {flushed} games in {(time.perf_counter() - started) * 1000:.0f}ms')
+    finally:
+        redis = await get_cache()
+        if keys := await redis.keys(states.key('*')):
+            await redis.delete(*keys)
+        await close_cache()
+        await cleanup()
+
+    assert result['p95_ms'] < MAX_P95_MS
+    assert flushed == FLUSHED_GAMES
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
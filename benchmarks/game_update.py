@@ -0,0 +1,127 @@
+"""Turn update of a growing game: single UPDATE merging words in the database vs. load, merge in Python and write back"""
+
+import asyncio
+from datetime import UTC, datetime
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from benchmarks.common import measure
+from dal import get_game_details, intern_words, update_game_progress
+from db import Game, User, Word, async_session
+
+ITERATIONS = 50
+GAME_SIZES = (100, 1_000, 10_000)
+CONCURRENT_TURNS = 20
+EMAIL = 'bench-player@example.com'
+WORD = 'bench-word-{}'
+INFO = {'teams': [], 'current_team_index': 0, 'current_round': 1}
+
+# Regression bound of the new path on the largest game, generous enough for a laptop
+MAX_P95_MS = 50
+
+
+async def legacy_update_game(db: AsyncSession, user: User, game_id: int, guessed: list[str], skipped: list[str]):
+    """Former update_game: read the game with its words, merge them in Python, write whole arrays back"""
+    game, words_guessed, words_skipped = await get_game_details(db, user, game_id)
+    game.info = INFO
+    game.guessed_word_ids = await intern_words(db, list(set(words_guessed + guessed)))
+    game.skipped_word_ids = await intern_words(db, list(set(words_skipped + skipped)))
+    db.add(game)
+    await db.commit()
+    await db.refresh(game)
+
+
+async def update_game(db: AsyncSession, user: User, game_id: int, guessed: list[str], skipped: list[str]):
+    """Current update_game"""
+    word_ids = await intern_words(db, guessed + skipped)
+    updated = await update_game_progress(
+        db, user, game_id, INFO, word_ids[: len(guessed)], word_ids[len(guessed) :], ended_at=None
+    )
+    assert updated is not None
+    await db.commit()
+
+
+def turn(i: int) -> tuple[list[str], list[str]]:
+    """Two words of the game so far and one new"""
+    return [WORD.format(i), WORD.format(i + 1)], [WORD.format(f'new-{i}')]
+
+
+async def seed_game(db: AsyncSession, user: User, size: int) -> int:
+    word_ids = await intern_words(db, [WORD.format(i) for i in range(size)])
+    game = Game(
+        started_by=user.id,
+        started_at=datetime.now(UTC),
+        points=0,
+        info=INFO,
+        guessed_word_ids=word_ids[::2],
+        skipped_word_ids=word_ids[1::2],
+    )
+    db.add(game)
+    await db.commit()
+    return game.id
+
+
+async def cleanup():
+    async with async_session() as db:
+        user_ids = select(User.id).where(User.email == EMAIL)
+        await db.execute(delete(Game).where(Game.started_by.in_(user_ids)))
+        await db.execute(delete(User).where(User.email == EMAIL))
+        await db.execute(delete(Word).where(Word.word.like(WORD.format('%'))))
+        await db.commit()
+
+
+def run_with(update, user: User, game_id: int):
+    async def run(i: int):
+        async with async_session() as db:
+            await update(db, user, game_id, *turn(i))
+
+    return run
+
+
+async def played_words(user: User, game_id: int) -> int:
+    async with async_session() as db:
+        _, words_guessed, words_skipped = await get_game_details(db, user, game_id)
+        return len(set(words_guessed) | set(words_skipped))
+
+
+async def lost_words(update, user: User, size: int) -> int:
+    """Words missing from a game after concurrent turns, each turn plays one new word"""
+    async with async_session() as db:
+        game_id = await seed_game(db, user, size)
+    await asyncio.gather(*(run_with(update, user, game_id)(i) for i in range(CONCURRENT_TURNS)))
+    return size + CONCURRENT_TURNS - await played_words(user, game_id)
+
+
+async def main():
+    await cleanup()
+    async with async_session() as db:
+        user = User(email=EMAIL, picture='')
+        db.add(user)
+        await db.commit()
+
+    try:
+        for size in GAME_SIZES:
+            async with async_session() as db:
+                legacy_game_id = await seed_game(db, user, size)
+                game_id = await seed_game(db, user, size)
+            await measure(f'{size} words, load + merge', run_with(legacy_update_game, user, legacy_game_id), ITERATIONS)
+            current_result = await measure(
+                f'{size} words, UPDATE RETURNING', run_with(update_game, user, game_id), ITERATIONS
+            )
+
+        legacy_lost, current_lost = (
+            await lost_words(legacy_update_game, user, 100),
+            await lost_words(update_game, user, 100),
+        )
+        print(f'words lost by {CONCURRENT_TURNS} concurrent turns: legacy {legacy_lost}, current {current_lost}')
+    finally:
+        await cleanup()
+
+    assert current_result['p95_ms'] < MAX_P95_MS
+    assert current_lost == 0
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Login write path: single-statement upsert vs. select/insert/commit per table"""
+
+import asyncio
+from datetime import UTC, datetime
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from benchmarks.common import measure
+from dal import login_user
+from db import Auth, User, async_session
+
+ITERATIONS = 500
+USERS = 50
+EMAIL = 'bench-login-{}@example.com'
+
+
+async def legacy_login(id_token_payload: dict, db: AsyncSession, id_token: str, access_token: str) -> User:
+    """Former get_or_create_user + update_or_create_auth"""
+    result = await db.execute(select(User).where(User.email == id_token_payload['email']))
+    user = result.scalar_one_or_none()
+
+    if user is None:
+        user = User(
+            email=id_token_payload['email'], picture=id_token_payload.get('picture') or '', last_login=datetime.now(UTC)
+        )
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+
+    result = await db.execute(select(Auth).where(Auth.user_id == user.id))
+    auth = result.scalar_one_or_none()
+
+    if auth:
+        auth.id_token = id_token
+        auth.access_token = access_token
+        auth.updated_at = datetime.now(UTC)
+    else:
+        auth = Auth(user=user, id_token=id_token, access_token=access_token)
+        db.add(auth)
+
+    await db.commit()
+    await db.refresh(auth)
+    return user
+
+
+async def cleanup():
+    async with async_session() as db:
+        emails = [EMAIL.format(i) for i in range(USERS)]
+        user_ids = select(User.id).where(User.email.in_(emails))
+        await db.execute(delete(Auth).where(Auth.user_id.in_(user_ids)))
+        await db.execute(delete(User).where(User.email.in_(emails)))
+        await db.commit()
+
+
+def run_with(login):
+    async def run(i: int):
+        payload = {'email': EMAIL.format(i % USERS), 'picture': f'https://example.com/{i}.png'}
+        async with async_session() as db:
+            await login(payload, db, f'id-token-{i}', f'access-token-{i}')
+
+    return run
+
+
+async def main():
+    await cleanup()
+    legacy = await measure('legacy select/insert/commit', run_with(legacy_login), ITERATIONS)
+    await cleanup()
+    upsert = await measure('single statement upsert', run_with(login_user), ITERATIONS)
+    await cleanup()
+
+    assert upsert['round_trips'] < legacy['round_trips']
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
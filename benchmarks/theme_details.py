@@ -0,0 +1,121 @@
+"""Theme details read path of a popular theme: likes_count + EXISTS probe vs. loading every liker"""
+
+import asyncio
+import tracemalloc
+from typing import NamedTuple
+
+from sqlalchemy import delete, literal, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+
+from benchmarks.common import measure
+from dal import get_available_themes, get_theme_details, reconcile_likes_counts
+from db import Theme, User, UserToFavouriteThemes, async_session
+
+ITERATIONS = 50
+LIKERS = 100_000
+EMAIL = 'bench-liker-{}@example.com'
+THEME = 'bench popular theme'
+
+# Regression bounds of the new path, generous enough for a laptop
+MAX_PEAK_MEMORY_BYTES = 1024 * 1024
+MAX_P95_MS = 50
+
+
+class LegacyThemeDetails(NamedTuple):
+    theme: Theme
+    favourite: bool
+
+
+async def legacy_theme_details(db: AsyncSession, user: User, theme_id: int) -> LegacyThemeDetails | None:
+    """Former get_theme_details followed by len(favourited_by) and user in favourited_by"""
+    query = await get_available_themes(user)
+    result = await db.execute(
+        query.where(Theme.id == theme_id).options(selectinload(Theme.creator), selectinload(Theme.favourited_by))
+    )
+    theme = result.scalar_one_or_none()
+    return LegacyThemeDetails(theme, user in theme.favourited_by)
+
+
+async def seed() -> tuple[int, int]:
+    """Create theme liked by LIKERS users, return (theme id, id of one of the likers)"""
+    async with async_session() as db:
+        await db.execute(
+            text(
+                'INSERT INTO users (email, picture, admin, created_at, updated_at) '
+                "SELECT replace(:email, '{}', n::text), '', false, now(), now() FROM generate_series(0, :n - 1) n "
+                'ON CONFLICT (email) DO NOTHING'
+            ),
+            {'email': EMAIL, 'n': LIKERS},
+        )
+        liker_id = await db.scalar(select(User.id).where(User.email == EMAIL.format(0)))
+
+        theme_id = await db.scalar(
+            insert(Theme)
+            .values(name=THEME, language='en', description={'teams': []}, public=True)
+            .on_conflict_do_update(index_elements=[Theme.name], set_={'public': True})
+            .returning(Theme.id)
+        )
+        likers = select(User.id, literal(theme_id)).where(User.email.like(EMAIL.format('%')))
+        await db.execute(
+            insert(UserToFavouriteThemes).from_select(['user_id', 'theme_id'], likers).on_conflict_do_nothing()
+        )
+        await db.commit()
+
+        await reconcile_likes_counts(db)
+        return theme_id, liker_id
+
+
+async def cleanup():
+    async with async_session() as db:
+        theme_ids = select(Theme.id).where(Theme.name == THEME)
+        await db.execute(delete(UserToFavouriteThemes).where(UserToFavouriteThemes.theme_id.in_(theme_ids)))
+        await db.execute(delete(Theme).where(Theme.name == THEME))
+        await db.execute(delete(User).where(User.email.like(EMAIL.format('%'))))
+        await db.commit()
+
+
+def run_with(get_details, theme_id: int, user: User):
+    async def run(i: int):
+        async with async_session() as db:
+            # By name, the detail row has grown columns before
+            assert (await get_details(db, user, theme_id)).favourite
+
+    return run
+
+
+async def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        await func(0)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def main():
+    await cleanup()
+    theme_id, liker_id = await seed()
+    async with async_session() as db:
+        user = await db.get(User, liker_id)
+
+    try:
+        legacy = run_with(legacy_theme_details, theme_id, user)
+        current = run_with(get_theme_details, theme_id, user)
+
+        legacy_result = await measure('selectinload favourited_by', legacy, ITERATIONS // 10)
+        current_result = await measure('likes_count + EXISTS', current, ITERATIONS)
+        legacy_memory, current_memory = await peak_memory(legacy), await peak_memory(current)
+        print(f'peak memory: legacy {legacy_memory / 2**20:.1f}MiB, current {current_memory / 2**20:.2f}MiB')
+    finally:
+        await cleanup()
+
+    assert current_memory < MAX_PEAK_MEMORY_BYTES
+    assert current_result['p95_ms'] < MAX_P95_MS
+    assert current_result['round_trips'] < legacy_result['round_trips']
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
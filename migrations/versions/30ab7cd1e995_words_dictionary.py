@@ -0,0 +1,152 @@
+"""words dictionary
+
+Revision ID: 30ab7cd1e995
+Revises: a50ff0b79f05
+Create Date: 2026-10-17 01:20:37.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '30ab7cd1e995'
+down_revision: Union[str, Sequence[str], None] = 'a50ff0b79f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Must stay in sync with db.theme_search_vector()
+SEARCH_VECTOR = """
+    setweight(to_tsvector(theme_ts_config(language), name), 'A')
+    || setweight(to_tsvector('simple'::regconfig, name), 'A')
+    || setweight(to_tsvector(theme_ts_config(language), theme_words_text(word_ids)), 'B')
+    || setweight(to_tsvector('simple'::regconfig, theme_words_text(word_ids)), 'B')
+"""
+
+# Search vector of eae3da133c24
+JSONB_SEARCH_VECTOR = """
+    setweight(to_tsvector(theme_ts_config(language), name), 'A')
+    || setweight(to_tsvector('simple'::regconfig, name), 'A')
+    || setweight(jsonb_to_tsvector(theme_ts_config(language), coalesce(description -> 'words', '[]'::jsonb), '["string"]'::jsonb), 'B')
+    || setweight(jsonb_to_tsvector('simple'::regconfig, coalesce(description -> 'words', '[]'::jsonb), '["string"]'::jsonb), 'B')
+"""
+
+
+def word_ids_of(words: str) -> str:
+    """Ids of a JSONB array of words, in the array order"""
+    return f"""coalesce((
+        SELECT array_agg(w.id ORDER BY e.position)
+        FROM jsonb_array_elements_text({words}) WITH ORDINALITY AS e(word, position)
+        JOIN words w ON w.word = e.word
+    ), '{{}}')"""
+
+
+def words_of(word_ids: str) -> str:
+    """JSONB array of words of an id array, in the array order"""
+    return f"""coalesce((
+        SELECT jsonb_agg(w.word ORDER BY u.position)
+        FROM unnest({word_ids}) WITH ORDINALITY AS u(word_id, position)
+        JOIN words w ON w.id = u.word_id
+    ), '[]'::jsonb)"""
+
+
+def create_search_index(vector: str):
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_themes_search',
+            'themes',
+            [sa.text(f'({vector})')],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def drop_search_index():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_themes_search', table_name='themes', postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Expression of the index changes, and rebuilding it once is cheaper than maintaining it while rewriting themes
+    drop_search_index()
+
+    op.create_table(
+        'words',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('word', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('word'),
+    )
+    op.execute("""
+        INSERT INTO words (word)
+        SELECT word FROM (
+            SELECT jsonb_array_elements_text(description -> 'words') FROM themes WHERE description ? 'words'
+            UNION SELECT jsonb_array_elements_text(words_guessed) FROM games WHERE words_guessed IS NOT NULL
+            UNION SELECT jsonb_array_elements_text(words_skipped) FROM games WHERE words_skipped IS NOT NULL
+        ) AS used(word)
+        ORDER BY word
+    """)
+
+    op.add_column('themes', sa.Column('word_ids', postgresql.ARRAY(sa.Integer()), server_default='{}', nullable=False))
+    op.execute(f"""
+        UPDATE themes
+        SET word_ids = {word_ids_of("description -> 'words'")}, description = description - 'words'
+        WHERE description ? 'words'
+    """)
+
+    op.add_column(
+        'games', sa.Column('guessed_word_ids', postgresql.ARRAY(sa.Integer()), server_default='{}', nullable=False)
+    )
+    op.add_column(
+        'games', sa.Column('skipped_word_ids', postgresql.ARRAY(sa.Integer()), server_default='{}', nullable=False)
+    )
+    op.execute(f"""
+        UPDATE games
+        SET guessed_word_ids = {word_ids_of('words_guessed')}, skipped_word_ids = {word_ids_of('words_skipped')}
+        WHERE words_guessed IS NOT NULL OR words_skipped IS NOT NULL
+    """)
+    op.drop_column('games', 'words_skipped')
+    op.drop_column('games', 'words_guessed')
+
+    # Dictionary rows are never updated nor deleted, so the result only depends on the ids.
+    # Table is schema qualified as pg_restore builds indexes with an empty search_path
+    op.execute("""
+        CREATE OR REPLACE FUNCTION theme_words_text(word_ids integer[]) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT coalesce(string_agg(w.word, ' ' ORDER BY u.position), '')
+            FROM unnest(word_ids) WITH ORDINALITY AS u(word_id, position)
+            JOIN public.words w ON w.id = u.word_id
+        $$
+    """)
+    create_search_index(SEARCH_VECTOR)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_search_index()
+    op.execute('DROP FUNCTION IF EXISTS theme_words_text(integer[])')
+
+    op.add_column('games', sa.Column('words_guessed', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('games', sa.Column('words_skipped', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.execute(f"""
+        UPDATE games
+        SET words_guessed = {words_of('guessed_word_ids')}, words_skipped = {words_of('skipped_word_ids')}
+    """)
+    op.drop_column('games', 'skipped_word_ids')
+    op.drop_column('games', 'guessed_word_ids')
+
+    op.execute(f"""
+        UPDATE themes
+        SET description = coalesce(description, '{{}}'::jsonb) || jsonb_build_object('words', {words_of('word_ids')})
+    """)
+    op.drop_column('themes', 'word_ids')
+    op.drop_table('words')
+
+    create_search_index(JSONB_SEARCH_VECTOR)
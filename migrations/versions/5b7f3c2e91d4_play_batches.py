@@ -0,0 +1,36 @@
+"""play batches
+
+Revision ID: 5b7f3c2e91d4
+Revises: d4b8e2a61c37
+Create Date: 2026-10-17 03:02:11.508317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7f3c2e91d4'
+down_revision: Union[str, Sequence[str], None] = 'd4b8e2a61c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'play_batches',
+        sa.Column('id', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+        sa.Column('applied_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_play_batches_applied_at'), 'play_batches', ['applied_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_play_batches_applied_at'), table_name='play_batches')
+    op.drop_table('play_batches')
@@ -0,0 +1,28 @@
+"""game version
+
+Revision ID: 6c1e2f0b9d47
+Revises: 30ab7cd1e995
+Create Date: 2026-10-17 09:12:44.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c1e2f0b9d47'
+down_revision: Union[str, Sequence[str], None] = '30ab7cd1e995'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('games', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('games', 'version')
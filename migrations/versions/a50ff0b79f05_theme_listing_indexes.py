@@ -0,0 +1,55 @@
+"""theme listing indexes
+
+Revision ID: a50ff0b79f05
+Revises: e1aea0517093
+Create Date: 2026-10-17 01:05:41.528310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a50ff0b79f05'
+down_revision: Union[str, Sequence[str], None] = 'e1aea0517093'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Must stay in sync with db.THEMES_CATALOG
+CATALOG = sa.text('verified AND public')
+
+INDEXES = {
+    'ix_themes_catalog': (['language', 'difficulty', 'id'], CATALOG),
+    'ix_themes_catalog_played_count': (['played_count', 'id'], CATALOG),
+    'ix_themes_catalog_last_played': ([sa.text('last_played DESC NULLS LAST'), sa.text('id DESC')], CATALOG),
+    'ix_themes_catalog_likes_count': (['likes_count', 'id'], CATALOG),
+    'ix_themes_public': (['language', 'difficulty', 'id'], sa.text('public')),
+    'ix_themes_created_by': (['created_by', 'id'], None),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build indexes without locking themes for writes
+    with op.get_context().autocommit_block():
+        for name, (columns, where) in INDEXES.items():
+            op.create_index(
+                name,
+                'themes',
+                columns,
+                postgresql_where=where,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    op.execute('ANALYZE themes')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in reversed(INDEXES):
+            op.drop_index(name, table_name='themes', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,45 @@
+"""game events
+
+Revision ID: af0c7b819e6f
+Revises: 6c1e2f0b9d47
+Create Date: 2026-10-17 01:08:49.716205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'af0c7b819e6f'
+down_revision: Union[str, Sequence[str], None] = '6c1e2f0b9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'game_events',
+        sa.Column('game_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+        sa.Column('occurred_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('word_id', sa.Integer(), nullable=True),
+        sa.Column('team_index', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['word_id'], ['words.id']),
+        sa.PrimaryKeyConstraint('game_id', 'seq'),
+    )
+    op.add_column('games', sa.Column('event_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('games', sa.Column('folded_event_seq', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Events not folded into their games yet are lost, fold them (GET /games/{id}) before downgrading
+    op.drop_column('games', 'folded_event_seq')
+    op.drop_column('games', 'event_seq')
+    op.drop_table('game_events')
@@ -0,0 +1,49 @@
+"""game listing indexes
+
+Revision ID: d4b8e2a61c37
+Revises: af0c7b819e6f
+Create Date: 2026-10-17 02:10:24.417931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b8e2a61c37'
+down_revision: Union[str, Sequence[str], None] = 'af0c7b819e6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = {
+    'ix_games_started_by': (['started_by', 'id'], None),
+    'ix_games_started_by_theme': (['started_by', 'theme_id', 'id'], None),
+    'ix_games_started_by_active': (['started_by', 'id'], sa.text('ended_at IS NULL')),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build indexes without locking games for writes
+    with op.get_context().autocommit_block():
+        for name, (columns, where) in INDEXES.items():
+            op.create_index(
+                name,
+                'games',
+                columns,
+                postgresql_where=where,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    op.execute('ANALYZE games')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in reversed(INDEXES):
+            op.drop_index(name, table_name='games', postgresql_concurrently=True, if_exists=True)
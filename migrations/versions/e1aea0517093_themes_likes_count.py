@@ -0,0 +1,74 @@
+"""themes likes count
+
+Revision ID: e1aea0517093
+Revises: eae3da133c24
+Create Date: 2026-10-17 00:41:53.406225
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1aea0517093'
+down_revision: Union[str, Sequence[str], None] = 'eae3da133c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Primary key of favourites was lost when its id column was dropped (7c18ca01681b),
+    # restore it so that duplicated likes can't inflate counters
+    op.execute("""
+        DELETE FROM user_to_favourite_themes a
+        USING user_to_favourite_themes b
+        WHERE a.ctid < b.ctid AND a.user_id = b.user_id AND a.theme_id = b.theme_id
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'user_to_favourite_themes_pkey',
+            'user_to_favourite_themes',
+            ['user_id', 'theme_id'],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+    op.execute(
+        'ALTER TABLE user_to_favourite_themes '
+        'ADD CONSTRAINT user_to_favourite_themes_pkey PRIMARY KEY USING INDEX user_to_favourite_themes_pkey'
+    )
+
+    op.add_column('themes', sa.Column('likes_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from favourites
+    op.execute("""
+        UPDATE themes
+        SET likes_count = favourites.likes
+        FROM (
+            SELECT theme_id, count(*) AS likes
+            FROM user_to_favourite_themes
+            GROUP BY theme_id
+        ) AS favourites
+        WHERE themes.id = favourites.theme_id
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_themes_likes_count',
+            'themes',
+            ['likes_count', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_themes_likes_count', table_name='themes', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('themes', 'likes_count')
+    op.drop_constraint('user_to_favourite_themes_pkey', 'user_to_favourite_themes', type_='primary')
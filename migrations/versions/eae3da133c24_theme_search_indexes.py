@@ -0,0 +1,88 @@
+"""theme search indexes
+
+Revision ID: eae3da133c24
+Revises: a82581816a20
+Create Date: 2026-10-17 00:30:12.114512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'eae3da133c24'
+down_revision: Union[str, Sequence[str], None] = 'a82581816a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Must stay in sync with db.theme_search_vector()
+SEARCH_VECTOR = """
+    setweight(to_tsvector(theme_ts_config(language), name), 'A')
+    || setweight(to_tsvector('simple'::regconfig, name), 'A')
+    || setweight(jsonb_to_tsvector(theme_ts_config(language), coalesce(description -> 'words', '[]'::jsonb), '["string"]'::jsonb), 'B')
+    || setweight(jsonb_to_tsvector('simple'::regconfig, coalesce(description -> 'words', '[]'::jsonb), '["string"]'::jsonb), 'B')
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("""
+        CREATE OR REPLACE FUNCTION theme_ts_config(language text) RETURNS regconfig
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT CASE language
+                WHEN 'ar' THEN 'arabic'
+                WHEN 'da' THEN 'danish'
+                WHEN 'de' THEN 'german'
+                WHEN 'el' THEN 'greek'
+                WHEN 'en' THEN 'english'
+                WHEN 'es' THEN 'spanish'
+                WHEN 'fi' THEN 'finnish'
+                WHEN 'fr' THEN 'french'
+                WHEN 'hu' THEN 'hungarian'
+                WHEN 'id' THEN 'indonesian'
+                WHEN 'it' THEN 'italian'
+                WHEN 'lt' THEN 'lithuanian'
+                WHEN 'nl' THEN 'dutch'
+                WHEN 'no' THEN 'norwegian'
+                WHEN 'pt' THEN 'portuguese'
+                WHEN 'ro' THEN 'romanian'
+                WHEN 'ru' THEN 'russian'
+                WHEN 'sv' THEN 'swedish'
+                WHEN 'tr' THEN 'turkish'
+                ELSE 'simple'
+            END::regconfig
+        $$
+    """)
+
+    # Build indexes without locking themes for writes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_themes_name_trgm',
+            'themes',
+            ['name'],
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_themes_search',
+            'themes',
+            [sa.text(f'({SEARCH_VECTOR})')],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_themes_search', table_name='themes', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_themes_name_trgm', table_name='themes', postgresql_concurrently=True, if_exists=True)
+    op.execute('DROP FUNCTION IF EXISTS theme_ts_config(text)')
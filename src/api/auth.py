@@ -1,7 +1,5 @@
 import logging
-import secrets
 
-import httpx
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from redis.asyncio import Redis
@@ -10,11 +8,14 @@ from starlette.responses import RedirectResponse
 
 from cache import get_cache
 from conf import settings
-from dal import get_or_create_user, update_or_create_auth
+from dal import login_user
 from db import get_db
 from errors import AuthError
 from schemas import ErrorResponse
+from utils.http_client import OutboundClient, get_http
+from utils.identity import identity_cache
 from utils.oauth import generate_aux_token, generate_oauth_redirect_uri, verify_id_token
+from utils.onetime import exchange_code_store, oauth_state_store
 
 logger = logging.getLogger('api.auth')
 
@@ -46,38 +47,39 @@ async def login(cache: Redis = Depends(get_cache)):
         401: {'description': 'Invalid state/nonce parameter or invalid cert issuer', 'model': ErrorResponse},
     },
 )
-async def token(code: str, state: str, cache: Redis = Depends(get_cache), db: AsyncSession = Depends(get_db)):
+async def token(
+    code: str,
+    state: str,
+    cache: Redis = Depends(get_cache),
+    db: AsyncSession = Depends(get_db),
+    http: OutboundClient = Depends(get_http),
+):
     """
     After user has chosen a Google account, Google redirects us to BE
     with the code that can be exchanged for access, refresh and id tokens.
     From id token BE creates its own aux token to identify a user from FE.
     Then redirects to FE with the code that can be exchanged for aux token.
     """
-    token_url = 'https://oauth2.googleapis.com/token'
-
-    nonce = await cache.get(f'oauth:state:{state}')
+    nonce = await oauth_state_store(cache).consume(state)
 
     if not nonce:
         logger.error('No nonce for %s', state)
         raise HTTPException(status_code=401, detail='Invalid state')
 
-    await cache.delete(f'oauth:state:{state}')
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            token_url,
-            data={
-                'code': code,
-                'state': state,
-                'client_id': settings.oauth_gcloud_id,
-                'client_secret': settings.oauth_gcloud_secret,
-                'grant_type': 'authorization_code',
-                'redirect_uri': settings.oauth_redirect_uri,
-            },
-        )
-
-        response.raise_for_status()
-        data = response.json()
+    response = await http.post(
+        settings.oauth_token_url,
+        data={
+            'code': code,
+            'state': state,
+            'client_id': settings.oauth_gcloud_id,
+            'client_secret': settings.oauth_gcloud_secret,
+            'grant_type': 'authorization_code',
+            'redirect_uri': settings.oauth_redirect_uri,
+        },
+    )
+
+    response.raise_for_status()
+    data = response.json()
 
     id_token = data['id_token']
     access_token = data['access_token']
@@ -88,13 +90,11 @@ async def token(code: str, state: str, cache: Redis = Depends(get_cache), db: As
         logger.error('Could not verify id_token: %s', e)
         raise
 
-    user = await get_or_create_user(id_token_payload, db)
+    user = await login_user(id_token_payload, db, id_token, access_token)
+    await identity_cache.invalidate(cache, user.id)
 
-    await update_or_create_auth(user, db, id_token, access_token)
-
-    exchange_code = secrets.token_urlsafe(32)
     aux_token = await generate_aux_token(user)
-    await cache.setex(f'auth:exchange:{exchange_code}', 60, aux_token)
+    exchange_code = await exchange_code_store(cache).issue(aux_token)
 
     return RedirectResponse(f'{settings.fe_url}?code={exchange_code}', status_code=302)
 
@@ -106,12 +106,10 @@ async def token(code: str, state: str, cache: Redis = Depends(get_cache), db: As
 async def exchange_token(body: CodePayload, cache: Redis = Depends(get_cache)) -> TokenResponse:
     """Exchange one-time code for aux token"""
     code = body.code
-    aux_token = await cache.get(f'auth:exchange:{code}')
+    aux_token = await exchange_code_store(cache).consume(code)
 
     if not aux_token:
         logger.error('No aux token for %s', code)
         raise HTTPException(status_code=400, detail='Invalid or expired code')
 
-    await cache.delete(f'auth:exchange:{code}')
-
     return TokenResponse(token=aux_token)
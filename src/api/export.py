@@ -0,0 +1,57 @@
+import logging
+from datetime import UTC, datetime
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
+
+from dal import export_columns, get_database_now, stream_export
+from db import User, get_db
+from schemas import ErrorResponse
+from schemas.export import ExportFormat, ExportTable
+from utils.export import MEDIA_TYPES, export_lines
+from utils.oauth import get_current_admin
+
+logger = logging.getLogger('api.export')
+
+router = APIRouter(prefix='/export', tags=['Export'])
+
+
+@router.get(
+    '/{table}',
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            'description': (
+                'Table rows ordered by updated_at, X-Export-Snapshot is the next updated_since. '
+                'Incremental exports overlap the previous one, keep the last row of an id'
+            ),
+            'content': {media_type: {} for media_type in MEDIA_TYPES.values()},
+        },
+        403: {'description': 'Admin privileges required', 'model': ErrorResponse},
+    },
+)
+async def export_table(
+    table: ExportTable,
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias='format'),
+    updated_since: datetime | None = Query(None, description='Export only rows updated after this moment'),
+    db: AsyncSession = Depends(get_db),
+    admin: User = Depends(get_current_admin),
+) -> StreamingResponse:
+    """Full or incremental dump of a table, streamed from a server side cursor with flat memory"""
+    if updated_since is not None and updated_since.tzinfo is None:
+        updated_since = updated_since.replace(tzinfo=UTC)
+
+    snapshot = await get_database_now(db)
+    logger.info('%s exports %s updated since %s', admin.email, table, updated_since)
+
+    lines = export_lines(stream_export(db, table, updated_since), export_columns(table), export_format)
+    filename = f'{table}-{snapshot:%Y%m%dT%H%M%S}.{export_format}'
+    return StreamingResponse(
+        lines,
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Export-Snapshot': snapshot.isoformat(),
+        },
+    )
@@ -1,68 +1,320 @@
+import asyncio
 import logging
+from datetime import UTC, datetime
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi_pagination import Page
-from fastapi_pagination.ext.sqlmodel import paginate
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi_pagination import Page, Params, create_page
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
 
-from dal import apply_games_ordering, get_filtered_games, get_game_details
-from db import Game, User, get_db
-from schemas import ErrorResponse
+from cache import get_cache
+from conf import settings
+from dal import (
+    append_game_events,
+    apply_games_ordering,
+    fold_game_events,
+    games_sort_keys,
+    get_active_games,
+    get_filtered_games,
+    get_game_details,
+    get_game_events_state,
+    get_game_version,
+    get_game_words_source,
+    get_games_version,
+    get_words,
+    intern_words,
+    update_game_progress,
+)
+from db import Game, User, async_session, get_db
+from errors import AuthError
+from schemas import CountMode, CursorPage, ErrorResponse
 from schemas.game import (
+    GameChannelAuth,
     GameCreatePayload,
+    GameDeal,
     GameDetailsResponse,
+    GameEventKind,
+    GameEventsAppended,
+    GameEventsMessage,
+    GameEventsPayload,
     GameListItem,
     GameOrderBy,
+    GameProgressMessage,
+    GameSnapshotMessage,
     GameUpdatePayload,
     GameUpsertedResponse,
 )
-from utils.oauth import get_current_user
+from utils.conditional import is_conditional, is_not_modified, make_etag, not_modified, validator_headers
+from utils.deck import game_decks
+from utils.game_channels import Subscription, game_channels
+from utils.game_states import GameState, UpdateStatus, game_states
+from utils.oauth import authenticate, get_current_user
+from utils.pagination import paginate_keyset
+from utils.play_counters import play_counters
 
 logger = logging.getLogger('api.game')
 
 router = APIRouter(prefix='/games', tags=['Games'])
 
 
-async def get_game_or_404(db: AsyncSession, game_id: int, user: User) -> Game:
-    game = await get_game_details(db, user, game_id)
-    if not game:
+async def load_game_details(
+    db: AsyncSession, user: User, game_id: int
+) -> Row[tuple[Game, list[str], list[str]]] | None:
+    """Game of the user with its words, events appended since the last fold are folded first"""
+    details = await get_game_details(db, user, game_id)
+    if details is None:
+        return None
+
+    game = details[0]
+    if game.folded_event_seq < game.event_seq and await fold_game_events(db, user, game_id):
+        await db.commit()
+        details = await get_game_details(db, user, game_id)
+    return details
+
+
+async def get_game_or_404(db: AsyncSession, game_id: int, user: User) -> Row[tuple[Game, list[str], list[str]]]:
+    """Game of the user with its guessed and skipped words"""
+    details = await load_game_details(db, user, game_id)
+    if not details:
         logger.error('No such %s: %r', Game, game_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f'{Game.__name__} with id {game_id} not found'
         )
-    return game
+    return details
+
+
+def game_response(
+    model: type[GameDetailsResponse | GameUpsertedResponse],
+    game: Game,
+    words_guessed: list[str],
+    words_skipped: list[str],
+) -> GameDetailsResponse | GameUpsertedResponse:
+    """Game with its word ids spelled out"""
+    return model.model_validate(game, update={'words_guessed': words_guessed, 'words_skipped': words_skipped})
+
+
+async def publish_game_update(cache: Redis, game_id: int, message: GameProgressMessage | GameEventsMessage):
+    """Push the update to game channel subscribers, the update itself is already saved"""
+    try:
+        await game_channels.publish(cache, game_id, message.model_dump_json())
+    except RedisError:
+        logger.exception('Could not publish update of game %d', game_id)
+
+
+def version_conflict(game_id: int, version: int | None) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f'{Game.__name__} with id {game_id} is no longer at version {version}',
+    )
+
 
+def game_busy(game_id: int) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'Game {game_id} is being saved, retry')
 
-@router.get('/', response_model=Page[GameListItem])
+
+async def load_game_state(db: AsyncSession, cache: Redis, user: User, game_id: int) -> bool:
+    """Keep a game of the user in Redis while it is in progress, False if there is no such game or it has ended"""
+    details = await load_game_details(db, user, game_id)
+    if details is None or details[0].ended_at is not None:
+        return False
+
+    game = details[0]
+    state = GameState(
+        game=game_response(GameDetailsResponse, *details),
+        user_id=user.id,
+        event_seq=game.event_seq,
+        updated_at=game.updated_at,
+        theme_updated_at=game.theme.updated_at if game.theme else None,
+    )
+    await game_states.load(cache, state)
+    return True
+
+
+async def save_ended_game(cache: Redis, game_id: int):
+    """Game end is written to Postgres before it is answered, if that fails it is left to the flusher"""
+    try:
+        await game_states.evict(cache, game_id, game_states.save)
+    except Exception:
+        logger.exception('Could not save ended game %d, it is kept in Redis', game_id)
+
+
+def game_validators(game_id: int, updated_at: datetime, theme_updated_at: datetime | None) -> tuple[str, datetime]:
+    """ETag and Last-Modified of game details"""
+    etag = make_etag('game', game_id, updated_at, theme_updated_at)
+    return etag, max(updated_at, theme_updated_at or updated_at)
+
+
+@router.get('/', response_model=Page[GameListItem], responses={304: {'description': 'Not modified'}})
 async def get_games(
+    request: Request,
+    response: Response,
     theme_id: int | None = None,
-    ended: bool = False,
+    ended: bool | None = Query(None, description='Only ended games if true, only games in progress if false'),
     skip_penalty: bool | None = None,
     order: GameOrderBy = GameOrderBy.ID,
     descending: bool = True,
+    params: Params = Depends(),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
     query = await get_filtered_games(user, theme_id, ended, skip_penalty)
+
+    # Page can only change if a matching game (or its theme) was added, removed or updated.
+    # The probe runs before the page is fetched, so a revalidated listing skips the page query.
+    count, games_updated_at, themes_updated_at = await get_games_version(db, query)
+    etag = make_etag(
+        'games',
+        user.id,
+        theme_id,
+        ended,
+        skip_penalty,
+        order,
+        descending,
+        params.page,
+        params.size,
+        count,
+        games_updated_at,
+        themes_updated_at,
+    )
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers.update(validator_headers(etag))
+
+    # The probe already counted the games, paginate would count them again
     query = await apply_games_ordering(query, order, descending)
-    return await paginate(db, query)
+    raw_params = params.to_raw_params().as_limit_offset()
+    games = await db.scalars(query.offset(raw_params.offset).limit(raw_params.limit))
+    return create_page(games.all(), total=count, params=params)
+
+
+@router.get(
+    '/cursor',
+    response_model=CursorPage[GameListItem],
+    responses={400: {'description': 'Malformed cursor', 'model': ErrorResponse}},
+)
+async def get_games_by_cursor(
+    theme_id: int | None = None,
+    ended: bool | None = Query(None, description='Only ended games if true, only games in progress if false'),
+    skip_penalty: bool | None = None,
+    order: GameOrderBy = GameOrderBy.ID,
+    descending: bool = True,
+    cursor: str | None = Query(None, description='next_cursor of the previous page'),
+    size: int = Query(50, ge=1, le=100),
+    count: CountMode = CountMode.NONE,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Keyset paginated games, cost of a page doesn't depend on its depth"""
+    query = await get_filtered_games(user, theme_id, ended, skip_penalty)
+    try:
+        return await paginate_keyset(db, query, games_sort_keys(order, descending), cursor, size, count)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+
+
+@router.get('/active', response_model=list[GameListItem])
+async def get_games_in_progress(
+    size: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Latest games in progress to resume, without counting or paging through the user's history"""
+    return await get_active_games(db, user, size)
 
 
 @router.get(
     '/{game_id}',
     response_model=GameDetailsResponse,
-    responses={404: {'description': 'Game not found', 'model': ErrorResponse}},
+    responses={
+        304: {'description': 'Not modified'},
+        404: {'description': 'Game not found', 'model': ErrorResponse},
+    },
 )
-async def get_game(game_id: int, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)) -> Game:
-    game = await get_game_or_404(db, game_id, user)
-    return game
+async def get_game(
+    game_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
+    user: User = Depends(get_current_user),
+) -> GameDetailsResponse:
+    # Games in progress are served from Redis, written to Postgres behind
+    if (state := await game_states.get(cache, user.id, game_id)) is not None:
+        etag, last_modified = game_validators(game_id, state.updated_at, state.theme_updated_at)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+        response.headers.update(validator_headers(etag, last_modified))
+        return state.game
+
+    # Revalidation is answered by a cheap probe, details are loaded only if they have changed
+    if is_conditional(request) and (version := await get_game_version(db, user, game_id)):
+        etag, last_modified = game_validators(game_id, *version)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+
+    game, words_guessed, words_skipped = await get_game_or_404(db, game_id, user)
+    theme_updated_at = game.theme.updated_at if game.theme else None
+    response.headers.update(validator_headers(*game_validators(game.id, game.updated_at, theme_updated_at)))
+    return game_response(GameDetailsResponse, game, words_guessed, words_skipped)
+
+
+@router.post(
+    '/{game_id}/deal',
+    response_model=GameDeal,
+    responses={
+        404: {'description': 'Game not found', 'model': ErrorResponse},
+        409: {'description': 'Game has ended', 'model': ErrorResponse},
+    },
+)
+async def deal_words(
+    game_id: int,
+    count: int = Query(10, ge=1, le=settings.game_deal_max_count),
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
+    user: User = Depends(get_current_user),
+) -> GameDeal:
+    """Next words of the game, drawn without replacement from the theme words not played in the game yet"""
+    dealt = await game_decks.deal(cache, game_id, user.id, count)
+
+    if dealt is None:
+        # First deal: shuffle the theme words once, later deals just pop the deck
+        if await fold_game_events(db, user, game_id):
+            await db.commit()
+        source = await get_game_words_source(db, user, game_id)
+        if source is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail=f'{Game.__name__} with id {game_id} not found'
+            )
+        ended_at, theme_word_ids, guessed_word_ids, skipped_word_ids = source
+        played = set(guessed_word_ids) | set(skipped_word_ids)
+        # Words played since the game was last written to Postgres
+        if (state := await game_states.get(cache, user.id, game_id)) is not None:
+            ended_at = state.game.ended_at
+            played.update(await intern_words(db, state.game.words_guessed + state.game.words_skipped))
+        if ended_at is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'Game {game_id} has ended')
+
+        deck = [word_id for word_id in dict.fromkeys(theme_word_ids or []) if word_id not in played]
+        await game_decks.build(cache, game_id, user.id, deck)
+        dealt = await game_decks.deal(cache, game_id, user.id, count) or ([], 0)
+
+    word_ids, remaining = dealt
+    return GameDeal(words=await get_words(db, word_ids), remaining=remaining)
 
 
 @router.post('/', response_model=GameUpsertedResponse, status_code=201)
 async def create_game(
-    game: GameCreatePayload, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)
-) -> Game:
+    game: GameCreatePayload,
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
+    user: User = Depends(get_current_user),
+) -> GameUpsertedResponse:
     game_data = game.model_dump()
     game_record = Game.model_validate(game_data)
     game_record.starter = user
@@ -70,29 +322,247 @@ async def create_game(
     db.add(game_record)
     await db.commit()
     await db.refresh(game_record)
-    return game_record
+
+    if game_record.theme_id is not None:
+        # Theme counters are written behind, the game itself is already saved
+        try:
+            await play_counters.record(cache, game_record.theme_id, game_record.started_at)
+        except RedisError:
+            logger.exception('Could not record play of theme %d', game_record.theme_id)
+    return game_response(GameUpsertedResponse, game_record, [], [])
+
+
+async def update_game_state(
+    db: AsyncSession, cache: Redis, user: User, game_id: int, game_info: GameUpdatePayload
+) -> GameState | None:
+    """Apply the update to the game kept in Redis, loaded first. None if it is not kept: missing or ended"""
+    loaded = False
+    for _ in range(settings.game_state_busy_retries):
+        update_status, state = await game_states.update(cache, user.id, game_id, game_info, datetime.now(UTC))
+        match update_status:
+            case UpdateStatus.APPLIED:
+                return state
+            case UpdateStatus.CONFLICT:
+                raise version_conflict(game_id, game_info.version)
+            case UpdateStatus.BUSY:
+                await asyncio.sleep(settings.game_state_busy_delay)
+            case UpdateStatus.MISSING:
+                if loaded or not await load_game_state(db, cache, user, game_id):
+                    return None
+                loaded = True
+    raise game_busy(game_id)
+
+
+async def update_stored_game(
+    db: AsyncSession, user: User, game_id: int, game_info: GameUpdatePayload
+) -> GameUpsertedResponse:
+    """Apply the update to the game in Postgres, for games that are not kept in Redis"""
+    word_ids = await intern_words(db, game_info.words_guessed + game_info.words_skipped)
+    guessed_count = len(game_info.words_guessed)
+
+    progress = {
+        'info': game_info.info.model_dump(),
+        'guessed_word_ids': word_ids[:guessed_count],
+        'skipped_word_ids': word_ids[guessed_count:],
+        'ended_at': game_info.ended_at,
+        'version': game_info.version,
+    }
+    updated = await update_game_progress(db, user, game_id, **progress)
+    if updated is None and await fold_game_events(db, user, game_id):
+        # The state is based on the events appended so far, they are folded first
+        updated = await update_game_progress(db, user, game_id, **progress)
+    if updated is None:
+        # Only failures pay for telling a missing game from a stale version
+        if await get_game_version(db, user, game_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail=f'{Game.__name__} with id {game_id} not found'
+            )
+        raise version_conflict(game_id, game_info.version)
+
+    await db.commit()
+    return game_response(GameUpsertedResponse, *updated)
 
 
 @router.put(
     '/{game_id}',
     response_model=GameUpsertedResponse,
-    responses={404: {'description': 'Game not found', 'model': ErrorResponse}},
+    responses={
+        404: {'description': 'Game not found', 'model': ErrorResponse},
+        409: {'description': 'Game version has changed or the game is being saved', 'model': ErrorResponse},
+    },
 )
 async def update_game(
     game_id: int,
     game_info: GameUpdatePayload,
     db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
     user: User = Depends(get_current_user),
-) -> Game:
-    game = await get_game_or_404(db, game_id, user)
+) -> GameUpsertedResponse:
+    """Progress of games in progress is kept in Redis and written to Postgres behind, the end right away"""
+    state = await update_game_state(db, cache, user, game_id, game_info)
+    if state is not None:
+        game = GameUpsertedResponse.model_validate(state.game.model_dump())
+        if game.ended_at is not None:
+            await save_ended_game(cache, game_id)
+    else:
+        game = await update_stored_game(db, user, game_id, game_info)
 
-    game.info = game_info.info.model_dump()
+    if game.ended_at is not None:
+        await game_decks.drop(cache, game_id)
+    await publish_game_update(
+        cache,
+        game_id,
+        GameProgressMessage(
+            version=game.version,
+            info=game.info,
+            words_guessed=game_info.words_guessed,
+            words_skipped=game_info.words_skipped,
+            ended_at=game.ended_at,
+        ),
+    )
+    return game
 
-    game.words_guessed = list(set(game.words_guessed + game_info.words_guessed))
-    game.words_skipped = list(set(game.words_skipped + game_info.words_skipped))
-    game.ended_at = game_info.ended_at
 
-    db.add(game)
+@router.post(
+    '/{game_id}/events',
+    response_model=GameEventsAppended,
+    responses={
+        404: {'description': 'Game not found', 'model': ErrorResponse},
+        409: {
+            'description': 'Game has ended, events are out of sequence or the game is being saved',
+            'model': ErrorResponse,
+        },
+    },
+)
+async def append_events(
+    game_id: int,
+    batch: GameEventsPayload,
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
+    user: User = Depends(get_current_user),
+) -> GameEventsAppended:
+    """
+    Append a batch of turn events, they are applied to the game when it is read or once it has ended.
+    Resending a batch is safe, events with already appended sequence numbers are ignored.
+    """
+    # Only the owner's request may save and evict the game
+    if await get_game_events_state(db, user, game_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f'{Game.__name__} with id {game_id} not found'
+        )
+    # Events are applied to the game in Postgres, a state kept in Redis is written there first
+    if not await game_states.evict(cache, game_id, game_states.save):
+        raise game_busy(game_id)
+
+    words = [event.word for event in batch.events if event.word is not None]
+    word_ids = dict(zip(words, await intern_words(db, words), strict=True))
+    events = [
+        {
+            'kind': event.kind,
+            'occurred_at': event.occurred_at,
+            'word_id': word_ids.get(event.word),
+            'team_index': event.team_index,
+        }
+        for event in batch.events
+    ]
+
+    appended = await append_game_events(db, user, game_id, batch.first_seq, events)
+    if appended is None:
+        state = await get_game_events_state(db, user, game_id)
+        if state is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail=f'{Game.__name__} with id {game_id} not found'
+            )
+        ended_at, event_seq, version = state
+        if event_seq >= batch.last_seq:
+            # Retried batch
+            return GameEventsAppended(last_seq=event_seq, version=version)
+        if ended_at is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'Game {game_id} has ended')
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f'Events of game {game_id} continue from {event_seq + 1}, not {batch.first_seq}',
+        )
+
+    game_ended = batch.events[-1].kind == GameEventKind.GAME_ENDED
+    if game_ended:
+        await fold_game_events(db, user, game_id)
     await db.commit()
-    await db.refresh(game)
-    return game
+
+    if game_ended:
+        await game_decks.drop(cache, game_id)
+    last_seq, version = appended
+    await publish_game_update(
+        cache, game_id, GameEventsMessage(version=version, first_seq=batch.first_seq, events=batch.events)
+    )
+    return GameEventsAppended(last_seq=last_seq, version=version)
+
+
+async def authenticate_channel(websocket: WebSocket, cache: Redis) -> User | None:
+    """User of the aux token sent as the first message, None if it hasn't come in time or is invalid"""
+    try:
+        async with asyncio.timeout(settings.game_channel_auth_timeout):
+            auth = GameChannelAuth.model_validate_json(await websocket.receive_text())
+        async with async_session() as db:
+            return await authenticate(auth.token, db, cache)
+    except TimeoutError, ValidationError, AuthError:
+        return None
+
+
+async def game_snapshot(cache: Redis, user: User, game_id: int) -> GameSnapshotMessage | None:
+    if (state := await game_states.get(cache, user.id, game_id)) is not None:
+        return GameSnapshotMessage(game=state.game)
+    async with async_session() as db:
+        details = await load_game_details(db, user, game_id)
+    if details is None:
+        return None
+    return GameSnapshotMessage(game=game_response(GameDetailsResponse, *details))
+
+
+async def relay(websocket: WebSocket, subscription: Subscription):
+    """Send messages of the subscription until the client disconnects or falls behind"""
+
+    async def send():
+        while (message := await subscription.get()) is not None:
+            await websocket.send_text(message)
+        await websocket.close(status.WS_1013_TRY_AGAIN_LATER, 'Too slow, reconnect to get a new snapshot')
+
+    async def receive():
+        # Clients have nothing to say after authenticating, only their disconnect matters
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.websocket('/{game_id}/channel')
+async def game_channel(websocket: WebSocket, game_id: int, cache: Redis = Depends(get_cache)):
+    """
+    Real-time updates of a game of the user. The client sends {"token": <aux token>} first,
+    then receives a snapshot of the game followed by progress and events messages.
+    Messages of a version not newer than the snapshot's one are already in it and are to be skipped.
+    A client that can't keep up is disconnected with 1013 and has to reconnect.
+    """
+    await websocket.accept()
+    try:
+        user = await authenticate_channel(websocket, cache)
+        if user is None:
+            await websocket.close(status.WS_1008_POLICY_VIOLATION, 'Invalid or expired token')
+            return
+
+        # Subscribed before the snapshot is loaded, so that no update is missed in between
+        async with game_channels.subscribe(game_id) as subscription:
+            snapshot = await game_snapshot(cache, user, game_id)
+            if snapshot is None:
+                await websocket.close(status.WS_1008_POLICY_VIOLATION, f'{Game.__name__} with id {game_id} not found')
+                return
+            await websocket.send_text(snapshot.model_dump_json())
+            await relay(websocket, subscription)
+    except WebSocketDisconnect:
+        pass
@@ -1,26 +1,56 @@
+import json
 import logging
+import re
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi_pagination import Page
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi_pagination import Page, Params
 from fastapi_pagination.ext.sqlmodel import paginate
 from pydantic import BeforeValidator
+from redis.asyncio import Redis
+from sqlalchemy import Row
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from starlette.responses import Response
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
 
+from cache import get_cache
+from conf import settings
 from dal import (
     add_to_favourite,
     apply_themes_ordering,
     get_filtered_themes,
+    get_theme_description,
     get_theme_details,
+    get_theme_version,
+    get_theme_words,
+    has_private_verified_themes,
+    import_themes,
+    intern_words,
     remove_from_favourite,
+    stream_theme_words,
+    theme_values,
+    themes_sort_keys,
 )
 from db import Theme, User, get_db
-from schemas import ErrorResponse
-from schemas.theme import ThemeCreatePayload, ThemeDetailsResponse, ThemeListItem, ThemeOrderBy, ThemeUpdatePayload
+from schemas import CountMode, CursorPage, ErrorResponse
+from schemas.theme import (
+    ThemeCreatePayload,
+    ThemeDetailsResponse,
+    ThemeImportReport,
+    ThemeListItem,
+    ThemeOrderBy,
+    ThemeUpdatePayload,
+    ThemeWordsPage,
+)
+from utils.conditional import body_etag, is_conditional, is_not_modified, make_etag, not_modified, validator_headers
+from utils.ndjson import iter_lines
 from utils.oauth import get_current_user
+from utils.pagination import paginate_keyset
+from utils.response_cache import themes_list_cache
+from utils.word_pack import MEDIA_TYPES, PackFormat, choose_encoding, word_packs
 from validators import validate_language_alpha2
 
 logger = logging.getLogger('api.theme')
@@ -29,47 +59,291 @@ router = APIRouter(prefix='/themes', tags=['Themes'])
 
 LanguageParam = Annotated[str | None, BeforeValidator(validate_language_alpha2)]
 
+PUBLIC_SCOPE = 'public'
+
+WORDS_RANGE_RE = re.compile(r'^words=(\d+)-(\d*)$')
+MAX_WORDS_PAGE = 1000
+
+
+def user_scope(user: User) -> str:
+    return f'user:{user.id}'
+
+
+async def themes_list_scope(
+    db: AsyncSession, cache: Redis, user: User, mine: bool, verified: bool, favourites: bool
+) -> str:
+    """Cache scope of a listing, verified catalog is shared by non-admin users who see only public themes in it"""
+    if mine or favourites:
+        return user_scope(user)
+    if user.admin:
+        return 'admin'
+    if verified and not await has_private_verified_themes_cached(db, cache, user):
+        return PUBLIC_SCOPE
+    return user_scope(user)
 
-async def get_theme_or_404(db: AsyncSession, theme_id: int, user: User) -> Theme:
-    theme = await get_theme_details(db, user, theme_id)
-    if not theme:
+
+async def has_private_verified_themes_cached(db: AsyncSession, cache: Redis, user: User) -> bool:
+    """
+    Whether the user has private verified themes, cached among the user's listings.
+    Changes of themes invalidate every listing and so the flag too.
+    """
+
+    async def compute() -> str:
+        return '1' if await has_private_verified_themes(db, user) else '0'
+
+    return await themes_list_cache.get_or_set(cache, user_scope(user), {'private_verified': True}, compute) == '1'
+
+
+async def get_theme_or_404(db: AsyncSession, theme_id: int, user: User) -> Row[tuple[Theme, bool, list, int]]:
+    """Theme available to the user, whether it is in user's favourites, its teams and number of words"""
+    details = await get_theme_details(db, user, theme_id)
+    if not details:
         logger.error('No such %s: %r', Theme, theme_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f'{Theme.__name__} with id {theme_id} not found'
         )
-    return theme
+    return details
+
 
+def theme_validators(
+    theme_id: int, updated_at: datetime, creator_updated_at: datetime | None, favourite: bool
+) -> tuple[str, datetime]:
+    """ETag and Last-Modified of theme details"""
+    etag = make_etag('theme', theme_id, updated_at, creator_updated_at, favourite)
+    return etag, max(updated_at, creator_updated_at or updated_at)
 
-@router.get('/', response_model=Page[ThemeListItem])
+
+def theme_details_response(theme: Theme, favourite: bool, teams: list[str], words_count: int) -> ThemeDetailsResponse:
+    return ThemeDetailsResponse.model_validate(
+        theme,
+        update={
+            'likes': theme.likes_count,
+            'favourite': favourite,
+            'description': {'teams': teams, 'words_count': words_count},
+        },
+    )
+
+
+@router.get('/', response_model=Page[ThemeListItem], responses={304: {'description': 'Not modified'}})
 async def get_themes(
+    request: Request,
+    language: LanguageParam = None,
+    difficulty: int | None = Query(None, ge=1, le=5),
+    name: str | None = Query(None, max_length=255, description='Search in theme name and words'),
+    mine: bool = False,
+    verified: bool = True,
+    favourites: bool = False,
+    order: ThemeOrderBy = ThemeOrderBy.ID,
+    descending: bool = False,
+    params: Params = Depends(),
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
+    user: User = Depends(get_current_user),
+):
+    scope = await themes_list_scope(db, cache, user, mine, verified, favourites)
+
+    async def get_page() -> str:
+        query = await get_filtered_themes(user, language, difficulty, name, mine, verified, favourites)
+        if scope == PUBLIC_SCOPE:
+            # Same rows for users of the shared scope, guards it against a theme verified meanwhile
+            query = query.where(Theme.public)
+        query = await apply_themes_ordering(query, order, descending, search=name, language=language)
+        page = await paginate(db, query, params)
+        return Page[ThemeListItem].model_validate(page, from_attributes=True).model_dump_json()
+
+    filters = {
+        'language': language,
+        'difficulty': difficulty,
+        'name': name.lower() if name else None,  # search is case-insensitive
+        'mine': mine,
+        'verified': verified,
+        'favourites': favourites,
+        'order': order,
+        'descending': descending,
+        'page': params.page,
+        'size': params.size,
+    }
+    page = await themes_list_cache.get_or_set(cache, scope, filters, get_page)
+
+    etag = body_etag(page)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return Response(page, media_type='application/json', headers=validator_headers(etag))
+
+
+@router.get(
+    '/cursor',
+    response_model=CursorPage[ThemeListItem],
+    responses={400: {'description': 'Malformed cursor', 'model': ErrorResponse}},
+)
+async def get_themes_by_cursor(
     language: LanguageParam = None,
     difficulty: int | None = Query(None, ge=1, le=5),
-    name: str | None = Query(None, max_length=255),
+    name: str | None = Query(None, max_length=255, description='Search in theme name and words'),
     mine: bool = False,
     verified: bool = True,
     favourites: bool = False,
     order: ThemeOrderBy = ThemeOrderBy.ID,
     descending: bool = False,
+    cursor: str | None = Query(None, description='next_cursor of the previous page'),
+    size: int = Query(50, ge=1, le=100),
+    count: CountMode = CountMode.NONE,
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
+    """Keyset paginated themes, cost of a page doesn't depend on its depth"""
     query = await get_filtered_themes(user, language, difficulty, name, mine, verified, favourites)
-    query = await apply_themes_ordering(query, order, descending)
-    return await paginate(db, query)
+    keys = themes_sort_keys(order, descending, search=name, language=language)
+    try:
+        return await paginate_keyset(db, query, keys, cursor, size, count)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
 
 
 @router.get(
     '/{theme_id}',
     response_model=ThemeDetailsResponse,
-    responses={404: {'description': 'Theme not found', 'model': ErrorResponse}},
+    responses={
+        304: {'description': 'Not modified'},
+        404: {'description': 'Theme not found', 'model': ErrorResponse},
+    },
 )
 async def get_theme(
-    theme_id: int, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)
+    theme_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
 ) -> ThemeDetailsResponse:
-    theme = await get_theme_or_404(db, theme_id, user)
-    return ThemeDetailsResponse.model_validate(
-        theme, update={'likes': len(theme.favourited_by), 'favourite': user in theme.favourited_by}
+    # Revalidation is answered by a cheap probe, details are loaded only if they have changed
+    if is_conditional(request) and (version := await get_theme_version(db, user, theme_id)):
+        etag, last_modified = theme_validators(theme_id, *version)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+
+    details = await get_theme_or_404(db, theme_id, user)
+    theme, favourite, *_ = details
+    creator_updated_at = theme.creator.updated_at if theme.creator else None
+    response.headers.update(
+        validator_headers(*theme_validators(theme.id, theme.updated_at, creator_updated_at, favourite))
     )
+    return theme_details_response(*details)
+
+
+@router.get(
+    '/{theme_id}/words',
+    response_model=ThemeWordsPage,
+    responses={
+        206: {'description': 'Words requested with Range header'},
+        404: {'description': 'Theme not found', 'model': ErrorResponse},
+        416: {'description': 'Range is beyond the last word or inverted', 'model': ErrorResponse},
+    },
+)
+async def get_words(
+    theme_id: int,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_WORDS_PAGE),
+    words_range: str | None = Header(None, alias='Range', description='words=<first>-<last>, zero-based inclusive'),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+) -> ThemeWordsPage:
+    """Page of theme words, selected either with offset and limit or with Range header"""
+    match = WORDS_RANGE_RE.match(words_range or '')
+    if match:
+        offset = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else offset + MAX_WORDS_PAGE - 1
+        limit = min(max(last - offset + 1, 1), MAX_WORDS_PAGE)
+
+    words = await get_theme_words(db, user, theme_id, offset, limit)
+    if words is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f'{Theme.__name__} with id {theme_id} not found'
+        )
+    items, total = words
+
+    response.headers['Accept-Ranges'] = 'words'
+    if match:
+        # Inverted range (last before first) is invalid, as is one starting beyond the last word
+        if offset >= total or last < offset:
+            raise HTTPException(
+                status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+                detail=f'Theme has {total} words',
+                headers={'Content-Range': f'words */{total}'},
+            )
+        response.status_code = status.HTTP_206_PARTIAL_CONTENT
+        response.headers['Content-Range'] = f'words {offset}-{offset + len(items) - 1}/{total}'
+
+    return ThemeWordsPage(items=items, offset=offset, total=total)
+
+
+@router.get(
+    '/{theme_id}/pack',
+    response_class=Response,
+    responses={
+        200: {
+            'description': 'Theme description (words and teams), compressed according to Accept-Encoding',
+            'content': {'application/json': {}, 'application/msgpack': {}},
+        },
+        304: {'description': 'Not modified'},
+        404: {'description': 'Theme not found', 'model': ErrorResponse},
+        406: {'description': 'None of the available encodings is acceptable', 'model': ErrorResponse},
+    },
+)
+async def get_word_pack(
+    theme_id: int,
+    request: Request,
+    pack_format: PackFormat = Query(PackFormat.JSON, alias='format'),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+) -> Response:
+    """Whole theme description, serialized and compressed once per content and served as is"""
+    version = await get_theme_version(db, user, theme_id)
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f'{Theme.__name__} with id {theme_id} not found'
+        )
+
+    updated_at = version[0]
+    pack = word_packs.get(theme_id, updated_at)
+    if pack is None:
+        pack = word_packs.put(theme_id, updated_at, await get_theme_description(db, theme_id) or {})
+
+    encodings = pack.encodings(pack_format)
+    encoding = choose_encoding(request.headers.get('accept-encoding'), encodings)
+    if encoding is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=f'Available encodings: {", ".join(encodings)}'
+        )
+    # Strong validator, differs between encodings of the same content
+    headers = validator_headers(f'"{pack.digest}-{pack_format}-{encoding}"') | {'Vary': 'Accept-Encoding'}
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+
+    if is_not_modified(request, headers['ETag']):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(pack.bodies[pack_format, encoding], media_type=MEDIA_TYPES[pack_format], headers=headers)
+
+
+@router.get(
+    '/{theme_id}/words/stream',
+    response_class=StreamingResponse,
+    responses={
+        200: {'description': 'Theme words as newline delimited JSON strings', 'content': {'application/x-ndjson': {}}},
+        404: {'description': 'Theme not found', 'model': ErrorResponse},
+    },
+)
+async def stream_words(
+    theme_id: int, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)
+) -> StreamingResponse:
+    """All theme words, streamed without building the whole list in memory"""
+    await get_theme_or_404(db, theme_id, user)
+
+    async def lines():
+        async for word in stream_theme_words(db, theme_id):
+            yield json.dumps(word, ensure_ascii=False) + '\n'
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
 
 
 @router.post(
@@ -79,19 +353,20 @@ async def get_theme(
     responses={409: {'description': 'Theme with this name already exists', 'model': ErrorResponse}},
 )
 async def create_theme(
-    theme: ThemeCreatePayload, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)
-) -> Theme:
-    theme_record = Theme.model_validate(
-        theme,
-        update={'description': theme.description.model_dump()},
-    )
+    theme: ThemeCreatePayload,
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
+    user: User = Depends(get_current_user),
+) -> ThemeDetailsResponse:
+    theme_record = Theme.model_validate(theme_values(theme, await intern_words(db, theme.description.words)))
     theme_record.creator = user
 
     try:
         db.add(theme_record)
         await db.commit()
         await db.refresh(theme_record)
-        return theme_record
+        await themes_list_cache.invalidate(cache)
+        return theme_details_response(theme_record, False, theme.description.teams, len(theme.description.words))
     except IntegrityError as e:
         logger.error('Could not create new theme: %s', e)
         raise HTTPException(
@@ -99,6 +374,32 @@ async def create_theme(
         ) from e
 
 
+@router.post(
+    '/import',
+    response_model=ThemeImportReport,
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'description': 'One ThemeCreatePayload JSON object per line',
+            'content': {'application/x-ndjson': {'schema': {'type': 'string'}}},
+        }
+    },
+)
+async def import_themes_ndjson(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
+    user: User = Depends(get_current_user),
+) -> ThemeImportReport:
+    """Bulk create themes from NDJSON body, read and inserted in batches as it is being received"""
+    lines = iter_lines(request.stream(), settings.theme_import_max_line_size)
+    report = await import_themes(db, user, lines)
+
+    if report.created:
+        await themes_list_cache.invalidate(cache)
+    return report
+
+
 @router.put(
     '/{theme_id}',
     response_model=ThemeDetailsResponse,
@@ -108,29 +409,31 @@ async def update_theme(
     theme_id: int,
     theme_info: ThemeUpdatePayload,
     db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
     user: User = Depends(get_current_user),
 ) -> ThemeDetailsResponse:
-    theme = await get_theme_or_404(db, theme_id, user)
+    theme, favourite, teams, words_count = await get_theme_or_404(db, theme_id, user)
     theme.public = theme_info.public
 
     db.add(theme)
     await db.commit()
     await db.refresh(theme)
+    await themes_list_cache.invalidate(cache)
 
-    return ThemeDetailsResponse.model_validate(
-        theme, update={'likes': len(theme.favourited_by), 'favourite': user in theme.favourited_by}
-    )
+    return theme_details_response(theme, favourite, teams, words_count)
 
 
 @router.post('/{theme_id}/favourite', status_code=status.HTTP_204_NO_CONTENT)
 async def add_theme_to_favourites(
     theme_id: int,
     db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
     user: User = Depends(get_current_user),
 ):
-    theme = await get_theme_or_404(db, theme_id, user)
+    theme, *_ = await get_theme_or_404(db, theme_id, user)
 
     await add_to_favourite(db, user, theme)
+    await themes_list_cache.invalidate(cache, user_scope(user))
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -139,10 +442,12 @@ async def add_theme_to_favourites(
 async def remove_theme_from_favourites(
     theme_id: int,
     db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
     user: User = Depends(get_current_user),
 ):
-    theme = await get_theme_or_404(db, theme_id, user)
+    theme, *_ = await get_theme_or_404(db, theme_id, user)
 
     await remove_from_favourite(db, user, theme)
+    await themes_list_cache.invalidate(cache, user_scope(user))
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,6 +1,6 @@
 import logging
 
-from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio import BlockingConnectionPool, ConnectionPool, Redis
 
 from conf import settings
 
@@ -18,12 +18,15 @@ async def get_cache() -> Redis:
 async def init_cache():
     """Initialize Redis connection pool"""
     global redis_pool
-    redis_pool = ConnectionPool(
+    # Bursts wait for a connection instead of failing. Two of them are held for good by the pub/subs
+    # of game channels and of identity invalidations, the rest serve requests
+    redis_pool = BlockingConnectionPool(
         host=settings.redis_host,
         port=settings.redis_port,
         db=settings.redis_name,
         password=settings.redis_pass,
-        max_connections=5,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout,
         decode_responses=True,
         encoding='utf-8',
     )
@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from typing import BinaryIO
+
+from sqlmodel import select
+
+from cache import close_cache, get_cache, init_cache
+from conf import settings
+from dal import (
+    export_columns,
+    get_database_now,
+    import_themes,
+    reconcile_likes_counts,
+    set_user_admin,
+    stream_export,
+)
+from db import User, async_session
+from log import init_logging
+from schemas.export import ExportFormat, ExportTable
+from utils.export import export_lines
+from utils.game_states import game_states
+from utils.identity import identity_cache
+from utils.ndjson import iter_lines
+from utils.play_counters import play_counters
+from utils.response_cache import themes_list_cache
+
+logger = logging.getLogger('cli')
+
+
+async def reconcile_likes(args: argparse.Namespace):
+    async with async_session() as db:
+        fixed = await reconcile_likes_counts(db)
+    logger.info('Likes counters reconciled, %d themes corrected', fixed)
+
+
+async def flush_play_counters(args: argparse.Namespace):
+    await init_cache()
+    try:
+        updated = await play_counters.flush_now()
+    finally:
+        await close_cache()
+    logger.info('Play counters flushed, %d themes updated', updated)
+
+
+async def flush_game_states(args: argparse.Namespace):
+    await init_cache()
+    try:
+        saved = await game_states.flush_now()
+    finally:
+        await close_cache()
+    logger.info('Game states flushed, %d games saved', saved)
+
+
+async def drop_themes_cache():
+    await init_cache()
+    try:
+        await themes_list_cache.invalidate(await get_cache())
+    finally:
+        await close_cache()
+    logger.info('Theme listings cache invalidated')
+
+
+async def invalidate_themes_cache(args: argparse.Namespace):
+    await drop_themes_cache()
+
+
+async def set_admin(args: argparse.Namespace):
+    async with async_session() as db:
+        user_id = await set_user_admin(db, args.email, admin=not args.revoke)
+    if user_id is None:
+        logger.error('No user with email %s', args.email)
+        return
+
+    # Cached identities keep the old role until they are dropped
+    await init_cache()
+    try:
+        await identity_cache.invalidate(await get_cache(), user_id)
+    finally:
+        await close_cache()
+    logger.info('Admin role of %s %s', args.email, 'revoked' if args.revoke else 'granted')
+
+
+async def read_chunks(file: BinaryIO, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    while chunk := await asyncio.to_thread(file.read, chunk_size):
+        yield chunk
+
+
+async def import_themes_file(args: argparse.Namespace):
+    async with async_session() as db:
+        user = (await db.execute(select(User).where(User.email == args.creator))).scalar_one_or_none()
+        if user is None:
+            logger.error('No user with email %s', args.creator)
+            return
+
+        lines = iter_lines(read_chunks(args.file), settings.theme_import_max_line_size)
+        report = await import_themes(db, user, lines, batch_size=args.batch_size)
+
+    print(report.model_dump_json(indent=2))
+    if report.created:
+        await drop_themes_cache()
+
+
+async def export_table(args: argparse.Namespace):
+    updated_since = args.updated_since
+    if updated_since is not None and updated_since.tzinfo is None:
+        updated_since = updated_since.replace(tzinfo=UTC)
+
+    async with async_session() as db:
+        snapshot = await get_database_now(db)
+        rows = stream_export(db, args.table, updated_since)
+        async for line in export_lines(rows, export_columns(args.table), args.format):
+            args.output.write(line)
+    args.output.flush()
+
+    # Pass it as --updated-since of the next incremental export, which repeats rows of the last export_overlap seconds
+    logger.info('Exported %s, snapshot %s', args.table, snapshot.isoformat())
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='TAG API maintenance commands')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    reconcile = commands.add_parser('reconcile-likes', help='Recount denormalized theme likes counters')
+    reconcile.set_defaults(handler=reconcile_likes)
+
+    flush_plays = commands.add_parser('flush-play-counters', help='Apply plays buffered in Redis to themes now')
+    flush_plays.set_defaults(handler=flush_play_counters)
+
+    flush_games = commands.add_parser('flush-game-states', help='Write games in progress kept in Redis to Postgres now')
+    flush_games.set_defaults(handler=flush_game_states)
+
+    invalidate = commands.add_parser(
+        'invalidate-themes-cache', help='Drop cached theme listings, e.g. after verifying themes manually'
+    )
+    invalidate.set_defaults(handler=invalidate_themes_cache)
+
+    admin = commands.add_parser('set-admin', help='Grant admin role to the user, effective immediately')
+    admin.add_argument('email', help='Email of the user')
+    admin.add_argument('--revoke', action='store_true', help='Revoke admin role instead')
+    admin.set_defaults(handler=set_admin)
+
+    importer = commands.add_parser('import-themes', help='Bulk create themes from NDJSON file')
+    importer.add_argument('file', type=argparse.FileType('rb'), help='NDJSON file, one theme per line, - for stdin')
+    importer.add_argument('--creator', required=True, help='Email of the user to own imported themes')
+    importer.add_argument('--batch-size', type=int, default=settings.theme_import_batch_size)
+    importer.set_defaults(handler=import_themes_file)
+
+    exporter = commands.add_parser('export', help='Dump table as NDJSON or CSV through a server side cursor')
+    exporter.add_argument('table', type=ExportTable, choices=list(ExportTable))
+    exporter.add_argument('--format', type=ExportFormat, choices=list(ExportFormat), default=ExportFormat.NDJSON)
+    exporter.add_argument(
+        '--updated-since', type=datetime.fromisoformat, help='Export only rows updated after this ISO timestamp'
+    )
+    exporter.add_argument(
+        '--output', type=argparse.FileType('w', encoding='utf-8'), default='-', help='Output file, - for stdout'
+    )
+    exporter.set_defaults(handler=export_table)
+
+    return parser
+
+
+async def main():
+    args = get_parser().parse_args()
+    await init_logging()
+    await args.handler(args)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
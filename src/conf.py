@@ -15,16 +15,73 @@ class Settings(BaseSettings):
     redis_port: int
     redis_pass: str
     redis_name: str
+    # Includes the two connections held by pub/subs (game channels, identity invalidations)
+    redis_max_connections: int = 12
+    # How long a request waits for a free pooled connection
+    redis_pool_timeout: float = 5.0
 
     oauth_gcloud_id: str
     oauth_gcloud_secret: str
     oauth_redirect_uri: str
+    oauth_jwks_url: str = 'https://www.googleapis.com/oauth2/v3/certs'
+    oauth_token_url: str = 'https://oauth2.googleapis.com/token'
 
     fe_url: str
 
     jwt_secret: str
     jwt_algorithm: str
     jwt_expires_in_days: int
+    aux_token_cache_size: int = 10_000
+
+    identity_cache_size: int = 10_000
+    identity_cache_local_ttl: int = 30
+    identity_cache_redis_ttl: int = 300
+
+    themes_cache_ttl: int = 60
+    themes_cache_lock_ttl: int = 5
+
+    word_pack_cache_size: int = 256
+    word_pack_cache_ttl: int = 24 * 60 * 60
+
+    word_ids_cache_size: int = 200_000
+    word_ids_cache_ttl: int = 24 * 60 * 60
+
+    theme_import_batch_size: int = 500
+    theme_import_max_errors: int = 100
+    theme_import_max_line_size: int = 1024 * 1024
+
+    export_fetch_size: int = 1000
+    # Incremental exports start this many seconds before updated_since: a transaction that began before the previous
+    # snapshot commits rows updated before it. Longer than any transaction writing themes or games
+    export_overlap: int = 10 * 60
+
+    game_deck_ttl: int = 24 * 60 * 60
+    game_deal_max_count: int = 100
+    game_events_batch_max_size: int = 100
+    game_channel_queue_size: int = 100
+    game_channel_auth_timeout: float = 5.0
+    # Games in progress are kept in Redis while they are updated, written to Postgres every interval
+    game_state_ttl: int = 60 * 60
+    game_state_flush_interval: float = 5.0
+    game_state_flush_batch_size: int = 500
+    game_state_flush_lock_ttl: int = 60
+    game_state_busy_retries: int = 5
+    game_state_busy_delay: float = 0.05
+
+    play_counters_flush_interval: float = 10.0
+    play_counters_batch_size: int = 1000
+    play_counters_lock_ttl: int = 60
+    # Ids of applied batches are kept long enough to outlive any retry of a batch
+    play_counters_batch_retention_days: int = 7
+
+    http_http2: bool = False
+    http_timeout: float = 5.0
+    http_connect_timeout: float = 2.0
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 60.0
+    http_breaker_failure_threshold: int = 5
+    http_breaker_reset_timeout: float = 30.0
 
 
 settings = Settings()
@@ -1,77 +1,549 @@
+import copy
 import logging
-from datetime import UTC, datetime
-
-from sqlalchemy import Select, delete, func
-from sqlalchemy.dialects.postgresql import insert
+from collections.abc import AsyncIterable, AsyncIterator
+from datetime import UTC, datetime, timedelta
+
+from pydantic import ValidationError
+from sqlalchemy import (
+    ColumnElement,
+    DateTime,
+    Integer,
+    Row,
+    RowMapping,
+    Select,
+    Text,
+    all_,
+    any_,
+    bindparam,
+    cast,
+    column,
+    delete,
+    exists,
+    func,
+    literal,
+    literal_column,
+    true,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, aggregate_order_by, insert
+from sqlalchemy.event import listens_for
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from sqlmodel import asc, desc, or_, select
-
-from db import Auth, Game, Theme, User, UserToFavouriteThemes
-from schemas.game import GameOrderBy
-from schemas.theme import ThemeOrderBy
+from sqlalchemy.orm import Session, SessionTransaction, aliased, defer, selectinload
+from sqlmodel import or_, select
+
+from conf import settings
+from db import Auth, Game, GameEvent, PlayBatch, Theme, User, UserToFavouriteThemes, Word, theme_search_vector
+from schemas.export import ExportTable
+from schemas.game import GameEventKind, GameOrderBy
+from schemas.theme import ThemeCreatePayload, ThemeImportReport, ThemeOrderBy
+from utils.lru import TTLCache
+from utils.metrics import register_cache_stats
+from utils.pagination import SortKey
 
 logger = logging.getLogger('dal')
 
+# Dictionary ids never change, so they are cached for as long as there is room
+word_ids_cache = TTLCache(
+    settings.word_ids_cache_size, settings.word_ids_cache_ttl, stats=register_cache_stats('words.ids')
+)
 
-async def get_or_create_user(id_token_payload: dict, db: AsyncSession) -> User:
-    email = id_token_payload['email']
-
-    stmt = select(User).where(User.email == email)
-    result = await db.execute(stmt)
 
-    user = result.scalar_one_or_none()
+async def login_user(id_token_payload: dict, db: AsyncSession, id_token: str, access_token: str) -> User:
+    """
+    Upsert user and its auth row in a single statement:
+    returning users get fresh picture and last_login, auth tokens are replaced.
+    """
+    now = datetime.now(UTC)
 
-    if user is None:
-        user = User(
-            email=email,
-            picture=id_token_payload.get('picture'),
-            last_login=datetime.now(UTC),
+    user_stmt = insert(User).values(
+        email=id_token_payload['email'],
+        picture=id_token_payload.get('picture') or '',
+        last_login=now,
+    )
+    user_cte = (
+        user_stmt.on_conflict_do_update(
+            index_elements=[User.email],
+            set_={'picture': user_stmt.excluded.picture, 'last_login': now, 'updated_at': func.now()},
         )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
+        .returning(*User.__table__.c)
+        .cte('upserted_user')
+    )
 
-    return user
+    auth_stmt = insert(Auth).from_select(
+        ['user_id', 'id_token', 'access_token', 'created_at', 'updated_at'],
+        select(user_cte.c.id, literal(id_token), literal(access_token), func.now(), func.now()),
+    )
+    auth_cte = auth_stmt.on_conflict_do_update(
+        index_elements=[Auth.user_id],
+        set_={
+            'id_token': auth_stmt.excluded.id_token,
+            'access_token': auth_stmt.excluded.access_token,
+            'updated_at': func.now(),
+        },
+    ).cte('upserted_auth')
 
+    result = await db.execute(
+        select(aliased(User, user_cte)).add_cte(auth_cte).execution_options(populate_existing=True)
+    )
+    user = result.scalar_one()
+    await db.commit()
 
-async def update_or_create_auth(user: User, db: AsyncSession, id_token: str, access_token: str) -> Auth:
-    stmt = select(Auth).where(Auth.user_id == user.id)
-    result = await db.execute(stmt)
-    auth = result.scalar_one_or_none()
+    return user
 
-    if auth:
-        auth.id_token = id_token
-        auth.access_token = access_token
-        auth.updated_at = datetime.now(UTC)
-    else:
-        auth = Auth(user=user, id_token=id_token, access_token=access_token)
-        db.add(auth)
 
+async def set_user_admin(db: AsyncSession, email: str, admin: bool) -> int | None:
+    """Grant or revoke admin role, id of the user or None if there is no such user"""
+    user_id = await db.scalar(
+        update(User).where(User.email == email).values(admin=admin, updated_at=func.now()).returning(User.id)
+    )
     await db.commit()
-    await db.refresh(auth)
-    return auth
+
+    return user_id
+
+
+def is_favourite(user: User) -> ColumnElement[bool]:
+    """EXISTS probe of the favourites primary key, likers are never loaded"""
+    return (
+        exists()
+        .where(UserToFavouriteThemes.user_id == user.id, UserToFavouriteThemes.theme_id == Theme.id)
+        .label('favourite')
+    )
+
+
+def theme_description_summary() -> tuple[ColumnElement[list], ColumnElement[int]]:
+    """Teams and number of words, computed by the database so that words are not transferred"""
+    return (
+        func.coalesce(Theme.description['teams'], literal_column("'[]'::jsonb")).label('teams'),
+        func.cardinality(Theme.word_ids).label('words_count'),
+    )
 
 
-async def get_theme_details(db: AsyncSession, user: User, theme_id: int) -> Theme:
+def word_items(word_ids: ColumnElement[list[int]]):
+    """Rows (word_id, position) of an id array, to be joined with words"""
+    return func.unnest(word_ids).table_valued('word_id', with_ordinality='position').render_derived()
+
+
+def word_texts(word_ids: ColumnElement[list[int]]) -> ColumnElement[list[str]]:
+    """Words of an id array in the array order, resolved by the database"""
+    items = word_items(word_ids)
+    words = (
+        select(func.array_agg(aggregate_order_by(Word.word, items.c.position)))
+        .select_from(items)
+        .join(Word, Word.id == items.c.word_id)
+        .scalar_subquery()
+    )
+    return func.coalesce(words, literal_column("'{}'::text[]"))
+
+
+# Words added by a session are cached once its transaction is committed, discarded if it is rolled back
+ADDED_WORDS = 'added_words'
+
+
+@listens_for(Session, 'after_commit')
+def cache_added_words(session: Session):
+    for word, word_id in session.info.pop(ADDED_WORDS, {}).items():
+        word_ids_cache.set(word, word_id)
+
+
+@listens_for(Session, 'after_transaction_end')
+def discard_added_words(session: Session, transaction: SessionTransaction):
+    if transaction.parent is None:
+        session.info.pop(ADDED_WORDS, None)
+
+
+async def intern_words(db: AsyncSession, words: list[str]) -> list[int]:
+    """
+    Dictionary ids of words, missing ones are added in the caller's transaction.
+    Ids of committed words are cached, the ones added here once the caller commits.
+    """
+    added = db.sync_session.info.setdefault(ADDED_WORDS, {})
+    ids = {
+        word: word_id
+        for word in set(words)
+        if (word_id := word_ids_cache.get(word)) is not None or (word_id := added.get(word)) is not None
+    }
+
+    if missing := sorted(set(words) - ids.keys()):
+        # Sorted, so that concurrent transactions adding the same words lock them in the same order
+        missing_words = bindparam('missing_words', missing, type_=ARRAY(Text))
+        result = await db.execute(
+            insert(Word)
+            .from_select(['word'], select(func.unnest(missing_words)))
+            .on_conflict_do_nothing(index_elements=[Word.word])
+            .returning(Word.word, Word.id)
+        )
+        new_ids = dict(result.all())
+        added.update(new_ids)
+        ids.update(new_ids)
+
+        if existing := [word for word in missing if word not in ids]:
+            # Words added by concurrent transactions are committed by now and visible to a new statement
+            existing_words = bindparam('existing_words', existing, type_=ARRAY(Text))
+            result = await db.execute(select(Word.word, Word.id).where(Word.word == any_(existing_words)))
+            for word, word_id in result:
+                ids[word] = word_id
+                word_ids_cache.set(word, word_id)
+
+    return [ids[word] for word in words]
+
+
+def theme_values(payload: ThemeCreatePayload, word_ids: list[int]) -> dict:
+    """Columns of a new theme, its words are stored as dictionary ids"""
+    return payload.model_dump(exclude={'description'}) | {
+        'description': {'teams': payload.description.teams},
+        'word_ids': word_ids,
+    }
+
+
+async def get_theme_details(db: AsyncSession, user: User, theme_id: int) -> Row[tuple[Theme, bool, list, int]] | None:
+    """Theme with its creator, whether user has it in favourites and description summary"""
     query = await get_available_themes(user)
     result = await db.execute(
-        query.where(Theme.id == theme_id).options(selectinload(Theme.creator), selectinload(Theme.favourited_by))
+        query.add_columns(is_favourite(user), *theme_description_summary())
+        .where(Theme.id == theme_id)
+        .options(defer(Theme.description), defer(Theme.word_ids), selectinload(Theme.creator))
+    )
+
+    return result.one_or_none()
+
+
+async def get_theme_version(
+    db: AsyncSession, user: User, theme_id: int
+) -> Row[tuple[datetime, datetime | None, bool]] | None:
+    """What theme details depend on: theme and creator updated_at, favourite flag. None if theme is not available"""
+    available = await get_available_themes(user)
+    query = (
+        select(Theme.updated_at, User.updated_at, is_favourite(user))
+        .select_from(Theme)
+        .outerjoin(User, Theme.created_by == User.id)
+        .where(Theme.id == theme_id)
     )
-    instance = result.scalar_one_or_none()
+    if available.whereclause is not None:
+        query = query.where(available.whereclause)
+    result = await db.execute(query)
 
-    return instance
+    return result.one_or_none()
 
 
-async def get_game_details(db: AsyncSession, user: User, game_id: int) -> Game:
+async def get_theme_description(db: AsyncSession, theme_id: int) -> dict | None:
+    """Teams and words of a theme as it was created"""
     result = await db.execute(
-        select(Game)
+        select(
+            func.coalesce(Theme.description['teams'], literal_column("'[]'::jsonb")), word_texts(Theme.word_ids)
+        ).where(Theme.id == theme_id)
+    )
+    row = result.one_or_none()
+
+    return {'teams': row[0], 'words': row[1]} if row else None
+
+
+async def get_theme_words(
+    db: AsyncSession, user: User, theme_id: int, offset: int, limit: int
+) -> tuple[list[str], int] | None:
+    """Slice of theme words and their total number, None if theme is not available to the user"""
+    # Arrays are 1-based and slice bounds are inclusive
+    words_slice = word_texts(Theme.word_ids[offset + 1 : offset + limit])
+    query = await get_available_themes(user)
+    result = await db.execute(
+        query.with_only_columns(words_slice, func.cardinality(Theme.word_ids)).where(Theme.id == theme_id)
+    )
+    row = result.one_or_none()
+
+    return tuple(row) if row else None
+
+
+async def stream_theme_words(db: AsyncSession, theme_id: int, chunk_size: int = 1000) -> AsyncIterator[str]:
+    """Theme words one by one, fetched from a server side cursor in chunks"""
+    items = word_items(Theme.word_ids)
+    query = (
+        select(Word.word)
+        .select_from(Theme)
+        .join(items, true())
+        .join(Word, Word.id == items.c.word_id)
+        .where(Theme.id == theme_id)
+        .order_by(items.c.position)
+    )
+    result = await db.stream_scalars(query.execution_options(yield_per=chunk_size))
+    async for word in result:
+        yield word
+
+
+async def get_game_details(db: AsyncSession, user: User, game_id: int) -> Row[tuple[Game, list[str], list[str]]] | None:
+    """Game with its theme and guessed and skipped words"""
+    result = await db.execute(
+        select(
+            Game,
+            word_texts(Game.guessed_word_ids).label('words_guessed'),
+            word_texts(Game.skipped_word_ids).label('words_skipped'),
+        )
         .where(Game.id == game_id, Game.starter == user)
         .options(selectinload(Game.starter), selectinload(Game.theme))
     )
-    instance = result.scalar_one_or_none()
 
-    return instance
+    return result.one_or_none()
+
+
+def merged_word_ids(word_ids: ColumnElement[list[int]], new_word_ids: list[int]) -> ColumnElement[list[int]]:
+    """Array with new ids appended in order of first appearance, unless it already has them"""
+    items = word_items(bindparam(None, new_word_ids, type_=ARRAY(Integer)))
+    first = select(items.c.word_id, func.min(items.c.position).label('position')).group_by(items.c.word_id).subquery()
+    # Filtered outside the derived table, which is not correlated to the updated row
+    appended = (
+        select(func.array_agg(aggregate_order_by(first.c.word_id, first.c.position)))
+        .where(first.c.word_id != all_(word_ids))
+        .scalar_subquery()
+    )
+    return func.array_cat(word_ids, func.coalesce(appended, literal_column("'{}'::integer[]")))
+
+
+async def update_game_progress(
+    db: AsyncSession,
+    user: User,
+    game_id: int,
+    info: dict,
+    guessed_word_ids: list[int],
+    skipped_word_ids: list[int],
+    ended_at: datetime | None,
+    version: int | None = None,
+) -> Row[tuple[Game, list[str], list[str]]] | None:
+    """
+    Merge turn progress into a game of the user in a single UPDATE ... RETURNING, words are de-duplicated
+    by the database, concurrent updates serialize on the row instead of overwriting each other.
+    With version given, the game is updated only if it is still at that version.
+    Returns updated game with its words, None if there is no such game, its version has changed
+    or it has events not folded yet.
+    """
+    stmt = (
+        update(Game)
+        .where(Game.id == game_id, Game.started_by == user.id, Game.folded_event_seq == Game.event_seq)
+        .values(
+            info=info,
+            guessed_word_ids=merged_word_ids(Game.guessed_word_ids, guessed_word_ids),
+            skipped_word_ids=merged_word_ids(Game.skipped_word_ids, skipped_word_ids),
+            ended_at=ended_at,
+            version=Game.version + 1,
+        )
+        .returning(
+            Game,
+            word_texts(Game.guessed_word_ids).label('words_guessed'),
+            word_texts(Game.skipped_word_ids).label('words_skipped'),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if version is not None:
+        stmt = stmt.where(Game.version == version)
+    result = await db.execute(stmt)
+
+    return result.one_or_none()
+
+
+async def save_game_states(
+    db: AsyncSession,
+    snapshots: list[tuple[int, int, int, dict, list[str], list[str], datetime | None]],
+) -> set[int]:
+    """
+    Write snapshots (game id, version, event seq, info, guessed words, skipped words, ended_at)
+    of games kept elsewhere in one UPDATE ... FROM (VALUES ...). A snapshot is written only over an older version
+    with the same events applied, so a replayed or late one is skipped, and so is one of a game that got events
+    meanwhile. Returns ids of written games.
+    """
+    words = [word for snapshot in snapshots for word in snapshot[4] + snapshot[5]]
+    word_ids = dict(zip(words, await intern_words(db, words), strict=True))
+
+    rows = [
+        (
+            game_id,
+            version,
+            event_seq,
+            info,
+            [word_ids[word] for word in words_guessed],
+            [word_ids[word] for word in words_skipped],
+            ended_at,
+        )
+        for game_id, version, event_seq, info, words_guessed, words_skipped, ended_at in snapshots
+    ]
+    if not rows:
+        return set()
+    states = values(
+        column('game_id', Integer),
+        column('version', Integer),
+        column('event_seq', Integer),
+        column('info', JSONB),
+        column('guessed_word_ids', ARRAY(Integer)),
+        column('skipped_word_ids', ARRAY(Integer)),
+        column('ended_at', DateTime(timezone=True)),
+        name='states',
+    ).data(rows)
+    result = await db.execute(
+        update(Game)
+        .where(Game.id == states.c.game_id, Game.version < states.c.version, Game.event_seq == states.c.event_seq)
+        .values(
+            info=states.c.info,
+            guessed_word_ids=states.c.guessed_word_ids,
+            skipped_word_ids=states.c.skipped_word_ids,
+            # NULL values are rendered untyped
+            ended_at=cast(states.c.ended_at, DateTime(timezone=True)),
+            version=states.c.version,
+            # Time of the write rather than of the update kept in Redis, which can be older than an incremental
+            # export taken meanwhile
+            updated_at=func.now(),
+        )
+        .returning(Game.id)
+        .execution_options(synchronize_session=False)
+    )
+    saved = set(result.scalars())
+
+    await db.commit()
+    return saved
+
+
+async def append_game_events(
+    db: AsyncSession, user: User, game_id: int, first_seq: int, events: list[dict]
+) -> Row[tuple[int, int]] | None:
+    """
+    Append events numbered from first_seq on to a game of the user in progress, events with already taken
+    numbers are ignored. Returns last event number and version of the game, None if there is no such game,
+    first_seq leaves a gap after its last event or all the events are already appended.
+    """
+    last_seq = first_seq + len(events) - 1
+    # Locks the game row, so appends to a game are serialized
+    result = await db.execute(
+        update(Game)
+        .where(
+            Game.id == game_id,
+            Game.started_by == user.id,
+            Game.ended_at.is_(None),
+            Game.event_seq.between(first_seq - 1, last_seq - 1),
+        )
+        .values(event_seq=last_seq, version=Game.version + 1)
+        .returning(Game.event_seq, Game.version)
+    )
+    appended = result.one_or_none()
+    if appended is None:
+        return None
+
+    rows = [{'game_id': game_id, 'seq': seq} | event for seq, event in enumerate(events, start=first_seq)]
+    await db.execute(
+        insert(GameEvent).values(rows).on_conflict_do_nothing(index_elements=[GameEvent.game_id, GameEvent.seq])
+    )
+    return appended
+
+
+async def get_game_events_state(
+    db: AsyncSession, user: User, game_id: int
+) -> Row[tuple[datetime | None, int, int]] | None:
+    """End, last event number and version of a game of the user, None if there is no such game"""
+    result = await db.execute(
+        select(Game.ended_at, Game.event_seq, Game.version).where(Game.id == game_id, Game.started_by == user.id)
+    )
+
+    return result.one_or_none()
+
+
+def apply_game_events(game: Game, events: list[GameEvent]):
+    """Fold events into the game snapshot: info, played words and end"""
+    info = copy.deepcopy(game.info)
+    teams = info['teams']
+    guessed = dict.fromkeys(game.guessed_word_ids)
+    skipped = dict.fromkeys(game.skipped_word_ids)
+
+    def score(delta: int):
+        if 0 <= info['current_team_index'] < len(teams):
+            teams[info['current_team_index']]['score'] += delta
+
+    for event in events:
+        match event.kind:
+            case GameEventKind.GUESSED:
+                guessed[event.word_id] = None
+                score(1)
+            case GameEventKind.SKIPPED:
+                skipped[event.word_id] = None
+                if game.skip_penalty:
+                    score(-1)
+            case GameEventKind.TEAM_SWITCHED:
+                info['current_team_index'] = event.team_index
+            case GameEventKind.ROUND_ENDED:
+                info['current_round'] += 1
+            case GameEventKind.GAME_ENDED:
+                game.ended_at = event.occurred_at
+
+    game.info = info
+    game.guessed_word_ids = list(guessed)
+    game.skipped_word_ids = list(skipped)
+
+
+async def fold_game_events(db: AsyncSession, user: User, game_id: int) -> bool:
+    """Apply events appended since the last fold to a game of the user, False if there are none"""
+    game = await db.scalar(
+        select(Game)
+        .where(Game.id == game_id, Game.started_by == user.id, Game.folded_event_seq < Game.event_seq)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    if game is None:
+        return False
+
+    events = await db.scalars(
+        select(GameEvent)
+        .where(
+            GameEvent.game_id == game_id,
+            GameEvent.seq > game.folded_event_seq,
+            GameEvent.seq <= game.event_seq,
+        )
+        .order_by(GameEvent.seq)
+    )
+    apply_game_events(game, events.all())
+    game.folded_event_seq = game.event_seq
+    await db.flush()
+    return True
+
+
+async def get_game_words_source(
+    db: AsyncSession, user: User, game_id: int
+) -> Row[tuple[datetime | None, list[int] | None, list[int], list[int]]] | None:
+    """End of a game of the user, word ids of its theme and of words already played in it"""
+    result = await db.execute(
+        select(Game.ended_at, Theme.word_ids, Game.guessed_word_ids, Game.skipped_word_ids)
+        .select_from(Game)
+        .outerjoin(Theme, Game.theme_id == Theme.id)
+        .where(Game.id == game_id, Game.started_by == user.id)
+    )
+
+    return result.one_or_none()
+
+
+async def get_words(db: AsyncSession, word_ids: list[int]) -> list[str]:
+    """Words of dictionary ids, in the same order"""
+    result = await db.execute(
+        select(Word.id, Word.word).where(Word.id == any_(bindparam('word_ids', word_ids, type_=ARRAY(Integer))))
+    )
+    words = dict(result.all())
+    return [words[word_id] for word_id in word_ids if word_id in words]
+
+
+async def get_game_version(db: AsyncSession, user: User, game_id: int) -> Row[tuple[datetime, datetime | None]] | None:
+    """What game details depend on: game and theme updated_at. None if there is no such game of the user"""
+    result = await db.execute(
+        select(Game.updated_at, Theme.updated_at)
+        .select_from(Game)
+        .outerjoin(Theme, Game.theme_id == Theme.id)
+        .where(Game.id == game_id, Game.started_by == user.id)
+    )
+
+    return result.one_or_none()
+
+
+async def get_games_version(db: AsyncSession, query: Select[Game]) -> Row[tuple[int, datetime | None, datetime | None]]:
+    """Number of games matching the query and latest updated_at of them and of their themes"""
+    games = query.order_by(None).subquery()
+    result = await db.execute(
+        select(func.count(), func.max(games.c.updated_at), func.max(Theme.updated_at))
+        .select_from(games)
+        .outerjoin(Theme, games.c.theme_id == Theme.id)
+    )
+
+    return result.one()
 
 
 async def get_available_themes(user: User) -> Select[Theme]:
@@ -80,35 +552,59 @@ async def get_available_themes(user: User) -> Select[Theme]:
     return select(Theme).where(or_(Theme.public, Theme.creator == user))
 
 
-async def apply_themes_ordering(
-    query: Select[Theme],
+async def has_private_verified_themes(db: AsyncSession, user: User) -> bool:
+    """Whether verified themes available to the user differ from the public ones"""
+    query = select(Theme.id).where(Theme.created_by == user.id, Theme.verified, Theme.public.is_(False)).limit(1)
+    return await db.scalar(query) is not None
+
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def theme_search_query(search: str, language: str | None = None) -> ColumnElement:
+    """Text search query, stemmed for the language if it is known"""
+    config = func.theme_ts_config(language) if language else literal_column("'simple'::regconfig")
+    return func.websearch_to_tsquery(config, search)
+
+
+def themes_sort_keys(
     order_by: ThemeOrderBy = ThemeOrderBy.ID,
     descending: bool = False,
-) -> Select[Theme]:
-    order_func = desc if descending else asc
+    search: str | None = None,
+    language: str | None = None,
+) -> list[SortKey]:
+    """Ordering of theme listings, id always breaks ties so that keyset pagination is stable"""
+    theme_id = SortKey(Theme.id, descending)
 
     match order_by:
-        case ThemeOrderBy.ID:
-            query = query.order_by(order_func(Theme.id))
         case ThemeOrderBy.NAME:
-            query = query.order_by(order_func(Theme.name))
+            return [SortKey(Theme.name, descending, value_type=str), theme_id]
         case ThemeOrderBy.PLAYED_COUNT:
-            query = query.order_by(order_func(Theme.played_count))
+            return [SortKey(Theme.played_count, descending), theme_id]
         case ThemeOrderBy.LAST_PLAYED:
-            if descending:
-                query = query.order_by(Theme.last_played.desc().nulls_last())
-            else:
-                query = query.order_by(Theme.last_played.asc().nulls_last())
+            return [SortKey(Theme.last_played, descending, nullable=True, value_type=datetime), theme_id]
         case ThemeOrderBy.LIKES:
-            likes_count = (
-                select(func.count(UserToFavouriteThemes.user_id))
-                .where(UserToFavouriteThemes.theme_id == Theme.id)
-                .correlate(Theme)
-                .scalar_subquery()
+            return [SortKey(Theme.likes_count, descending), theme_id]
+        case ThemeOrderBy.RELEVANCE if search:
+            # Best matches always come first
+            rank = func.ts_rank(theme_search_vector(), theme_search_query(search, language)) + func.similarity(
+                Theme.name, search
             )
-            query = query.order_by(order_func(likes_count))
+            return [SortKey(rank, descending=True, value_type=float), SortKey(Theme.id)]
 
-    return query
+    return [theme_id]
+
+
+async def apply_themes_ordering(
+    query: Select[Theme],
+    order_by: ThemeOrderBy = ThemeOrderBy.ID,
+    descending: bool = False,
+    search: str | None = None,
+    language: str | None = None,
+) -> Select[Theme]:
+    keys = themes_sort_keys(order_by, descending, search, language)
+    return query.order_by(*(key.order_by() for key in keys))
 
 
 async def get_filtered_themes(
@@ -138,54 +634,280 @@ async def get_filtered_themes(
     if difficulty is not None:
         query = query.where(Theme.difficulty == difficulty)
     if name is not None:
-        query = query.where(Theme.name.ilike(f'%{name}%'))
+        # Substring match on name is served by trigram index, words match by text search index
+        query = query.where(
+            or_(
+                Theme.name.ilike(f'%{escape_like(name)}%', escape='\\'),
+                theme_search_vector().op('@@')(theme_search_query(name, language)),
+            )
+        )
 
     return query
 
 
+async def insert_themes(db: AsyncSession, rows: list[dict]) -> set[str]:
+    """Insert themes in one multi-row statement skipping existing names, return names actually inserted"""
+    stmt = insert(Theme).on_conflict_do_nothing(index_elements=[Theme.name]).returning(Theme.name)
+    result = await db.execute(stmt, rows)
+    return set(result.scalars())
+
+
+async def import_themes(
+    db: AsyncSession,
+    user: User,
+    lines: AsyncIterable[tuple[int, bytes | None]],
+    batch_size: int = settings.theme_import_batch_size,
+    max_errors: int = settings.theme_import_max_errors,
+) -> ThemeImportReport:
+    """
+    Validate NDJSON theme payloads one by one and insert them in batches, each batch is committed.
+    Memory is bounded by a batch whatever the size of the input.
+    """
+    report = ThemeImportReport()
+    batch: dict[str, tuple[int, ThemeCreatePayload]] = {}
+
+    async def flush():
+        # Words of the whole batch are added to the dictionary at once
+        payloads = [payload for _, payload in batch.values()]
+        word_ids = iter(await intern_words(db, [word for payload in payloads for word in payload.description.words]))
+        rows = [
+            theme_values(payload, [next(word_ids) for _ in payload.description.words]) | {'created_by': user.id}
+            for payload in payloads
+        ]
+
+        inserted = await insert_themes(db, rows)
+        await db.commit()
+
+        report.created += len(inserted)
+        for name, (number, _) in batch.items():
+            if name not in inserted:
+                report.duplicates += 1
+                report.add_error(number, f'Theme with name {name} already exists', max_errors)
+        batch.clear()
+
+    async for number, line in lines:
+        if line is None:
+            report.invalid += 1
+            report.add_error(number, 'Line is too long', max_errors)
+            continue
+
+        try:
+            payload = ThemeCreatePayload.model_validate_json(line)
+        except ValidationError as e:
+            report.invalid += 1
+            report.add_error(number, format_validation_error(e), max_errors)
+            continue
+
+        if payload.name in batch:
+            report.duplicates += 1
+            report.add_error(number, f'Theme with name {payload.name} already exists', max_errors)
+            continue
+
+        batch[payload.name] = (number, payload)
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+
+    logger.info(
+        'Imported themes: %d created, %d duplicates, %d invalid', report.created, report.duplicates, report.invalid
+    )
+    return report
+
+
+def format_validation_error(error: ValidationError) -> str:
+    return '; '.join(f'{".".join(map(str, e["loc"])) or "line"}: {e["msg"]}' for e in error.errors())
+
+
 async def add_to_favourite(db: AsyncSession, user: User, theme: Theme):
-    stmt = insert(UserToFavouriteThemes).values(user_id=user.id, theme_id=theme.id).on_conflict_do_nothing()
+    inserted = (
+        insert(UserToFavouriteThemes)
+        .values(user_id=user.id, theme_id=theme.id)
+        .on_conflict_do_nothing()
+        .returning(UserToFavouriteThemes.theme_id)
+        .cte('inserted')
+    )
 
-    await db.execute(stmt)
+    await db.execute(change_likes_count(theme.id, select(func.count()).select_from(inserted).scalar_subquery()))
     await db.commit()
 
 
 async def remove_from_favourite(db: AsyncSession, user: User, theme: Theme):
-    stmt = delete(UserToFavouriteThemes).where(
-        UserToFavouriteThemes.user_id == user.id, UserToFavouriteThemes.theme_id == theme.id
+    deleted = (
+        delete(UserToFavouriteThemes)
+        .where(UserToFavouriteThemes.user_id == user.id, UserToFavouriteThemes.theme_id == theme.id)
+        .returning(UserToFavouriteThemes.theme_id)
+        .cte('deleted')
     )
 
-    await db.execute(stmt)
+    await db.execute(change_likes_count(theme.id, -select(func.count()).select_from(deleted).scalar_subquery()))
     await db.commit()
 
 
+def change_likes_count(theme_id: int, delta: ColumnElement[int]):
+    """Adjust denormalized likes counter by the number of favourite rows actually changed in the same statement"""
+    return (
+        update(Theme)
+        .where(Theme.id == theme_id)
+        .values(likes_count=Theme.likes_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reconcile_likes_counts(db: AsyncSession) -> int:
+    """Fix drift of denormalized likes counters, returns number of corrected themes"""
+    actual = (
+        select(Theme.id.label('theme_id'), func.count(UserToFavouriteThemes.user_id).label('likes'))
+        .outerjoin(UserToFavouriteThemes, UserToFavouriteThemes.theme_id == Theme.id)
+        .group_by(Theme.id)
+        .subquery()
+    )
+    stmt = (
+        update(Theme)
+        .where(Theme.id == actual.c.theme_id, Theme.likes_count != actual.c.likes)
+        .values(likes_count=actual.c.likes)
+        .execution_options(synchronize_session=False)
+    )
+
+    result = await db.execute(stmt)
+    await db.commit()
+
+    if result.rowcount:
+        logger.warning('Reconciled likes counters of %d themes', result.rowcount)
+    return result.rowcount
+
+
+async def apply_theme_plays(
+    db: AsyncSession,
+    batch_id: str,
+    plays: list[tuple[int, int, datetime | None]],
+    batch_size: int,
+    retention: timedelta,
+) -> int:
+    """
+    Add aggregated plays (theme id, plays, last played) to theme counters, one UPDATE ... FROM (VALUES ...)
+    per batch_size themes, all in one transaction. Returns number of updated themes.
+    The batch id is recorded in the same transaction, a batch that was already applied is skipped.
+    """
+    recorded = await db.scalar(insert(PlayBatch).values(id=batch_id).on_conflict_do_nothing().returning(PlayBatch.id))
+    if recorded is None:
+        await db.rollback()
+        logger.warning('Play batch %s was already applied, skipping it', batch_id)
+        return 0
+
+    updated = 0
+    for start in range(0, len(plays), batch_size):
+        deltas = values(
+            column('theme_id', Integer),
+            column('plays', Integer),
+            column('last_played', DateTime(timezone=True)),
+            name='deltas',
+        ).data(plays[start : start + batch_size])
+        stmt = (
+            update(Theme)
+            .where(Theme.id == deltas.c.theme_id)
+            .values(
+                played_count=Theme.played_count + deltas.c.plays,
+                # greatest() skips NULL, batches without a timestamp keep the current one
+                last_played=func.greatest(Theme.last_played, deltas.c.last_played),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        updated += result.rowcount
+
+    await db.execute(delete(PlayBatch).where(PlayBatch.applied_at < func.now() - retention))
+    await db.commit()
+    return updated
+
+
+async def get_database_now(db: AsyncSession) -> datetime:
+    """Start of the current transaction by database clock, the one updated_at columns are set with"""
+    return await db.scalar(select(func.now()))
+
+
+EXPORT_MODELS: dict[ExportTable, type[Theme | Game]] = {ExportTable.THEMES: Theme, ExportTable.GAMES: Game}
+# Word ids are exported as words, so that an export is usable without the words table
+EXPORTED_WORDS = {'word_ids': 'words', 'guessed_word_ids': 'words_guessed', 'skipped_word_ids': 'words_skipped'}
+
+
+def export_selection(table: ExportTable) -> list[ColumnElement]:
+    return [
+        word_texts(column).label(EXPORTED_WORDS[column.name]) if column.name in EXPORTED_WORDS else column
+        for column in EXPORT_MODELS[table].__table__.c
+    ]
+
+
+def export_columns(table: ExportTable) -> list[str]:
+    return [column.name for column in export_selection(table)]
+
+
+async def stream_export(
+    db: AsyncSession,
+    table: ExportTable,
+    updated_since: datetime | None = None,
+    fetch_size: int = settings.export_fetch_size,
+    overlap: int = settings.export_overlap,
+) -> AsyncIterator[RowMapping]:
+    """
+    Rows of the table as plain mappings, read through a server side cursor fetch_size rows at a time.
+    Ordered by updated_at so that an interrupted incremental export can be resumed.
+    An incremental export repeats rows updated within overlap seconds before updated_since,
+    the last exported row of an id is the current one.
+    """
+    model = EXPORT_MODELS[table]
+    query = select(*export_selection(table)).order_by(model.updated_at, model.id)
+    if updated_since is not None:
+        query = query.where(model.updated_at > updated_since - timedelta(seconds=overlap))
+
+    result = await db.stream(query.execution_options(yield_per=fetch_size))
+    async for row in result.mappings():
+        yield row
+
+
 async def get_filtered_games(
     user: User,
     theme_id: int | None = None,
-    ended: bool = False,
+    ended: bool | None = None,
     skip_penalty: bool | None = None,
 ) -> Select[Game]:
+    """Games of the user, ended ones only if ended is true, in progress only if it is false"""
     query = select(Game).where(Game.starter == user).options(selectinload(Game.theme))
 
     if theme_id is not None:
         query = query.where(Game.theme_id == theme_id)
-    if ended:
-        query = query.where(Game.ended_at is not None)
+    if ended is not None:
+        query = query.where(Game.ended_at.is_not(None) if ended else Game.ended_at.is_(None))
     if skip_penalty is not None:
         query = query.where(Game.skip_penalty == skip_penalty)
 
     return query
 
 
+async def get_active_games(db: AsyncSession, user: User, limit: int) -> list[Game]:
+    """Latest games of the user in progress, read from the partial index of them"""
+    result = await db.scalars(
+        select(Game)
+        .where(Game.started_by == user.id, Game.ended_at.is_(None))
+        .order_by(Game.id.desc())
+        .limit(limit)
+        .options(selectinload(Game.theme))
+    )
+
+    return list(result)
+
+
+def games_sort_keys(order_by: GameOrderBy = GameOrderBy.ID, descending: bool = False) -> list[SortKey]:
+    match order_by:
+        case GameOrderBy.ID:
+            return [SortKey(Game.id, descending)]
+
+
 async def apply_games_ordering(
     query: Select[Game],
     order_by: GameOrderBy = GameOrderBy.ID,
     descending: bool = False,
 ) -> Select[Game]:
-    order_func = desc if descending else asc
-
-    match order_by:
-        case GameOrderBy.ID:
-            query = query.order_by(order_func(Game.id))
-
-    return query
+    keys = games_sort_keys(order_by, descending)
+    return query.order_by(*(key.order_by() for key in keys))
@@ -1,8 +1,8 @@
 from collections.abc import AsyncGenerator
 from datetime import UTC, datetime
 
-from sqlalchemy import Column, DateTime, func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, ColumnElement, DateTime, Index, Integer, and_, func, literal_column
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -60,12 +60,29 @@ class Auth(DbModel, table=True):
     id_token: str | None
 
 
+class Word(SQLModel, table=True):
+    """
+    Dictionary of words referenced by id from themes and games.
+    Rows are never updated nor deleted, so an id means the same word forever.
+    """
+
+    __tablename__ = 'words'
+
+    id: int | None = Field(default=None, primary_key=True)
+    word: str = Field(unique=True)
+
+
+def word_ids_column() -> Column:
+    return Column(ARRAY(Integer), nullable=False, server_default='{}')
+
+
 class Theme(DbModel, table=True):
     __tablename__ = 'themes'
 
     name: str = Field(max_length=255, unique=True)
     language: str = Field(default='en', max_length=2)  # ISO 639 alpha-2
-    description: dict | None = Field(default=None, sa_column=Column(JSONB))
+    description: dict | None = Field(default=None, sa_column=Column(JSONB))  # teams, words are in word_ids
+    word_ids: list[int] = Field(default_factory=list, sa_column=word_ids_column())
     played_count: int = Field(default=0)
     last_played: datetime | None = Field(
         default=None,
@@ -75,6 +92,7 @@ class Theme(DbModel, table=True):
     public: bool = Field(default=False)
     difficulty: int = Field(default=1, ge=1, le=5)
     verified: bool = Field(default=False)
+    likes_count: int = Field(default=0, sa_column_kwargs={'server_default': '0'})
 
     creator: User | None = Relationship(back_populates='themes')
     games: list[Game] = Relationship(back_populates='theme')
@@ -82,6 +100,52 @@ class Theme(DbModel, table=True):
     favourited_by: list[User] = Relationship(back_populates='favourite_themes', link_model=UserToFavouriteThemes)
 
 
+def theme_search_vector() -> ColumnElement:
+    """
+    Text search document of a theme: name (weight A) and words (weight B).
+    Words are spelled out by theme_words_text(word_ids), declared IMMUTABLE as the dictionary is append-only.
+    Lexemes are produced both with theme language config (stemmed) and with 'simple' one (as is),
+    so the document can be matched whether query language is known or not.
+    Constants are inlined to keep the expression identical to the one of ix_themes_search.
+    """
+    themes = Theme.__table__
+    language_config = func.theme_ts_config(themes.c.language)
+    simple_config = literal_column("'simple'::regconfig")
+    words = func.theme_words_text(themes.c.word_ids)
+
+    parts = [
+        func.setweight(func.to_tsvector(language_config, themes.c.name), literal_column("'A'")),
+        func.setweight(func.to_tsvector(simple_config, themes.c.name), literal_column("'A'")),
+        func.setweight(func.to_tsvector(language_config, words), literal_column("'B'")),
+        func.setweight(func.to_tsvector(simple_config, words), literal_column("'B'")),
+    ]
+    vector = parts[0]
+    for part in parts[1:]:
+        vector = vector.op('||', return_type=TSVECTOR)(part)
+    return vector
+
+
+Index('ix_themes_likes_count', Theme.likes_count, Theme.id)
+
+# Listings of non-admin users: verified catalog is a small partial slice of themes,
+# filtered by language/difficulty and sorted by one of ThemeOrderBy keys with id as tiebreaker
+THEMES_CATALOG = and_(Theme.verified, Theme.public)
+Index('ix_themes_catalog', Theme.language, Theme.difficulty, Theme.id, postgresql_where=THEMES_CATALOG)
+Index('ix_themes_catalog_played_count', Theme.played_count, Theme.id, postgresql_where=THEMES_CATALOG)
+Index(
+    'ix_themes_catalog_last_played',
+    Theme.last_played.desc().nulls_last(),
+    Theme.id.desc(),
+    postgresql_where=THEMES_CATALOG,
+)
+Index('ix_themes_catalog_likes_count', Theme.likes_count, Theme.id, postgresql_where=THEMES_CATALOG)
+# Unverified listings: public themes OR-ed with the user's own ones
+Index('ix_themes_public', Theme.language, Theme.difficulty, Theme.id, postgresql_where=Theme.public)
+Index('ix_themes_created_by', Theme.created_by, Theme.id)
+Index('ix_themes_name_trgm', Theme.name, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+Theme.__table__.append_constraint(Index('ix_themes_search', theme_search_vector(), postgresql_using='gin'))
+
+
 class Game(DbModel, table=True):
     __tablename__ = 'games'
 
@@ -96,14 +160,53 @@ class Game(DbModel, table=True):
     points: int
     round: int = Field(default=30)
     skip_penalty: bool = Field(default=True)
-    words_guessed: list = Field(default_factory=list, sa_column=Column(JSONB))
-    words_skipped: list = Field(default_factory=list, sa_column=Column(JSONB))
+    guessed_word_ids: list[int] = Field(default_factory=list, sa_column=word_ids_column())
+    skipped_word_ids: list[int] = Field(default_factory=list, sa_column=word_ids_column())
+    # Bumped by every progress update, clients pass the one they have seen to detect concurrent updates
+    version: int = Field(default=0, sa_column_kwargs={'server_default': '0'})
+    # Sequence number of the last appended event and of the last one applied to the columns above
+    event_seq: int = Field(default=0, sa_column_kwargs={'server_default': '0'})
+    folded_event_seq: int = Field(default=0, sa_column_kwargs={'server_default': '0'})
 
     # Relationships
     theme: Theme | None = Relationship(back_populates='games')
     starter: User | None = Relationship(back_populates='games')
 
 
+class GameEvent(SQLModel, table=True):
+    """Turn of a game, append-only, numbered in sequence within the game"""
+
+    __tablename__ = 'game_events'
+
+    game_id: int = Field(foreign_key='games.id', primary_key=True, ondelete='CASCADE')
+    seq: int = Field(primary_key=True)
+    kind: str = Field(max_length=16)
+    occurred_at: datetime = Field(sa_type=DateTime(timezone=True))
+    word_id: int | None = Field(default=None, foreign_key='words.id')
+    team_index: int | None = None
+
+
+class PlayBatch(SQLModel, table=True):
+    """Batch of play counters applied to themes, a batch flushed again after a failure is not applied twice"""
+
+    __tablename__ = 'play_batches'
+
+    id: str = Field(primary_key=True, max_length=32)
+    applied_at: datetime = Field(
+        default_factory=lambda: datetime.now(UTC),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={'nullable': False, 'server_default': func.now()},
+        index=True,
+    )
+
+
+# Game listings of a user, newest first: all games, games of a theme, or games in progress,
+# which are a small slice of the user's games and back resuming them
+Index('ix_games_started_by', Game.started_by, Game.id)
+Index('ix_games_started_by_theme', Game.started_by, Game.theme_id, Game.id)
+Index('ix_games_started_by_active', Game.started_by, Game.id, postgresql_where=Game.ended_at.is_(None))
+
+
 DATABASE_URL = f'postgresql+asyncpg://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}'
 engine = create_async_engine(DATABASE_URL, echo=False, future=True)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
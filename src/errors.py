@@ -4,6 +4,9 @@ from enum import StrEnum
 class ErrorCodes(StrEnum):
     UNKNOWN_ERROR = 'UNKNOWN_ERROR'
     AUTH_ERROR = 'AUTH_ERROR'
+    FORBIDDEN = 'FORBIDDEN'
+    UPSTREAM_ERROR = 'UPSTREAM_ERROR'
+    CIRCUIT_OPEN = 'CIRCUIT_OPEN'
 
 
 class BaseError(Exception):
@@ -31,3 +34,24 @@ class AuthError(BaseError):
 
     default_msg = 'Auth error'
     error_code = ErrorCodes.AUTH_ERROR
+
+
+class ForbiddenError(BaseError):
+    """Authenticated user lacks permissions"""
+
+    default_msg = 'Forbidden'
+    error_code = ErrorCodes.FORBIDDEN
+
+
+class UpstreamError(BaseError):
+    """External service failed or timed out"""
+
+    default_msg = 'Upstream service error'
+    error_code = ErrorCodes.UPSTREAM_ERROR
+
+
+class CircuitOpenError(UpstreamError):
+    """External service is considered degraded, call rejected without trying"""
+
+    default_msg = 'Upstream service %s is unavailable'
+    error_code = ErrorCodes.CIRCUIT_OPEN
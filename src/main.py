@@ -9,11 +9,18 @@ from starlette.middleware.cors import CORSMiddleware
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 
-from api import auth, game, theme
-from cache import close_cache, init_cache
-from db import get_db
-from errors import AuthError
+from api import auth, export, game, theme
+from cache import close_cache, get_cache, init_cache
+from db import User, get_db
+from errors import AuthError, ForbiddenError, UpstreamError
 from log import init_logging
+from utils.game_channels import game_channels
+from utils.game_states import game_states
+from utils.http_client import close_http, init_http
+from utils.identity import identity_cache
+from utils.metrics import cache_stats
+from utils.oauth import get_current_admin, google_jwks
+from utils.play_counters import play_counters
 
 
 @asynccontextmanager
@@ -21,8 +28,19 @@ async def lifespan(app: FastAPI):
     # Startup
     await init_logging()
     await init_cache()
+    await init_http()
+    play_counters.start()
+    game_states.start()
+    await game_channels.start(await get_cache())
+    await identity_cache.start(await get_cache())
     yield
     # Shutdown
+    await identity_cache.stop()
+    await game_channels.stop()
+    await game_states.stop()
+    await play_counters.stop()
+    await google_jwks.close()
+    await close_http()
     await close_cache()
 
 
@@ -39,6 +57,7 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(theme.router)
 app.include_router(game.router)
+app.include_router(export.router)
 
 add_pagination(app)
 
@@ -51,7 +70,28 @@ async def auth_error_handler(request: Request, exc: AuthError):
     )
 
 
+@app.exception_handler(ForbiddenError)
+async def forbidden_error_handler(request: Request, exc: ForbiddenError):
+    return JSONResponse(
+        status_code=status.HTTP_403_FORBIDDEN,
+        content={'detail': str(exc)},
+    )
+
+
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={'detail': str(exc)},
+    )
+
+
 @app.get('/ping')
 async def ping(db: AsyncSession = Depends(get_db)):
     await db.execute(text('SELECT 1'))
     return {'ping': 'pong'}
+
+
+@app.get('/stats/caches')
+async def get_cache_stats(admin: User = Depends(get_current_admin)):
+    return {name: stats.as_dict() for name, stats in cache_stats.items()}
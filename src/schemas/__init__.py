@@ -1,3 +1,3 @@
-from .common import ErrorResponse
+from .common import CountMode, CursorPage, ErrorResponse
 
-__all__ = [ErrorResponse]
+__all__ = [CountMode, CursorPage, ErrorResponse]
@@ -1,5 +1,21 @@
+from enum import StrEnum
+
 from pydantic import BaseModel
 
 
 class ErrorResponse(BaseModel):
     detail: str
+
+
+class CountMode(StrEnum):
+    NONE = 'none'
+    EXACT = 'exact'
+    ESTIMATE = 'estimate'
+
+
+class CursorPage[T](BaseModel):
+    """Keyset paginated listing, pass next_cursor back to get the following page"""
+
+    items: list[T]
+    next_cursor: str | None = None
+    total: int | None = None
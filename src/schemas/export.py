@@ -0,0 +1,11 @@
+from enum import StrEnum
+
+
+class ExportTable(StrEnum):
+    THEMES = 'themes'
+    GAMES = 'games'
+
+
+class ExportFormat(StrEnum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
@@ -1,9 +1,11 @@
 from datetime import datetime
 from enum import StrEnum
+from typing import Literal, Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from sqlmodel import SQLModel
 
+from conf import settings
 from schemas.theme import ThemeBase
 
 
@@ -38,6 +40,7 @@ class GameDetailsResponse(GameBase):
     """For getting details"""
 
     id: int
+    version: int
     info: GameInfo
     words_guessed: list[str]
     words_skipped: list[str]
@@ -47,6 +50,7 @@ class GameDetailsResponse(GameBase):
 
 class GameUpsertedResponse(GameBase):
     id: int
+    version: int
     info: GameInfo
     words_guessed: list[str]
     words_skipped: list[str]
@@ -56,11 +60,102 @@ class GameCreatePayload(GameBase):
     info: GameInfo
 
 
+class GameDeal(BaseModel):
+    """Next words of the game deck"""
+
+    words: list[str]
+    remaining: int
+
+
 class GameUpdatePayload(BaseModel):
+    """Progress of a turn, words are added to the ones already played"""
+
     info: GameInfo
     words_guessed: list[str]
     words_skipped: list[str]
     ended_at: datetime | None = None
+    version: int | None = Field(None, description='Game version the update is based on, 409 if it has changed since')
+
+
+class GameEventKind(StrEnum):
+    GUESSED = 'guessed'
+    SKIPPED = 'skipped'
+    TEAM_SWITCHED = 'team_switched'
+    ROUND_ENDED = 'round_ended'
+    GAME_ENDED = 'game_ended'
+
+
+class GameEventPayload(BaseModel):
+    kind: GameEventKind
+    occurred_at: datetime
+    word: str | None = Field(None, description='Guessed or skipped word')
+    team_index: int | None = Field(None, ge=0, description='Team whose turn it is now, for team_switched')
+
+    @model_validator(mode='after')
+    def validate_kind_fields(self) -> Self:
+        if self.kind in (GameEventKind.GUESSED, GameEventKind.SKIPPED) and self.word is None:
+            raise ValueError(f'{self.kind} event requires word')
+        if self.kind == GameEventKind.TEAM_SWITCHED and self.team_index is None:
+            raise ValueError(f'{self.kind} event requires team_index')
+        return self
+
+
+class GameEventsPayload(BaseModel):
+    """Batch of turn events, sent instead of the whole game state"""
+
+    first_seq: int = Field(
+        ge=1,
+        description='Sequence number of the first event, events already appended by a retried batch are ignored',
+    )
+    events: list[GameEventPayload] = Field(min_length=1, max_length=settings.game_events_batch_max_size)
+
+    @model_validator(mode='after')
+    def validate_game_end(self) -> Self:
+        if any(event.kind == GameEventKind.GAME_ENDED for event in self.events[:-1]):
+            raise ValueError(f'{GameEventKind.GAME_ENDED} must be the last event')
+        return self
+
+    @property
+    def last_seq(self) -> int:
+        return self.first_seq + len(self.events) - 1
+
+
+class GameEventsAppended(BaseModel):
+    last_seq: int
+    version: int
+
+
+class GameChannelAuth(BaseModel):
+    """First message of a game channel client"""
+
+    token: str
+
+
+class GameSnapshotMessage(BaseModel):
+    """First message of a game channel, later messages of the same or older version are already in it"""
+
+    type: Literal['snapshot'] = 'snapshot'
+    game: GameDetailsResponse
+
+
+class GameProgressMessage(BaseModel):
+    """Progress update of a game, with the words it has added"""
+
+    type: Literal['progress'] = 'progress'
+    version: int
+    info: GameInfo
+    words_guessed: list[str]
+    words_skipped: list[str]
+    ended_at: datetime | None
+
+
+class GameEventsMessage(BaseModel):
+    """Events appended to a game, numbered from first_seq on"""
+
+    type: Literal['events'] = 'events'
+    version: int
+    first_seq: int
+    events: list[GameEventPayload]
 
 
 class GameOrderBy(StrEnum):
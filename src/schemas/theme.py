@@ -27,6 +27,13 @@ class ThemeDescription(BaseModel):
         return v
 
 
+class ThemeDescriptionSummary(BaseModel):
+    """Description without words, they are served page by page by /themes/{id}/words"""
+
+    teams: list[str]
+    words_count: int
+
+
 class ThemeBase(SQLModel):
     name: str = Field(max_length=255)
     language: str = Field(default='en', max_length=2)  # ISO 639 alpha-2
@@ -42,7 +49,7 @@ class ThemeBase(SQLModel):
 class ThemeDetailsResponse(ThemeBase):
     id: int
     public: bool
-    description: ThemeDescription
+    description: ThemeDescriptionSummary
     played_count: int = 0
     last_played: datetime | None = None
     creator: UserBase
@@ -56,6 +63,14 @@ class ThemeListItem(ThemeBase):
     id: int
 
 
+class ThemeWordsPage(BaseModel):
+    """Slice of theme words"""
+
+    items: list[str]
+    offset: int
+    total: int
+
+
 class ThemeCreatePayload(ThemeBase):
     """For theme creation"""
 
@@ -63,6 +78,27 @@ class ThemeCreatePayload(ThemeBase):
     public: bool = False
 
 
+class ThemeImportError(BaseModel):
+    line: int
+    error: str
+
+
+class ThemeImportReport(BaseModel):
+    """Result of bulk import, only first errors are listed"""
+
+    created: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list[ThemeImportError] = []
+    errors_truncated: bool = False
+
+    def add_error(self, line: int, error: str, max_errors: int):
+        if len(self.errors) < max_errors:
+            self.errors.append(ThemeImportError(line=line, error=error))
+        else:
+            self.errors_truncated = True
+
+
 class ThemeUpdatePayload(BaseModel):
     """For theme update"""
 
@@ -75,3 +111,4 @@ class ThemeOrderBy(StrEnum):
     PLAYED_COUNT = 'played_count'
     LAST_PLAYED = 'last_played'
     LIKES = 'likes'
+    RELEVANCE = 'relevance'
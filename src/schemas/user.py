@@ -5,3 +5,9 @@ class UserBase(SQLModel):
     email: str
     picture: str = ''
     admin: bool = False
+
+
+class AuxTokenPayload(UserBase):
+    """Identity carried by aux token"""
+
+    user_id: int
@@ -0,0 +1,59 @@
+import hashlib
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def make_etag(*parts) -> str:
+    """Weak validator of a representation identified by parts (ids, updated_at, flags, ...)"""
+    digest = hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def body_etag(body: bytes | str) -> str:
+    return make_etag(hashlib.sha256(body.encode() if isinstance(body, str) else body).hexdigest())
+
+
+def is_conditional(request: Request) -> bool:
+    return 'if-none-match' in request.headers or 'if-modified-since' in request.headers
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """Weak comparison as required for If-None-Match"""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque for tag in if_none_match.split(','))
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None = None) -> bool:
+    """If-None-Match takes precedence over If-Modified-Since (RFC 9110, 13.2.2)"""
+    if (if_none_match := request.headers.get('if-none-match')) is not None:
+        return etag_matches(etag, if_none_match)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except TypeError, ValueError:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=UTC)
+    # HTTP dates have second precision
+    return last_modified.replace(microsecond=0) <= since
+
+
+def validator_headers(etag: str, last_modified: datetime | None = None) -> dict[str, str]:
+    # Representations depend on the user, clients must revalidate before reuse
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified.astimezone(UTC), usegmt=True)
+    return headers
+
+
+def not_modified(etag: str, last_modified: datetime | None = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, last_modified))
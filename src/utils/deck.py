@@ -0,0 +1,68 @@
+import random
+
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+
+from conf import settings
+
+
+class DeckStore:
+    """
+    Shuffled word ids of games in Redis lists, dealt from the head with LPOP count, O(N) per deal.
+    Id of the game owner is kept next to a deck: only the owner is dealt from it, and an exhausted deck
+    (Redis drops empty lists) is not built again.
+    """
+
+    def __init__(self, namespace: str, ttl: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.push_size = 10_000
+
+    def key(self, game_id: int) -> str:
+        return f'{self.namespace}:{game_id}'
+
+    def owner_key(self, game_id: int) -> str:
+        return f'{self.key(game_id)}:owner'
+
+    async def deal(self, redis: Redis, game_id: int, owner_id: int, count: int) -> tuple[list[int], int] | None:
+        """Next word ids and number of remaining ones, None if there is no deck of the game built for the owner"""
+        key, owner_key = self.key(game_id), self.owner_key(game_id)
+        if await redis.get(owner_key) != str(owner_id):
+            return None
+
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.lpop(key, count)
+            pipe.llen(key)
+            pipe.expire(key, self.ttl)
+            pipe.expire(owner_key, self.ttl)
+            word_ids, remaining, *_ = await pipe.execute()
+
+        return [int(word_id) for word_id in word_ids or []], remaining
+
+    async def build(self, redis: Redis, game_id: int, owner_id: int, word_ids: list[int]):
+        """Shuffle and store the deck, unless another request has built it meanwhile"""
+        deck = list(word_ids)
+        random.shuffle(deck)
+
+        key, owner_key = self.key(game_id), self.owner_key(game_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(owner_key)
+                if await pipe.exists(owner_key):
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                for start in range(0, len(deck), self.push_size):
+                    pipe.rpush(key, *deck[start : start + self.push_size])
+                pipe.expire(key, self.ttl)
+                pipe.set(owner_key, str(owner_id), ex=self.ttl)
+                await pipe.execute()
+            except WatchError:
+                # Built by a concurrent request
+                pass
+
+    async def drop(self, redis: Redis, game_id: int):
+        await redis.delete(self.key(game_id), self.owner_key(game_id))
+
+
+game_decks = DeckStore('game:deck', ttl=settings.game_deck_ttl)
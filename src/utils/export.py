@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterable, AsyncIterator, Mapping
+from datetime import datetime
+
+from schemas.export import ExportFormat
+
+MEDIA_TYPES = {ExportFormat.NDJSON: 'application/x-ndjson', ExportFormat.CSV: 'text/csv'}
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+async def ndjson_lines(rows: AsyncIterable[Mapping]) -> AsyncIterator[str]:
+    async for row in rows:
+        yield json.dumps(dict(row), ensure_ascii=False, default=json_default) + '\n'
+
+
+def csv_value(value) -> str:
+    """Nested JSON documents are written as JSON text, NULL as empty field"""
+    if value is None:
+        return ''
+    if isinstance(value, dict | list):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def csv_lines(rows: AsyncIterable[Mapping], columns: list[str]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values: list) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(columns)
+    async for row in rows:
+        yield line([csv_value(row[column]) for column in columns])
+
+
+def export_lines(rows: AsyncIterable[Mapping], columns: list[str], export_format: ExportFormat) -> AsyncIterator[str]:
+    if export_format == ExportFormat.CSV:
+        return csv_lines(rows, columns)
+    return ndjson_lines(rows)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+
+from conf import settings
+
+logger = logging.getLogger('utils.game_channels')
+
+
+class Subscription:
+    """
+    Messages of a game for one subscriber, bounded so that a slow consumer can't hold the others back.
+    A subscriber that falls behind by more than the queue size is dropped, it has to start over from a snapshot.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(queue_size)
+        self.dropped = False
+
+    def put(self, message: str):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.drop()
+
+    def drop(self):
+        self.dropped = True
+        # Wakes the consumer up if it is waiting for a message
+        if self.queue.empty():
+            self.queue.put_nowait('')
+
+    async def get(self) -> str | None:
+        """Next message, None once the subscriber is dropped"""
+        message = await self.queue.get()
+        return None if self.dropped else message
+
+
+class GameChannels:
+    """
+    Fan-out of game updates to subscribers of all workers through Redis pub/sub.
+    A worker has a single pub/sub connection, subscribed to games that have local subscribers,
+    each message is serialized once by the publisher and passed on to local subscribers as is.
+    """
+
+    def __init__(self, prefix: str, queue_size: int):
+        self.prefix = prefix
+        self.queue_size = queue_size
+        self.subscriptions: dict[int, set[Subscription]] = {}
+        self.pubsub: PubSub | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def channel(self, game_id: int) -> str:
+        return f'{self.prefix}:{game_id}'
+
+    async def publish(self, redis: Redis, game_id: int, message: str):
+        await redis.publish(self.channel(game_id), message)
+
+    @asynccontextmanager
+    async def subscribe(self, game_id: int) -> AsyncIterator[Subscription]:
+        subscription = Subscription(self.queue_size)
+        async with self._lock:
+            subscriptions = self.subscriptions.setdefault(game_id, set())
+            if not subscriptions:
+                await self.pubsub.subscribe(self.channel(game_id))
+            subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            async with self._lock:
+                subscriptions.discard(subscription)
+                if not subscriptions and self.subscriptions.get(game_id) is subscriptions:
+                    del self.subscriptions[game_id]
+                    await self.pubsub.unsubscribe(self.channel(game_id))
+
+    def dispatch(self, channel: str, message: str):
+        game_id = int(channel.rpartition(':')[2])
+        for subscription in self.subscriptions.get(game_id, ()):
+            subscription.put(message)
+
+    def drop_all(self):
+        for subscriptions in self.subscriptions.values():
+            for subscription in subscriptions:
+                subscription.drop()
+
+    async def run(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except RedisError:
+                # Messages published meanwhile are lost, subscribers have to start over
+                logger.exception('Game channels connection failed')
+                self.drop_all()
+                await asyncio.sleep(1)
+                continue
+            if message is not None and message['type'] == 'message':
+                self.dispatch(message['channel'], message['data'])
+
+    async def start(self, redis: Redis):
+        self.pubsub = redis.pubsub()
+        await self.pubsub.connect()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.drop_all()
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+
+
+game_channels = GameChannels('game:channel', queue_size=settings.game_channel_queue_size)
@@ -0,0 +1,400 @@
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime
+from enum import StrEnum
+
+from redis.asyncio import Redis
+
+from cache import get_cache
+from conf import settings
+from dal import save_game_states
+from db import async_session
+from schemas.game import GameDetailsResponse, GameInfo, GameUpdatePayload
+
+logger = logging.getLogger('utils.game_states')
+
+# Fields of game details that don't change while the game is in progress
+STATIC_FIELDS = set(GameDetailsResponse.model_fields) - {
+    'version',
+    'info',
+    'words_guessed',
+    'words_skipped',
+    'ended_at',
+}
+
+# KEYS: state, guessed, skipped. ARGV: ttl, number of fields and values, fields and values,
+# number of guessed words, guessed words, number of skipped words, skipped words.
+# A loaded game is not dirty, Postgres has it: it expires unless it is updated
+SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local arg = 2
+local count = tonumber(ARGV[arg])
+redis.call('DEL', KEYS[2], KEYS[3])
+redis.call('HSET', KEYS[1], unpack(ARGV, arg + 1, arg + count))
+arg = arg + count + 1
+local words = 0
+for _, key in ipairs({KEYS[2], KEYS[3]}) do
+    count = tonumber(ARGV[arg])
+    for i = arg + 1, arg + count do
+        words = words + redis.call('ZADD', key, 'NX', words + 1, ARGV[i])
+    end
+    arg = arg + count + 1
+end
+redis.call('HSET', KEYS[1], 'words', words)
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[1])
+end
+return 1
+"""
+
+# KEYS: state, guessed, skipped, evicting, dirty. ARGV: owner id, expected version or '', game id,
+# number of fields and values, fields and values, number of guessed words, guessed words,
+# number of skipped words, skipped words. A dirty game never expires, it is given a ttl again once it is flushed
+APPLY_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'user', 'version', 'words')
+if state[1] ~= ARGV[1] then
+    return {'missing'}
+end
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    return {'busy'}
+end
+if ARGV[2] ~= '' and ARGV[2] ~= state[2] then
+    return {'conflict'}
+end
+local arg = 4
+local count = tonumber(ARGV[arg])
+redis.call('HSET', KEYS[1], 'version', tonumber(state[2]) + 1, unpack(ARGV, arg + 1, arg + count))
+arg = arg + count + 1
+local words = tonumber(state[3])
+for _, key in ipairs({KEYS[2], KEYS[3]}) do
+    count = tonumber(ARGV[arg])
+    for i = arg + 1, arg + count do
+        words = words + redis.call('ZADD', key, 'NX', words + 1, ARGV[i])
+    end
+    arg = arg + count + 1
+end
+redis.call('HSET', KEYS[1], 'words', words)
+redis.call('SADD', KEYS[5], ARGV[3])
+for i = 1, 3 do
+    redis.call('PERSIST', KEYS[i])
+end
+return {
+    'applied',
+    redis.call('HGETALL', KEYS[1]),
+    cjson.encode(redis.call('ZRANGE', KEYS[2], 0, -1)),
+    cjson.encode(redis.call('ZRANGE', KEYS[3], 0, -1)),
+}
+"""
+
+# KEYS: state, guessed, skipped. Words are returned as JSON arrays: a single reply is parsed much faster
+# than thousands of them
+READ_SCRIPT = """
+local fields = redis.call('HGETALL', KEYS[1])
+if #fields == 0 then
+    return false
+end
+return {
+    fields,
+    cjson.encode(redis.call('ZRANGE', KEYS[2], 0, -1)),
+    cjson.encode(redis.call('ZRANGE', KEYS[3], 0, -1)),
+}
+"""
+
+# KEYS: dirty. ARGV: namespace, ttl, then game id, flushed version ('' if the state was gone) and 1 if it was
+# written or 0 if Postgres already had it or a newer one, for each flushed game.
+# A written game is clean and expires unless it is updated again, one updated meanwhile stays dirty and persistent
+ACK_SCRIPT = """
+for i = 3, #ARGV, 3 do
+    local key = ARGV[1] .. ':' .. ARGV[i]
+    local state = redis.call('HMGET', key, 'version', 'ended_at')
+    if not state[1] or state[1] == ARGV[i + 1] then
+        redis.call('SREM', KEYS[1], ARGV[i])
+        if state[1] and (ARGV[i + 2] == '0' or state[2] ~= '') then
+            redis.call('DEL', key, key .. ':guessed', key .. ':skipped')
+        elseif state[1] then
+            for _, state_key in ipairs({key, key .. ':guessed', key .. ':skipped'}) do
+                redis.call('EXPIRE', state_key, ARGV[2])
+            end
+        end
+    end
+end
+return 0
+"""
+
+
+# Scripts are run on the client of the caller, the one they are registered with only encodes them
+_scripts = Redis(decode_responses=True)
+seed_script = _scripts.register_script(SEED_SCRIPT)
+apply_script = _scripts.register_script(APPLY_SCRIPT)
+read_script = _scripts.register_script(READ_SCRIPT)
+ack_script = _scripts.register_script(ACK_SCRIPT)
+
+
+class UpdateStatus(StrEnum):
+    APPLIED = 'applied'
+    # Not in Redis for this user, to be loaded from Postgres first
+    MISSING = 'missing'
+    # Being saved and evicted, to be retried shortly
+    BUSY = 'busy'
+    # Expected version has changed
+    CONFLICT = 'conflict'
+
+
+@dataclass
+class GameState:
+    """Game in progress as kept in Redis"""
+
+    game: GameDetailsResponse
+    user_id: int
+    # Events folded into the game when it was loaded, a snapshot is saved only over the same ones
+    event_seq: int
+    updated_at: datetime
+    theme_updated_at: datetime | None
+
+
+def encode_time(value: datetime | None) -> str:
+    return value.isoformat() if value is not None else ''
+
+
+def decode_time(value: str) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+def progress_fields(info: GameInfo, ended_at: datetime | None, updated_at: datetime) -> dict[str, str | int]:
+    """Hash fields of the state that turns change: team scores are fields of their own"""
+    fields = {
+        'teams': json.dumps([team.name for team in info.teams]),
+        'current_team_index': info.current_team_index,
+        'current_round': info.current_round,
+        'ended_at': encode_time(ended_at),
+        'updated_at': encode_time(updated_at),
+    }
+    for index, team in enumerate(info.teams):
+        fields[f'score:{index}'] = team.score
+    return fields
+
+
+def decode_state(reply: list[list[str] | str]) -> GameState:
+    """State from the reply of a script: hash fields and values, guessed and skipped words as JSON"""
+    flat_fields, words_guessed, words_skipped = reply
+    fields = dict(zip(flat_fields[::2], flat_fields[1::2], strict=True))
+    teams = [
+        {'name': name, 'score': int(fields[f'score:{index}'])} for index, name in enumerate(json.loads(fields['teams']))
+    ]
+    game = json.loads(fields['details']) | {
+        'version': int(fields['version']),
+        'info': {
+            'teams': teams,
+            'current_team_index': int(fields['current_team_index']),
+            'current_round': int(fields['current_round']),
+        },
+        # Lua encodes an empty array as an object
+        'words_guessed': json.loads(words_guessed) or [],
+        'words_skipped': json.loads(words_skipped) or [],
+        'ended_at': decode_time(fields['ended_at']),
+    }
+    return GameState(
+        game=GameDetailsResponse.model_validate(game),
+        user_id=int(fields['user']),
+        event_seq=int(fields['event_seq']),
+        updated_at=decode_time(fields['updated_at']),
+        theme_updated_at=decode_time(fields['theme_updated_at']),
+    )
+
+
+def flatten(fields: dict[str, str | int]) -> list[str | int]:
+    return [len(fields) * 2, *(item for field in fields.items() for item in field)]
+
+
+def word_args(words_guessed: list[str], words_skipped: list[str]) -> list[str | int]:
+    return [len(words_guessed), *words_guessed, len(words_skipped), *words_skipped]
+
+
+class GameStateStore:
+    """
+    Games in progress kept in Redis, written behind to Postgres.
+    A game is loaded on its first update: a hash with team scores and the current turn as fields,
+    guessed and skipped words as sorted sets ordered by when they were played. Updates are applied by a script
+    in one round trip and mark the game dirty; a flusher saves dirty games to Postgres in batched UPDATEs.
+
+    Durability:
+    - An update is acknowledged once it is in Redis, it reaches Postgres within a flush interval.
+    - Dirty games are tracked in Redis, a worker that crashes or restarts loses nothing: any worker flushes them.
+    - A failed flush keeps games dirty, a game updated while being flushed stays dirty for its newer version.
+    - Dirty games never expire, however long Postgres is unavailable, they expire after the ttl once saved.
+    - Snapshots are versioned, a replayed or late one never overwrites a newer row.
+    - A game that has ended is saved and evicted before the update is answered, left to the flusher if that fails.
+    - If Redis loses its data, updates not flushed yet are lost (at most an interval of them)
+      and games are loaded again from Postgres on their next update.
+    - Events are appended to Postgres, the game is saved and evicted first. A game loaded concurrently
+      with appended events would fork from them: its snapshot is not saved over the events, it is discarded.
+    """
+
+    def __init__(self, namespace: str, ttl: int, interval: float, batch_size: int, lock_ttl: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock_ttl = lock_ttl
+        self._task: asyncio.Task | None = None
+
+    def key(self, name: str | int) -> str:
+        return f'{self.namespace}:{name}'
+
+    def state_keys(self, game_id: int) -> list[str]:
+        key = self.key(game_id)
+        return [key, f'{key}:guessed', f'{key}:skipped']
+
+    async def load(self, redis: Redis, state: GameState) -> bool:
+        """Keep the game in Redis unless it is there already, False if it is"""
+        game = state.game
+        fields = progress_fields(game.info, game.ended_at, state.updated_at) | {
+            'user': state.user_id,
+            'details': game.model_dump_json(include=STATIC_FIELDS),
+            'theme_updated_at': encode_time(state.theme_updated_at),
+            'event_seq': state.event_seq,
+            'version': game.version,
+        }
+        args = [self.ttl, *flatten(fields), *word_args(game.words_guessed, game.words_skipped)]
+        return bool(await seed_script(keys=self.state_keys(game.id), args=args, client=redis))
+
+    async def get(self, redis: Redis, user_id: int, game_id: int) -> GameState | None:
+        """Game of the user kept in Redis, None if it is not"""
+        state = (await self.read(redis, [game_id]))[0]
+        return state if state is not None and state.user_id == user_id else None
+
+    async def read(self, redis: Redis, game_ids: list[int]) -> list[GameState | None]:
+        async with redis.pipeline(transaction=False) as pipe:
+            for game_id in game_ids:
+                await read_script(keys=self.state_keys(game_id), client=pipe)
+            replies = await pipe.execute()
+
+        return [decode_state(reply) if reply else None for reply in replies]
+
+    async def update(
+        self, redis: Redis, user_id: int, game_id: int, progress: GameUpdatePayload, updated_at: datetime
+    ) -> tuple[UpdateStatus, GameState | None]:
+        """Apply turn progress to a game of the user kept in Redis, words are added to the ones already played"""
+        keys = [*self.state_keys(game_id), self.key(f'{game_id}:evicting'), self.key('dirty')]
+        args = [
+            user_id,
+            '' if progress.version is None else progress.version,
+            game_id,
+            *flatten(progress_fields(progress.info, progress.ended_at, updated_at)),
+            *word_args(progress.words_guessed, progress.words_skipped),
+        ]
+        status, *reply = await apply_script(keys=keys, args=args, client=redis)
+        if status != UpdateStatus.APPLIED:
+            return UpdateStatus(status), None
+        return UpdateStatus.APPLIED, decode_state(reply)
+
+    async def evict(
+        self, redis: Redis, game_id: int, persist: Callable[[list[GameState]], Awaitable[set[int]]]
+    ) -> bool:
+        """
+        Save the game with persist(states) and remove it from Redis, updates wait meanwhile.
+        False if it is being evicted by another request. If saving fails, the game stays dirty in Redis.
+        """
+        evicting_key = self.key(f'{game_id}:evicting')
+        if not await redis.set(evicting_key, '1', nx=True, ex=self.lock_ttl):
+            return False
+
+        try:
+            state = (await self.read(redis, [game_id]))[0]
+            if state is None:
+                return True
+            await persist([state])
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.delete(*self.state_keys(game_id))
+                pipe.srem(self.key('dirty'), str(game_id))
+                await pipe.execute()
+            return True
+        finally:
+            await redis.delete(evicting_key)
+
+    async def flush(self, redis: Redis, persist: Callable[[list[GameState]], Awaitable[set[int]]]) -> int:
+        """Save dirty games with persist(states), return number of saved ones. One worker flushes at a time"""
+        lock_key = self.key('lock')
+        if not await redis.set(lock_key, '1', nx=True, ex=self.lock_ttl):
+            return 0
+
+        try:
+            game_ids = sorted(map(int, await redis.smembers(self.key('dirty'))))
+            saved = 0
+            for start in range(0, len(game_ids), self.batch_size):
+                batch = game_ids[start : start + self.batch_size]
+                states = await self.read(redis, batch)
+                persisted = await persist([state for state in states if state is not None])
+
+                # Cleared only for the version that was saved, games updated meanwhile stay dirty
+                args = [self.namespace, self.ttl]
+                for game_id, state in zip(batch, states, strict=True):
+                    version = '' if state is None else state.game.version
+                    args += [game_id, version, int(game_id in persisted)]
+                await ack_script(keys=[self.key('dirty')], args=args, client=redis)
+                saved += len(persisted)
+
+            if saved:
+                logger.info('Flushed %d games', saved)
+            return saved
+        finally:
+            await redis.delete(lock_key)
+
+    async def save(self, states: list[GameState]) -> set[int]:
+        snapshots = [
+            (
+                state.game.id,
+                state.game.version,
+                state.event_seq,
+                state.game.info.model_dump(),
+                state.game.words_guessed,
+                state.game.words_skipped,
+                state.game.ended_at,
+            )
+            for state in states
+        ]
+        async with async_session() as db:
+            return await save_game_states(db, snapshots)
+
+    async def flush_now(self) -> int:
+        return await self.flush(await get_cache(), self.save)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush_now()
+            except Exception:
+                logger.exception('Could not flush game states, retrying in %ss', self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+        try:
+            await self.flush_now()
+        except Exception:
+            logger.exception('Could not flush game states on shutdown, they are kept in Redis')
+
+
+game_states = GameStateStore(
+    'game:state',
+    ttl=settings.game_state_ttl,
+    interval=settings.game_state_flush_interval,
+    batch_size=settings.game_state_flush_batch_size,
+    lock_ttl=settings.game_state_flush_lock_ttl,
+)
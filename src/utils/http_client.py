@@ -0,0 +1,151 @@
+import importlib.util
+import logging
+import time
+import urllib.parse
+
+import httpx
+
+from conf import settings
+from errors import CircuitOpenError, UpstreamError
+
+logger = logging.getLogger('utils.http_client')
+
+
+class CircuitBreaker:
+    """
+    Fails fast after consecutive upstream failures.
+    Once reset timeout passes a single trial call is let through (half-open),
+    its outcome either closes the circuit or opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError if the call can't be made, return whether it is the half-open trial"""
+        if self.opened_at is None:
+            return False
+        if self._trial_in_flight or time.monotonic() - self.opened_at < self.reset_timeout:
+            raise CircuitOpenError(self.name)
+        self._trial_in_flight = True
+        return True
+
+    def end_call(self, trial: bool):
+        """
+        Called once the call is over whatever its outcome, a trial that had none lets the next call try again.
+        Calls started before the circuit opened don't end the trial
+        """
+        if trial:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info('Circuit %s closed', self.name)
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.error('Circuit %s opened after %d failures', self.name, self.failures)
+            self.opened_at = time.monotonic()
+
+
+class OutboundClient:
+    """Application-lifetime pooled HTTP client with per-host circuit breakers"""
+
+    def __init__(self, client: httpx.AsyncClient, failure_threshold: int, reset_timeout: float):
+        self.client = client
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+        return self.breakers[host]
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        breaker = self.breaker_for(url)
+        trial = breaker.before_call()
+
+        # Cancellation or an unexpected error must not leave a half-open trial in flight forever
+        try:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                raise UpstreamError(f'{method} {url} failed: {e!r}') from e
+
+            if response.is_server_error:
+                breaker.record_failure()
+                raise UpstreamError(f'{method} {url} responded with {response.status_code}')
+
+            breaker.record_success()
+            return response
+        finally:
+            breaker.end_call(trial)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+http_client: OutboundClient | None = None
+
+
+async def get_http() -> OutboundClient:
+    """Get application-lifetime outbound HTTP client"""
+    return http_client
+
+
+async def init_http():
+    """Initialize outbound HTTP client with keep-alive connection pool"""
+    global http_client
+
+    http2 = settings.http_http2
+    if http2 and importlib.util.find_spec('h2') is None:
+        logger.warning('HTTP/2 requested but h2 package is not installed, falling back to HTTP/1.1')
+        http2 = False
+
+    client = httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+    )
+    http_client = OutboundClient(
+        client,
+        failure_threshold=settings.http_breaker_failure_threshold,
+        reset_timeout=settings.http_breaker_reset_timeout,
+    )
+    logger.info('✅ HTTP client initialized (http2=%s)', http2)
+
+
+async def close_http():
+    """Close outbound HTTP client"""
+    global http_client
+    if http_client:
+        await http_client.aclose()
+        http_client = None
+        logger.info('❌ HTTP client closed')
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import logging
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
+
+from conf import settings
+from db import User
+from utils.lru import TTLCache
+from utils.metrics import register_cache_stats
+
+logger = logging.getLogger('utils.identity')
+
+
+class IdentityCache:
+    """
+    Two-tier cache of authenticated users: in-process LRU in front of Redis.
+    Users are returned detached so they can be merged into a request session without a SELECT.
+    Invalidations are published, so that every worker drops the user from its in-process tier too.
+    """
+
+    def __init__(self, max_size: int, local_ttl: int, redis_ttl: int, key_prefix: str = 'user:identity'):
+        self.local = TTLCache(max_size, local_ttl, stats=register_cache_stats('identity.local'))
+        self.redis_stats = register_cache_stats('identity.redis')
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.channel = f'{key_prefix}:invalidated'
+        self.pubsub: PubSub | None = None
+        self._task: asyncio.Task | None = None
+
+    def key(self, user_id: int) -> str:
+        return f'{self.key_prefix}:{user_id}'
+
+    async def get(self, redis: Redis, user_id: int) -> User | None:
+        data = self.local.get(user_id)
+
+        if data is None:
+            raw = await redis.get(self.key(user_id))
+            if raw is None:
+                self.redis_stats.misses += 1
+                return None
+            self.redis_stats.hits += 1
+            data = json.loads(raw)
+            self.local.set(user_id, data)
+
+        user = User.model_validate(data)
+        make_transient_to_detached(user)
+        return user
+
+    async def set(self, redis: Redis, user: User):
+        data = user.model_dump(mode='json')
+        self.local.set(user.id, data)
+        await redis.setex(self.key(user.id), self.redis_ttl, json.dumps(data))
+
+    async def invalidate(self, redis: Redis, user_id: int):
+        """Drop cached identity in all workers, e.g. when admin flag or picture has changed"""
+        self.local.pop(user_id)
+        await redis.delete(self.key(user_id))
+        await redis.publish(self.channel, str(user_id))
+
+    async def run(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except RedisError:
+                # Invalidations published meanwhile are lost, forget every local identity
+                logger.exception('Identity invalidations connection failed')
+                self.local.clear()
+                await asyncio.sleep(1)
+                continue
+            if message is not None and message['type'] == 'message':
+                self.local.pop(int(message['data']))
+
+    async def start(self, redis: Redis):
+        self.pubsub = redis.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+
+
+identity_cache = IdentityCache(
+    max_size=settings.identity_cache_size,
+    local_ttl=settings.identity_cache_local_ttl,
+    redis_ttl=settings.identity_cache_redis_ttl,
+)
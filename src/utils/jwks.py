@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Protocol
+
+from jwt import PyJWK, PyJWKClientError, PyJWKSet, get_unverified_header
+
+from utils.http_client import get_http
+
+logger = logging.getLogger('utils.jwks')
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+def parse_max_age(cache_control: str | None) -> int | None:
+    """Extract max-age (seconds) from Cache-Control header value"""
+    if not cache_control:
+        return None
+    match = MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else None
+
+
+class JWKSource(Protocol):
+    async def fetch(self) -> tuple[dict, int | None]:
+        """Return JWKS document and its max-age in seconds (None if not advertised)"""
+
+
+class HTTPJWKSource:
+    """Fetches JWKS document with the shared outbound HTTP client"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def fetch(self) -> tuple[dict, int | None]:
+        client = await get_http()
+        response = await client.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json(), parse_max_age(response.headers.get('cache-control'))
+
+
+class JWKSCache:
+    """
+    Process-wide signing keys cache.
+    Keys are cached by kid for the max-age advertised by the source,
+    refreshed in the background shortly before expiry
+    and refetched out of schedule only when an unknown kid shows up.
+    """
+
+    def __init__(
+        self,
+        source: JWKSource,
+        default_max_age: int = 3600,
+        refresh_margin: int = 300,
+        min_refetch_interval: int = 60,
+    ):
+        self.source = source
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_refetch_interval = min_refetch_interval
+
+        self._keys: dict[str, PyJWK] = {}
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def get_signing_key_from_jwt(self, token: str) -> PyJWK:
+        kid = get_unverified_header(token).get('kid')
+        if not kid:
+            raise PyJWKClientError('Token header has no kid')
+        return await self.get_signing_key(kid)
+
+    async def get_signing_key(self, kid: str) -> PyJWK:
+        now = time.monotonic()
+
+        if now >= self._expires_at:
+            await self._refresh_or_keep_stale()
+        elif now >= self._expires_at - self.refresh_margin:
+            self._schedule_refresh()
+
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._fetched_at >= self.min_refetch_interval:
+            # Provider may have rotated keys ahead of our schedule
+            await self.refresh()
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return key
+
+    async def refresh(self):
+        """Fetch keys from the source, concurrent callers share a single fetch"""
+        fetched_at = self._fetched_at
+        async with self._lock:
+            if self._fetched_at != fetched_at:
+                return
+
+            document, max_age = await self.source.fetch()
+            key_set = PyJWKSet.from_dict(document)
+
+            self._keys = {key.key_id: key for key in key_set.keys if key.key_id}
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + (max_age if max_age is not None else self.default_max_age)
+            logger.info('JWKS refreshed: %d keys, expires in %ss', len(self._keys), max_age or self.default_max_age)
+
+    async def close(self):
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
+
+    async def _refresh_or_keep_stale(self):
+        try:
+            await self.refresh()
+        except Exception:
+            if not self._keys:
+                raise
+            logger.exception('Could not refresh JWKS, serving stale keys')
+
+    def _schedule_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_or_keep_stale())
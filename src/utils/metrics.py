@@ -0,0 +1,24 @@
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self) | {'hit_ratio': round(self.hit_ratio, 4)}
+
+
+cache_stats: dict[str, CacheStats] = {}
+
+
+def register_cache_stats(name: str) -> CacheStats:
+    """Get or create named counters, exposed via /stats/caches"""
+    return cache_stats.setdefault(name, CacheStats())
@@ -0,0 +1,34 @@
+from collections.abc import AsyncIterable, AsyncIterator
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_size: int) -> AsyncIterator[tuple[int, bytes | None]]:
+    """
+    Split byte stream into (line number, line) without holding more than one line in memory.
+    Lines longer than max_line_size are skipped and yielded as None, blank lines are omitted.
+    """
+    buffer = bytearray()
+    number = 0
+    oversized = False
+
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b'\n', start)) != -1:
+            number += 1
+            if not oversized and len(buffer) + end - start <= max_line_size:
+                buffer += chunk[start:end]
+                if buffer.strip():
+                    yield number, bytes(buffer)
+            else:
+                yield number, None
+            buffer.clear()
+            oversized = False
+            start = end + 1
+
+        if not oversized:
+            buffer += chunk[start:]
+            if len(buffer) > max_line_size:
+                oversized = True
+                buffer.clear()
+
+    if oversized or buffer.strip():
+        yield number + 1, None if oversized else bytes(buffer)
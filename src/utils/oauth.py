@@ -1,26 +1,39 @@
+import hashlib
 import secrets
+import time
 import urllib.parse
 from datetime import UTC, datetime, timedelta
 from typing import Annotated
 
 import jwt
 from fastapi import Depends, Header
-from jwt import PyJWKClient
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
+from cache import get_cache
 from conf import settings
 from db import User, get_db
-from errors import AuthError
-from schemas.user import UserBase
+from errors import AuthError, ForbiddenError
+from schemas.user import AuxTokenPayload
+from utils.identity import identity_cache
+from utils.jwks import HTTPJWKSource, JWKSCache
+from utils.lru import TTLCache
+from utils.metrics import register_cache_stats
+from utils.onetime import oauth_state_store
+
+google_jwks = JWKSCache(HTTPJWKSource(settings.oauth_jwks_url))
+
+verified_aux_tokens = TTLCache(
+    max_size=settings.aux_token_cache_size,
+    ttl=timedelta(days=settings.jwt_expires_in_days).total_seconds(),
+    stats=register_cache_stats('aux_token'),
+)
 
 
 async def generate_oauth_redirect_uri(redis: Redis) -> str:
-    state = secrets.token_urlsafe(64)
     nonce = secrets.token_urlsafe(64)
-
-    await redis.setex(f'oauth:state:{state}', timedelta(minutes=5), nonce)
+    state = await oauth_state_store(redis).issue(nonce)
 
     query_params = {
         'client_id': settings.oauth_gcloud_id,
@@ -39,12 +52,8 @@ async def generate_oauth_redirect_uri(redis: Redis) -> str:
 async def verify_id_token(id_token: str, expected_nonce: str) -> dict:
     """Verify Google ID token signature and nonce"""
 
-    # Get the signing key from Google's JWKS endpoint
-    jwks_url = 'https://www.googleapis.com/oauth2/v3/certs'
-    jwks_client = PyJWKClient(jwks_url)
-
-    # Get the signing key from the token header
-    signing_key = jwks_client.get_signing_key_from_jwt(id_token)
+    # Get the signing key matching the token header from cached Google's JWKS
+    signing_key = await google_jwks.get_signing_key_from_jwt(id_token)
 
     payload = jwt.decode(
         id_token,
@@ -82,20 +91,32 @@ async def generate_aux_token(user: User) -> str:
     return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
-async def verify_aux_token(token: str) -> UserBase | None:
+async def verify_aux_token(token: str) -> AuxTokenPayload | None:
+    """Decode and validate aux token, verified tokens are remembered by digest until they expire"""
+    digest = hashlib.sha256(token.encode()).digest()
+
+    user_data = verified_aux_tokens.get(digest)
+    if user_data is not None:
+        return user_data
+
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        return UserBase.model_validate(payload)
+        user_data = AuxTokenPayload.model_validate(payload)
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+    verified_aux_tokens.set(digest, user_data, ttl=payload['exp'] - time.time())
+    return user_data
+
 
 async def get_current_user(
-    authorization: Annotated[str | None, Header()] = None, db: AsyncSession = Depends(get_db)
+    authorization: Annotated[str | None, Header()] = None,
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache),
 ) -> User:
-    """Extract and verify bearer token, return current user from database"""
+    """Extract and verify bearer token, return current user from identity cache or database"""
     if not authorization:
         raise AuthError('Missing authorization header')
 
@@ -106,14 +127,31 @@ async def get_current_user(
             'Invalid authorization header format',
         )
 
+    return await authenticate(token, db, cache)
+
+
+async def authenticate(token: str, db: AsyncSession, cache: Redis) -> User:
+    """User of an aux token from identity cache or database"""
     user_data = await verify_aux_token(token)
     if not user_data:
         raise AuthError('Invalid or expired token')
 
-    result = await db.execute(select(User).where(User.email == user_data.email))
+    user = await identity_cache.get(cache, user_data.user_id)
+    if user:
+        # Attach cached identity to request session without hitting the database
+        return await db.merge(user, load=False)
+
+    result = await db.execute(select(User).where(User.id == user_data.user_id))
     user = result.scalar_one_or_none()
 
     if not user:
         raise AuthError('User not found')
 
+    await identity_cache.set(cache, user)
+    return user
+
+
+async def get_current_admin(user: User = Depends(get_current_user)) -> User:
+    if not user.admin:
+        raise ForbiddenError('Admin privileges required')
     return user
@@ -0,0 +1,87 @@
+import secrets
+import time
+from datetime import timedelta
+from typing import Protocol
+
+from redis.asyncio import Redis
+
+
+class OneTimeBackend(Protocol):
+    async def put_many(self, items: dict[str, str], ttl: int): ...
+
+    async def pop(self, key: str) -> str | None:
+        """Atomically get and delete value"""
+
+
+class RedisOneTimeBackend:
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def put_many(self, items: dict[str, str], ttl: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.setex(key, ttl, value)
+            await pipe.execute()
+
+    async def pop(self, key: str) -> str | None:
+        return await self.redis.getdel(key)
+
+
+class MemoryOneTimeBackend:
+    """Process-local backend for tests and benchmarks"""
+
+    def __init__(self):
+        self.data: dict[str, tuple[float, str]] = {}
+
+    async def put_many(self, items: dict[str, str], ttl: int):
+        now = time.monotonic()
+        self.data = {key: entry for key, entry in self.data.items() if entry[0] > now}
+        for key, value in items.items():
+            self.data[key] = (now + ttl, value)
+
+    async def pop(self, key: str) -> str | None:
+        entry = self.data.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+
+class OneTimeStore:
+    """Expiring secrets which can be consumed exactly once, in a single round trip"""
+
+    def __init__(self, backend: OneTimeBackend, namespace: str, ttl: int | timedelta, code_bytes: int = 32):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = int(ttl.total_seconds()) if isinstance(ttl, timedelta) else ttl
+        self.code_bytes = code_bytes
+
+    def key(self, code: str) -> str:
+        return f'{self.namespace}:{code}'
+
+    async def issue(self, value: str, code: str | None = None) -> str:
+        """Store value under a new (or given) code, return the code"""
+        code = code or secrets.token_urlsafe(self.code_bytes)
+        await self.backend.put_many({self.key(code): value}, self.ttl)
+        return code
+
+    async def issue_many(self, values: list[str]) -> list[str]:
+        """Store values under new codes in one pipelined round trip"""
+        codes = [secrets.token_urlsafe(self.code_bytes) for _ in values]
+        await self.backend.put_many(
+            {self.key(code): value for code, value in zip(codes, values, strict=True)}, self.ttl
+        )
+        return codes
+
+    async def consume(self, code: str) -> str | None:
+        """Return value and invalidate the code, None if code is unknown, expired or already used"""
+        return await self.backend.pop(self.key(code))
+
+
+def oauth_state_store(redis: Redis) -> OneTimeStore:
+    """OAuth state -> nonce"""
+    return OneTimeStore(RedisOneTimeBackend(redis), 'oauth:state', ttl=timedelta(minutes=5), code_bytes=64)
+
+
+def exchange_code_store(redis: Redis) -> OneTimeStore:
+    """One-time code -> aux token"""
+    return OneTimeStore(RedisOneTimeBackend(redis), 'auth:exchange', ttl=60)
@@ -0,0 +1,138 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import ClauseElement, ColumnElement, Executable, Select, and_, false, func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+
+from schemas.common import CountMode
+
+# Integer columns are 4 bytes, a larger value is rejected by Postgres
+INT_RANGE = range(-(2**31), 2**31)
+
+
+@dataclass
+class SortKey:
+    """Column (or expression) the listing is ordered by, the last key must be unique"""
+
+    column: ColumnElement
+    descending: bool = False
+    nullable: bool = False
+    # Type of values of the column in a cursor: int, float, str or datetime
+    value_type: type = int
+
+    def decode(self, value: Any) -> Any:
+        """Value of the key from a cursor, raises ValueError if it doesn't match the type of the column"""
+        if value is None and self.nullable:
+            return None
+        value_type = self.value_type
+        if value_type is datetime and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        if value_type is float and type(value) is int:
+            return float(value)
+        # bool is an int, but not a value of an int column
+        if type(value) is not value_type:
+            raise ValueError('Cursor does not match ordering')
+        if (value_type is int and value not in INT_RANGE) or (value_type is str and '\x00' in value):
+            raise ValueError('Malformed cursor')
+        return value
+
+    def order_by(self) -> ColumnElement:
+        order = self.column.desc() if self.descending else self.column.asc()
+        return order.nulls_last() if self.nullable else order
+
+    def after(self, value: Any) -> ColumnElement:
+        return self.column < value if self.descending else self.column > value
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: list[SortKey]) -> list:
+    """Parse opaque cursor produced for the same ordering, raises ValueError if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError('Cursor does not match ordering')
+
+    return [key.decode(value) for key, value in zip(keys, values, strict=True)]
+
+
+def keyset_condition(keys: list[SortKey], values: list) -> ColumnElement[bool]:
+    """Rows strictly after the cursor position in (keys) ordering, NULLs being placed last"""
+    if len(keys) > 1 and not any(key.nullable for key in keys) and len({key.descending for key in keys}) == 1:
+        # Row comparison lets the planner use a composite index range scan
+        columns, bounds = tuple_(*(key.column for key in keys)), tuple_(*values)
+        return columns < bounds if keys[0].descending else columns > bounds
+
+    key, value = keys[0], values[0]
+    rest = keyset_condition(keys[1:], values[1:]) if len(keys) > 1 else None
+
+    if key.nullable and value is None:
+        return and_(key.column.is_(None), rest) if rest is not None else false()
+
+    condition = key.after(value)
+    if rest is not None:
+        condition = or_(condition, and_(key.column == value, rest))
+    return or_(condition, key.column.is_(None)) if key.nullable else condition
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of a statement, its parameters are sent as binds"""
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(Explain)
+def compile_explain(element: Explain, compiler, **kw) -> str:
+    return f'EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}'
+
+
+async def count_rows(db: AsyncSession, query: Select, mode: CountMode) -> int | None:
+    match mode:
+        case CountMode.EXACT:
+            return await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+        case CountMode.ESTIMATE:
+            # Planner estimate, no rows are scanned
+            plan = await db.scalar(Explain(query.order_by(None)))
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return int(plan[0]['Plan']['Plan Rows'])
+    return None
+
+
+async def paginate_keyset(
+    db: AsyncSession,
+    query: Select,
+    keys: list[SortKey],
+    cursor: str | None,
+    size: int,
+    count: CountMode = CountMode.NONE,
+) -> dict:
+    """Fetch a page after the cursor without OFFSET, returns items and cursor of the next page"""
+    total = await count_rows(db, query, count)
+
+    if cursor:
+        query = query.where(keyset_condition(keys, decode_cursor(cursor, keys)))
+
+    query = (
+        query.order_by(None)
+        .order_by(*(key.order_by() for key in keys))
+        .add_columns(*(key.column.label(f'cursor_{i}') for i, key in enumerate(keys)))
+        .limit(size + 1)
+    )
+    rows = (await db.execute(query)).all()
+
+    next_cursor = encode_cursor(list(rows[size - 1][1:])) if len(rows) > size else None
+    return {'items': [row[0] for row in rows[:size]], 'next_cursor': next_cursor, 'total': total}
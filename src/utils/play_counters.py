@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+
+from redis.asyncio import Redis
+
+from cache import get_cache
+from conf import settings
+from dal import apply_theme_plays
+from db import async_session
+
+logger = logging.getLogger('utils.play_counters')
+
+# (theme id, number of plays, last played)
+ThemePlays = tuple[int, int, datetime | None]
+
+# KEYS: owner key, keys to delete. ARGV: expected owner. Deletes the keys only if the owner is still the expected one
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('DEL', unpack(KEYS))
+"""
+
+# Scripts are run on the client of the caller, the one they are registered with only encodes them
+_scripts = Redis(decode_responses=True)
+release_script = _scripts.register_script(RELEASE_SCRIPT)
+
+
+class PlayCounters:
+    """
+    Write-behind play counters of themes.
+    A game only bumps a Redis hash (plays) and a sorted set (last played), so popular theme rows
+    are not locked on every game. A flusher moves both aside and applies aggregated deltas in batched UPDATEs.
+    The batch moved aside is deleted only after it is committed: a restart or a failed flush doesn't lose plays,
+    the batch is applied by the next flush of any worker.
+    A batch has an id which Postgres records in the transaction applying it, so a batch flushed again
+    (the worker died before deleting it, or its lock expired and another worker took over) is not counted twice.
+    """
+
+    def __init__(self, namespace: str, interval: float, batch_size: int, lock_ttl: int, batch_retention: timedelta):
+        self.namespace = namespace
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock_ttl = lock_ttl
+        self.batch_retention = batch_retention
+        self._task: asyncio.Task | None = None
+
+    def key(self, name: str) -> str:
+        return f'{self.namespace}:{name}'
+
+    async def record(self, redis: Redis, theme_id: int, played_at: datetime):
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self.key('plays'), str(theme_id), 1)
+            pipe.zadd(self.key('last_played'), {str(theme_id): played_at.timestamp()}, gt=True)
+            await pipe.execute()
+
+    async def take_pending(self, redis: Redis) -> tuple[str, list[ThemePlays]]:
+        """
+        Move recorded plays aside unless a batch of an interrupted flush is still there,
+        return the id of the batch and the batch
+        """
+        pending_plays, pending_last_played = self.key('pending:plays'), self.key('pending:last_played')
+        pending_batch = self.key('pending:batch')
+
+        if not await redis.exists(pending_plays, pending_last_played):
+            # Keys are only removed by this RENAME under the flush lock, so the ones seen here are still there
+            present = [name for name in ('plays', 'last_played') if await redis.exists(self.key(name))]
+            if not present:
+                return '', []
+            async with redis.pipeline(transaction=True) as pipe:
+                for name in present:
+                    pipe.rename(self.key(name), self.key(f'pending:{name}'))
+                pipe.set(pending_batch, uuid.uuid4().hex)
+                await pipe.execute()
+
+        async with redis.pipeline(transaction=True) as pipe:
+            # A batch moved aside without an id (by an older version) gets one
+            pipe.set(pending_batch, uuid.uuid4().hex, nx=True)
+            pipe.get(pending_batch)
+            pipe.hgetall(pending_plays)
+            pipe.zrange(pending_last_played, 0, -1, withscores=True)
+            _, batch_id, plays, last_played = await pipe.execute()
+
+        last_played = dict(last_played)
+        return batch_id, [
+            (
+                int(theme_id),
+                int(plays.get(theme_id, 0)),
+                datetime.fromtimestamp(last_played[theme_id], UTC) if theme_id in last_played else None,
+            )
+            for theme_id in sorted(plays.keys() | last_played.keys(), key=int)
+        ]
+
+    async def flush(self, redis: Redis, apply: Callable[[str, list[ThemePlays]], Awaitable[int]]) -> int:
+        """
+        Apply pending plays with apply(batch id, batch), return number of updated themes.
+        One worker flushes at a time
+        """
+        lock_key, token = self.key('lock'), uuid.uuid4().hex
+        if not await redis.set(lock_key, token, nx=True, ex=self.lock_ttl):
+            return 0
+
+        try:
+            batch_id, batch = await self.take_pending(redis)
+            if not batch:
+                return 0
+            updated = await apply(batch_id, batch)
+            # If the lock expired meanwhile, another worker may have moved a new batch aside, it is kept
+            pending = [self.key(f'pending:{name}') for name in ('batch', 'plays', 'last_played')]
+            await release_script(keys=pending, args=[batch_id], client=redis)
+            logger.info('Flushed plays of %d themes', updated)
+            return updated
+        finally:
+            await release_script(keys=[lock_key], args=[token], client=redis)
+
+    async def save(self, batch_id: str, batch: list[ThemePlays]) -> int:
+        async with async_session() as db:
+            return await apply_theme_plays(db, batch_id, batch, self.batch_size, self.batch_retention)
+
+    async def flush_now(self) -> int:
+        return await self.flush(await get_cache(), self.save)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush_now()
+            except Exception:
+                logger.exception('Could not flush play counters, retrying in %ss', self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+        try:
+            await self.flush_now()
+        except Exception:
+            logger.exception('Could not flush play counters on shutdown, they are kept in Redis')
+
+
+play_counters = PlayCounters(
+    'themes:plays',
+    interval=settings.play_counters_flush_interval,
+    batch_size=settings.play_counters_batch_size,
+    lock_ttl=settings.play_counters_lock_ttl,
+    batch_retention=timedelta(days=settings.play_counters_batch_retention_days),
+)
@@ -0,0 +1,81 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections.abc import Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from conf import settings
+from utils.metrics import register_cache_stats
+
+logger = logging.getLogger('utils.response_cache')
+
+
+class ListingCache:
+    """
+    Redis cache of serialized listing pages.
+    Pages are stored with the version counters (global and per scope) they were built under,
+    so bumping a counter invalidates every page cached under it in O(1), stale pages are rebuilt or expire.
+    A hit costs a single MGET of both counters and the page.
+    Only one worker computes a missing page, the others wait for it to appear.
+    """
+
+    def __init__(self, namespace: str, ttl: int, lock_ttl: int = 5, lock_wait: float = 2.0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.lock_poll_interval = 0.05
+        self.stats = register_cache_stats(namespace.replace(':', '.'))
+
+    def version_key(self, scope: str | None = None) -> str:
+        return f'{self.namespace}:version:{scope}' if scope else f'{self.namespace}:version'
+
+    def key(self, scope: str, params: dict) -> str:
+        digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:32]
+        return f'{self.namespace}:{scope}:{digest}'
+
+    @staticmethod
+    def unpack(cached: str | None, version: str) -> str | None:
+        """Page stored under the version, None if it is missing or stale"""
+        if cached is None:
+            return None
+        cached_version, _, page = cached.partition('\n')
+        return page if cached_version == version else None
+
+    async def invalidate(self, redis: Redis, scope: str | None = None):
+        """Drop every cached page, or only pages of the scope"""
+        await redis.incr(self.version_key(scope))
+
+    async def get_or_set(self, redis: Redis, scope: str, params: dict, compute: Callable[[], Awaitable[str]]) -> str:
+        """Return cached page for normalized params, compute and store it on miss"""
+        key = self.key(scope, params)
+        version, scope_version, cached = await redis.mget(self.version_key(), self.version_key(scope), key)
+        version = f'{version or 0}.{scope_version or 0}'
+
+        if (page := self.unpack(cached, version)) is not None:
+            self.stats.hits += 1
+            return page
+        self.stats.misses += 1
+
+        lock_key = f'{key}:lock:{version}'
+        if await redis.set(lock_key, '1', nx=True, ex=self.lock_ttl):
+            try:
+                page = await compute()
+                await redis.setex(key, self.ttl, f'{version}\n{page}')
+                return page
+            finally:
+                await redis.delete(lock_key)
+
+        # Another worker is computing the same page, wait for it instead of querying the database too
+        for _ in range(int(self.lock_wait / self.lock_poll_interval)):
+            await asyncio.sleep(self.lock_poll_interval)
+            if (page := self.unpack(await redis.get(key), version)) is not None:
+                return page
+
+        logger.warning('Timed out waiting for %s, computing it again', key)
+        return await compute()
+
+
+themes_list_cache = ListingCache('themes:list', ttl=settings.themes_cache_ttl, lock_ttl=settings.themes_cache_lock_ttl)
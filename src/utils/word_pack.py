@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from enum import StrEnum
+
+import brotli
+import msgpack
+
+from conf import settings
+from utils.lru import TTLCache
+from utils.metrics import register_cache_stats
+
+logger = logging.getLogger('utils.word_pack')
+
+
+class PackFormat(StrEnum):
+    JSON = 'json'
+    MSGPACK = 'msgpack'
+
+
+MEDIA_TYPES = {PackFormat.JSON: 'application/json', PackFormat.MSGPACK: 'application/msgpack'}
+
+# Server preference when client accepts several encodings equally
+ENCODINGS_PREFERENCE = ('br', 'gzip', 'identity')
+
+
+@dataclass(frozen=True)
+class WordPack:
+    """Theme description serialized once, in every format and content encoding"""
+
+    digest: str
+    bodies: dict[tuple[PackFormat, str], bytes]
+
+    def encodings(self, pack_format: PackFormat) -> list[str]:
+        return [encoding for fmt, encoding in self.bodies if fmt == pack_format]
+
+
+def serialize_description(description: dict) -> bytes:
+    return json.dumps(description, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def build_word_pack(digest: str, raw_json: bytes, description: dict) -> WordPack:
+    raw = {PackFormat.JSON: raw_json, PackFormat.MSGPACK: msgpack.packb(description)}
+
+    bodies = {}
+    for pack_format, body in raw.items():
+        bodies[pack_format, 'identity'] = body
+        # Packs are built once per content, so spend CPU on the best ratio
+        bodies[pack_format, 'gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        bodies[pack_format, 'br'] = brotli.compress(body, quality=11)
+
+    return WordPack(digest=digest, bodies=bodies)
+
+
+def parse_accept_encoding(header: str | None) -> dict[str, float]:
+    """Coding -> q-value, identity is acceptable (least preferred) unless refused, explicitly or by *;q=0"""
+    accepted = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+
+    if '*' in accepted:
+        for coding in ENCODINGS_PREFERENCE:
+            accepted.setdefault(coding, accepted['*'])
+    accepted.setdefault('identity', 0.001)
+    return accepted
+
+
+def choose_encoding(accept_encoding: str | None, available: list[str]) -> str | None:
+    """Most preferred acceptable of available encodings, None if the client accepts none of them"""
+    accepted = parse_accept_encoding(accept_encoding)
+    candidates = [coding for coding in ENCODINGS_PREFERENCE if coding in available and accepted.get(coding, 0) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda coding: accepted[coding])
+
+
+class WordPackCache:
+    """
+    In-process cache of word packs.
+    Theme version (id, updated_at) maps to content digest, digest maps to the pack,
+    so a theme changed only in its counters reuses its compressed pack.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.versions = TTLCache(max_size * 4, ttl, stats=register_cache_stats('word_pack.versions'))
+        self.packs = TTLCache(max_size, ttl, stats=register_cache_stats('word_pack.packs'))
+
+    def get(self, theme_id: int, updated_at: datetime) -> WordPack | None:
+        digest = self.versions.get((theme_id, updated_at))
+        return self.packs.get(digest) if digest else None
+
+    def put(self, theme_id: int, updated_at: datetime, description: dict) -> WordPack:
+        raw_json = serialize_description(description)
+        digest = hashlib.sha256(raw_json).hexdigest()[:32]
+
+        pack = self.packs.get(digest)
+        if pack is None:
+            pack = build_word_pack(digest, raw_json, description)
+            self.packs.set(digest, pack)
+            logger.debug('Built word pack %s of theme %d', digest, theme_id)
+
+        self.versions.set((theme_id, updated_at), digest)
+        return pack
+
+
+word_packs = WordPackCache(max_size=settings.word_pack_cache_size, ttl=settings.word_pack_cache_ttl)
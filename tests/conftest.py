@@ -0,0 +1,46 @@
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.conf import settings
+
+
+@pytest_asyncio.fixture
+async def redis():
+    """Redis configured in .env, tests use their own key namespaces and remove them"""
+    client = Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        db=settings.redis_name,
+        password=settings.redis_pass,
+        decode_responses=True,
+    )
+    try:
+        await client.ping()
+    except ConnectionError as e:
+        await client.aclose()
+        pytest.skip(f'Redis is not available: {e}')
+
+    yield client
+    await client.aclose()
+
+
+@pytest_asyncio.fixture
+async def db():
+    """Session of Postgres configured in .env, its commits are savepoints of a transaction that is rolled back"""
+    engine = create_async_engine(
+        f'postgresql+asyncpg://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}'
+    )
+    try:
+        conn = await engine.connect()
+    except OSError as e:
+        await engine.dispose()
+        pytest.skip(f'Postgres is not available: {e}')
+
+    transaction = await conn.begin()
+    yield AsyncSession(bind=conn, join_transaction_mode='create_savepoint')
+    await transaction.rollback()
+    await conn.close()
+    await engine.dispose()
@@ -0,0 +1,42 @@
+from datetime import UTC, datetime, timedelta
+
+import jwt
+import pytest
+
+from src.conf import settings
+from src.utils.oauth import verified_aux_tokens, verify_aux_token
+
+
+def make_token(expires_in: timedelta) -> str:
+    payload = {
+        'user_id': 1,
+        'email': 'player@example.com',
+        'picture': '',
+        'admin': False,
+        'exp': datetime.now(UTC) + expires_in,
+        'iat': datetime.now(UTC),
+    }
+    return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+
+
+@pytest.mark.asyncio
+async def test_verified_token_is_served_from_cache():
+    verified_aux_tokens.clear()
+    token = make_token(timedelta(days=1))
+    hits = verified_aux_tokens.stats.hits
+
+    first = await verify_aux_token(token)
+    second = await verify_aux_token(token)
+
+    assert first.user_id == 1
+    assert second is first
+    assert verified_aux_tokens.stats.hits == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_tokens_are_not_cached():
+    verified_aux_tokens.clear()
+
+    assert await verify_aux_token(make_token(timedelta(seconds=-1))) is None
+    assert await verify_aux_token('not-a-token') is None
+    assert len(verified_aux_tokens) == 0
@@ -0,0 +1,42 @@
+from datetime import UTC, datetime
+
+from starlette.requests import Request
+
+from src.utils.conditional import is_not_modified, make_etag, validator_headers
+
+UPDATED_AT = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=UTC)
+
+
+def request_with(**headers) -> Request:
+    raw = [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]
+    return Request({'type': 'http', 'headers': raw})
+
+
+def test_etag_depends_on_parts():
+    assert make_etag('theme', 1, UPDATED_AT) == make_etag('theme', 1, UPDATED_AT)
+    assert make_etag('theme', 1, UPDATED_AT) != make_etag('theme', 1, UPDATED_AT, True)
+
+
+def test_if_none_match():
+    etag = make_etag('theme', 1)
+
+    assert is_not_modified(request_with(if_none_match=etag), etag)
+    assert is_not_modified(request_with(if_none_match=f'"other", {etag.removeprefix("W/")}'), etag)
+    assert is_not_modified(request_with(if_none_match='*'), etag)
+    assert not is_not_modified(request_with(if_none_match='"other"'), etag)
+    assert not is_not_modified(request_with(), etag)
+
+
+def test_if_modified_since_has_second_precision():
+    last_modified = validator_headers('W/"x"', UPDATED_AT)['Last-Modified']
+
+    assert last_modified == 'Sun, 01 Mar 2026 12:30:15 GMT'
+    assert is_not_modified(request_with(if_modified_since=last_modified), 'W/"x"', UPDATED_AT)
+    assert not is_not_modified(request_with(if_modified_since='Sun, 01 Mar 2026 12:30:14 GMT'), 'W/"x"', UPDATED_AT)
+    assert not is_not_modified(request_with(if_modified_since='yesterday'), 'W/"x"', UPDATED_AT)
+
+
+def test_if_none_match_takes_precedence():
+    request = request_with(if_none_match='"other"', if_modified_since='Sun, 01 Mar 2026 12:30:15 GMT')
+
+    assert not is_not_modified(request, 'W/"x"', UPDATED_AT)
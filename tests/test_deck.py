@@ -0,0 +1,56 @@
+import asyncio
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from src.utils.deck import DeckStore
+
+WORD_IDS = list(range(1, 101))
+
+
+@pytest_asyncio.fixture
+async def decks(redis):
+    decks = DeckStore(f'test:deck:{uuid.uuid4().hex}', ttl=60)
+    yield decks
+    if keys := await redis.keys(f'{decks.namespace}:*'):
+        await redis.delete(*keys)
+
+
+@pytest.mark.asyncio
+async def test_deals_without_replacement(redis, decks):
+    assert await decks.deal(redis, 1, 7, 10) is None
+    await decks.build(redis, 1, 7, WORD_IDS)
+
+    dealt = []
+    while True:
+        word_ids, remaining = await decks.deal(redis, 1, 7, 30)
+        if not word_ids:
+            break
+        dealt += word_ids
+        assert remaining == len(WORD_IDS) - len(dealt)
+
+    assert sorted(dealt) == WORD_IDS
+    assert dealt != WORD_IDS
+    # Exhausted deck stays exhausted
+    await decks.build(redis, 1, 7, WORD_IDS)
+    assert await decks.deal(redis, 1, 7, 10) == ([], 0)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_builds_keep_one_deck(redis, decks):
+    await asyncio.gather(*(decks.build(redis, 1, 7, WORD_IDS) for _ in range(5)))
+
+    word_ids, remaining = await decks.deal(redis, 1, 7, 1000)
+    assert sorted(word_ids) == WORD_IDS
+    assert remaining == 0
+
+
+@pytest.mark.asyncio
+async def test_only_owner_is_dealt(redis, decks):
+    await decks.build(redis, 1, 7, WORD_IDS)
+
+    assert await decks.deal(redis, 1, 8, 10) is None
+    word_ids, remaining = await decks.deal(redis, 1, 7, 10)
+    assert len(word_ids) == 10
+    assert remaining == 90
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from db import Theme, Word
+from src.dal import export_columns, get_database_now, stream_export
+from src.schemas.export import ExportFormat, ExportTable
+from src.utils.export import export_lines
+
+COLUMNS = ['id', 'name', 'description', 'updated_at']
+ROWS = [
+    {
+        'id': 1,
+        'name': 'Кино, "классика"',
+        'description': {'words': ['a', 'b']},
+        'updated_at': datetime(2026, 3, 1, tzinfo=UTC),
+    },
+    {'id': 2, 'name': 'Empty', 'description': None, 'updated_at': datetime(2026, 3, 2, tzinfo=UTC)},
+]
+
+
+async def rows():
+    for row in ROWS:
+        yield row
+
+
+async def collect(export_format: ExportFormat) -> str:
+    return ''.join([line async for line in export_lines(rows(), COLUMNS, export_format)])
+
+
+@pytest.mark.asyncio
+async def test_ndjson_export():
+    lines = (await collect(ExportFormat.NDJSON)).splitlines()
+
+    assert [json.loads(line) for line in lines] == [
+        {**ROWS[0], 'updated_at': '2026-03-01T00:00:00+00:00'},
+        {**ROWS[1], 'updated_at': '2026-03-02T00:00:00+00:00'},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_csv_export():
+    records = list(csv.reader(io.StringIO(await collect(ExportFormat.CSV))))
+
+    assert records[0] == COLUMNS
+    assert records[1] == ['1', 'Кино, "классика"', '{"words": ["a", "b"]}', '2026-03-01T00:00:00+00:00']
+    assert records[2] == ['2', 'Empty', '', '2026-03-02T00:00:00+00:00']
+
+
+def test_words_are_exported_instead_of_ids():
+    assert 'words' in export_columns(ExportTable.THEMES)
+    assert {'words_guessed', 'words_skipped'} <= set(export_columns(ExportTable.GAMES))
+    assert not any(name.endswith('word_ids') for table in ExportTable for name in export_columns(table))
+
+
+@pytest.mark.asyncio
+async def test_incremental_export_overlaps_previous_snapshot(db):
+    name = f'export test {uuid.uuid4().hex}'
+    words = [f'{name} {i}' for i in range(3)]
+    word_ids = list(await db.scalars(insert(Word).values([{'word': word} for word in words]).returning(Word.id)))
+    snapshot = await get_database_now(db)
+    # Committed after the snapshot by a transaction that started before it
+    updated_at = snapshot - timedelta(seconds=5)
+    await db.execute(
+        insert(Theme).values(name=name, word_ids=word_ids[::-1], created_at=updated_at, updated_at=updated_at)
+    )
+
+    rows = [row async for row in stream_export(db, ExportTable.THEMES, snapshot) if row['name'] == name]
+    assert [row['words'] for row in rows] == [words[::-1]]
+    assert [
+        row async for row in stream_export(db, ExportTable.THEMES, snapshot, overlap=0) if row['name'] == name
+    ] == []
@@ -0,0 +1,54 @@
+import asyncio
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from src.utils.game_channels import GameChannels, Subscription
+
+
+@pytest_asyncio.fixture
+async def channels(redis):
+    channels = GameChannels(f'test:channel:{uuid.uuid4().hex}', queue_size=10)
+    await channels.start(redis)
+    yield channels
+    await channels.stop()
+
+
+@pytest.mark.asyncio
+async def test_updates_reach_subscribers_of_the_game(redis, channels):
+    async with (
+        channels.subscribe(1) as first,
+        channels.subscribe(1) as second,
+        channels.subscribe(2) as other,
+    ):
+        await channels.publish(redis, 1, '{"version": 1}')
+        for subscription in (first, second):
+            assert await asyncio.wait_for(subscription.get(), 1) == '{"version": 1}'
+        assert other.queue.empty()
+
+    assert channels.subscriptions == {}
+    assert await redis.pubsub_numsub(channels.channel(1), channels.channel(2)) == [
+        (channels.channel(1), 0),
+        (channels.channel(2), 0),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped():
+    subscription = Subscription(queue_size=2)
+    for version in range(3):
+        subscription.put(str(version))
+
+    assert subscription.dropped
+    assert await subscription.get() is None
+
+
+@pytest.mark.asyncio
+async def test_drop_wakes_waiting_subscriber():
+    subscription = Subscription(queue_size=2)
+    waiting = asyncio.create_task(subscription.get())
+    await asyncio.sleep(0)
+
+    subscription.drop()
+    assert await asyncio.wait_for(waiting, 1) is None
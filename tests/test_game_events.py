@@ -0,0 +1,79 @@
+from datetime import UTC, datetime
+
+import pytest
+from pydantic import ValidationError
+
+from db import Game, GameEvent
+from src.dal import apply_game_events
+from src.schemas.game import GameEventKind, GameEventsPayload
+
+AT = datetime(2026, 3, 1, 12, tzinfo=UTC)
+
+
+def make_game(skip_penalty: bool = True) -> Game:
+    return Game(
+        started_at=AT,
+        points=0,
+        skip_penalty=skip_penalty,
+        info={
+            'teams': [{'name': 'a', 'score': 0}, {'name': 'b', 'score': 0}],
+            'current_team_index': 0,
+            'current_round': 0,
+        },
+        guessed_word_ids=[1],
+        skipped_word_ids=[],
+    )
+
+
+def event(seq: int, kind: GameEventKind, word_id: int | None = None, team_index: int | None = None) -> GameEvent:
+    return GameEvent(game_id=1, seq=seq, kind=kind, occurred_at=AT, word_id=word_id, team_index=team_index)
+
+
+@pytest.mark.parametrize('skip_penalty, scores', [(True, [1, 1]), (False, [2, 1])])
+def test_events_are_folded(skip_penalty, scores):
+    game = make_game(skip_penalty)
+    original_info = game.info
+    apply_game_events(
+        game,
+        [
+            event(1, GameEventKind.GUESSED, word_id=2),
+            event(2, GameEventKind.GUESSED, word_id=1),
+            event(3, GameEventKind.SKIPPED, word_id=3),
+            event(4, GameEventKind.TEAM_SWITCHED, team_index=1),
+            event(5, GameEventKind.GUESSED, word_id=4),
+            event(6, GameEventKind.ROUND_ENDED),
+        ],
+    )
+
+    assert [team['score'] for team in game.info['teams']] == scores
+    assert game.info['current_team_index'] == 1
+    assert game.info['current_round'] == 1
+    assert game.guessed_word_ids == [1, 2, 4]
+    assert game.skipped_word_ids == [3]
+    assert game.ended_at is None
+    # Snapshot is replaced, not mutated in place, so the change is flushed
+    assert original_info['current_round'] == 0
+
+
+def test_game_end_is_folded():
+    game = make_game()
+    apply_game_events(game, [event(1, GameEventKind.GAME_ENDED)])
+    assert game.ended_at == AT
+
+
+@pytest.mark.parametrize(
+    'events',
+    [
+        [{'kind': 'guessed'}],
+        [{'kind': 'team_switched'}],
+        [{'kind': 'game_ended'}, {'kind': 'round_ended'}],
+    ],
+)
+def test_invalid_batches(events):
+    with pytest.raises(ValidationError):
+        GameEventsPayload(first_seq=1, events=[{'occurred_at': AT} | e for e in events])
+
+
+def test_last_seq():
+    batch = GameEventsPayload(first_seq=3, events=[{'kind': 'round_ended', 'occurred_at': AT}] * 2)
+    assert batch.last_seq == 4
@@ -0,0 +1,41 @@
+"""Merge of game words, evaluated by local Postgres configured in .env"""
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import Integer, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.conf import settings
+from src.dal import merged_word_ids
+
+
+@pytest_asyncio.fixture
+async def conn():
+    engine = create_async_engine(
+        f'postgresql+asyncpg://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}'
+    )
+    try:
+        conn = await engine.connect()
+    except OSError as e:
+        await engine.dispose()
+        pytest.skip(f'Postgres is not available: {e}')
+
+    yield conn
+    await conn.close()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'word_ids, new_word_ids, merged',
+    [
+        ([1, 2, 3], [3, 4, 4, 5, 1], [1, 2, 3, 4, 5]),
+        ([], [7, 6, 7], [7, 6]),
+        ([5, 4], [], [5, 4]),
+        ([5, 4], [4, 5], [5, 4]),
+    ],
+)
+async def test_merged_word_ids(conn, word_ids, new_word_ids, merged):
+    stored = bindparam('stored', word_ids, type_=ARRAY(Integer))
+    assert await conn.scalar(select(merged_word_ids(stored, new_word_ids))) == merged
@@ -0,0 +1,206 @@
+import uuid
+from datetime import UTC, datetime
+
+import pytest
+import pytest_asyncio
+
+from src.schemas.game import GameDetailsResponse, GameUpdatePayload
+from src.utils.game_states import GameState, GameStateStore, UpdateStatus
+
+AT = datetime(2026, 3, 1, 12, tzinfo=UTC)
+USER_ID = 7
+GAME_ID = 1
+
+
+@pytest_asyncio.fixture
+async def states(redis):
+    states = GameStateStore(f'test:game:{uuid.uuid4().hex}', ttl=60, interval=1, batch_size=10, lock_ttl=5)
+    yield states
+    if keys := await redis.keys(states.key('*')):
+        await redis.delete(*keys)
+
+
+def make_state(version: int = 3) -> GameState:
+    game = GameDetailsResponse(
+        id=GAME_ID,
+        theme_id=2,
+        started_at=AT,
+        points=0,
+        round=30,
+        skip_penalty=True,
+        version=version,
+        info={
+            'teams': [{'name': 'a', 'score': 1}, {'name': 'b', 'score': 0}],
+            'current_team_index': 0,
+            'current_round': 0,
+        },
+        words_guessed=['cats'],
+        words_skipped=[],
+    )
+    return GameState(game=game, user_id=USER_ID, event_seq=0, updated_at=AT, theme_updated_at=None)
+
+
+def turn(guessed: list[str], scores: tuple[int, int] = (2, 0), **fields) -> GameUpdatePayload:
+    teams = [{'name': name, 'score': score} for name, score in zip('ab', scores, strict=True)]
+    return GameUpdatePayload(
+        info={'teams': teams, 'current_team_index': 1, 'current_round': 0},
+        words_guessed=guessed,
+        words_skipped=[],
+        **fields,
+    )
+
+
+class Database:
+    def __init__(self, fail: bool = False):
+        self.saved: list[tuple[int, int]] = []
+        self.fail = fail
+        self.during_save = None
+
+    async def persist(self, states: list[GameState]) -> set[int]:
+        if self.during_save is not None:
+            await self.during_save()
+        if self.fail:
+            raise ConnectionRefusedError
+        self.saved += [(state.game.id, state.game.version) for state in states]
+        return {state.game.id for state in states}
+
+
+@pytest.mark.asyncio
+async def test_updates_are_applied_in_redis(redis, states):
+    assert (await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT))[0] == UpdateStatus.MISSING
+    assert await states.load(redis, make_state())
+    assert not await states.load(redis, make_state(version=0))
+
+    update_status, state = await states.update(redis, USER_ID, GAME_ID, turn(['dogs', 'cats', 'owls'], version=3), AT)
+    assert update_status == UpdateStatus.APPLIED
+    assert state.game.version == 4
+    assert state.game.words_guessed == ['cats', 'dogs', 'owls']
+    assert [team.score for team in state.game.info.teams] == [2, 0]
+    assert state.game.info.current_team_index == 1
+    assert await states.get(redis, USER_ID, GAME_ID) == state
+
+    assert (await states.update(redis, USER_ID, GAME_ID, turn([], version=3), AT))[0] == UpdateStatus.CONFLICT
+    assert (await states.update(redis, USER_ID + 1, GAME_ID, turn([]), AT))[0] == UpdateStatus.MISSING
+    assert await states.get(redis, USER_ID + 1, GAME_ID) is None
+
+
+@pytest.mark.asyncio
+async def test_dirty_games_are_flushed_once(redis, states):
+    await states.load(redis, make_state())
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT)
+
+    database = Database()
+    assert await states.flush(redis, database.persist) == 1
+    assert await states.flush(redis, database.persist) == 0
+    assert database.saved == [(GAME_ID, 4)]
+    # Kept in Redis for the next updates
+    assert await states.get(redis, USER_ID, GAME_ID) is not None
+
+
+@pytest.mark.asyncio
+async def test_dirty_games_do_not_expire(redis, states):
+    async def ttls() -> list[int]:
+        # No words were skipped, so the skipped set doesn't exist
+        return [await redis.ttl(key) for key in states.state_keys(GAME_ID)[:2]]
+
+    await states.load(redis, make_state())
+    assert all(0 < ttl <= 60 for ttl in await ttls())
+
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT)
+    # Postgres may be down for longer than the ttl, the update must not expire before it is saved
+    assert await ttls() == [-1, -1]
+    with pytest.raises(ConnectionRefusedError):
+        await states.flush(redis, Database(fail=True).persist)
+    assert await ttls() == [-1, -1]
+
+    await states.flush(redis, Database().persist)
+    assert all(0 < ttl <= 60 for ttl in await ttls())
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_games_dirty(redis, states):
+    await states.load(redis, make_state())
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT)
+
+    with pytest.raises(ConnectionRefusedError):
+        await states.flush(redis, Database(fail=True).persist)
+
+    database = Database()
+    assert await states.flush(redis, database.persist) == 1
+    assert database.saved == [(GAME_ID, 4)]
+
+
+@pytest.mark.asyncio
+async def test_game_updated_while_flushed_stays_dirty(redis, states):
+    await states.load(redis, make_state())
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT)
+
+    async def update():
+        await states.update(redis, USER_ID, GAME_ID, turn(['owls']), AT)
+
+    database = Database()
+    database.during_save = update
+    await states.flush(redis, database.persist)
+    database.during_save = None
+    await states.flush(redis, database.persist)
+    assert database.saved == [(GAME_ID, 4), (GAME_ID, 5)]
+
+
+@pytest.mark.asyncio
+async def test_lost_state_is_loaded_again(redis, states):
+    await states.load(redis, make_state())
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT)
+    # Redis restarted without the state, the dirty mark survived
+    await redis.delete(*states.state_keys(GAME_ID))
+
+    database = Database()
+    assert await states.flush(redis, database.persist) == 0
+    assert database.saved == []
+    assert await redis.scard(states.key('dirty')) == 0
+
+    assert (await states.update(redis, USER_ID, GAME_ID, turn(['owls']), AT))[0] == UpdateStatus.MISSING
+    await states.load(redis, make_state())
+    _, state = await states.update(redis, USER_ID, GAME_ID, turn(['owls']), AT)
+    assert state.game.words_guessed == ['cats', 'owls']
+
+
+@pytest.mark.asyncio
+async def test_ended_game_is_evicted_once_saved(redis, states):
+    await states.load(redis, make_state())
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs'], ended_at=AT), AT)
+
+    database = Database()
+    await states.flush(redis, database.persist)
+    assert database.saved == [(GAME_ID, 4)]
+    assert await states.get(redis, USER_ID, GAME_ID) is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_not_saved_is_discarded(redis, states):
+    """Postgres has it already, or events were appended to the game meanwhile"""
+    await states.load(redis, make_state())
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT)
+
+    async def persist(batch: list[GameState]) -> set[int]:
+        return set()
+
+    assert await states.flush(redis, persist) == 0
+    assert await states.get(redis, USER_ID, GAME_ID) is None
+    assert await redis.scard(states.key('dirty')) == 0
+
+
+@pytest.mark.asyncio
+async def test_updates_wait_for_eviction(redis, states):
+    await states.load(redis, make_state())
+    await states.update(redis, USER_ID, GAME_ID, turn(['dogs']), AT)
+
+    async def update():
+        assert (await states.update(redis, USER_ID, GAME_ID, turn(['owls']), AT))[0] == UpdateStatus.BUSY
+        assert not await states.evict(redis, GAME_ID, database.persist)
+
+    database = Database()
+    database.during_save = update
+    assert await states.evict(redis, GAME_ID, database.persist)
+    assert database.saved == [(GAME_ID, 4)]
+    assert await states.get(redis, USER_ID, GAME_ID) is None
+    assert await redis.scard(states.key('dirty')) == 0
@@ -0,0 +1,110 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.utils.http_client import OutboundClient
+
+
+def make_client(handler, failure_threshold: int = 2, reset_timeout: float = 30) -> OutboundClient:
+    return OutboundClient(
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        failure_threshold=failure_threshold,
+        reset_timeout=reset_timeout,
+    )
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_consecutive_failures():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503)
+
+    client = make_client(handler)
+
+    for _ in range(2):
+        with pytest.raises(Exception, match='UPSTREAM_ERROR'):
+            await client.post('https://oauth.test/token')
+
+    with pytest.raises(Exception, match='CIRCUIT_OPEN'):
+        await client.post('https://oauth.test/token')
+
+    assert len(calls) == 2
+    assert client.breaker_for('https://oauth.test/token').is_open
+
+
+@pytest.mark.asyncio
+async def test_half_open_trial_closes_circuit():
+    responses = iter([httpx.Response(503), httpx.Response(200, json={'ok': True})])
+    client = make_client(lambda request: next(responses), failure_threshold=1, reset_timeout=0)
+
+    with pytest.raises(Exception, match='UPSTREAM_ERROR'):
+        await client.get('https://oauth.test/certs')
+
+    response = await client.get('https://oauth.test/certs')
+
+    assert response.json() == {'ok': True}
+    assert not client.breaker_for('https://oauth.test/certs').is_open
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('error', [asyncio.CancelledError, ValueError])
+async def test_interrupted_trial_lets_next_one_through(error):
+    def interrupted(request: httpx.Request) -> httpx.Response:
+        raise error
+
+    handlers = iter([lambda request: httpx.Response(503), interrupted, lambda request: httpx.Response(200)])
+    client = make_client(lambda request: next(handlers)(request), failure_threshold=1, reset_timeout=0)
+
+    with pytest.raises(Exception, match='UPSTREAM_ERROR'):
+        await client.get('https://oauth.test/certs')
+    with pytest.raises(error):
+        await client.get('https://oauth.test/certs')
+
+    assert (await client.get('https://oauth.test/certs')).status_code == 200
+    assert not client.breaker_for('https://oauth.test/certs').is_open
+
+
+@pytest.mark.asyncio
+async def test_call_started_before_circuit_opened_does_not_end_trial():
+    started = {path: asyncio.Event() for path in ('/slow', '/trial')}
+    released = {path: asyncio.Event() for path in ('/slow', '/trial')}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path not in started:
+            return httpx.Response(503)
+        started[request.url.path].set()
+        await released[request.url.path].wait()
+        return httpx.Response(503 if request.url.path == '/slow' else 200)
+
+    client = make_client(handler, failure_threshold=1, reset_timeout=0)
+
+    slow = asyncio.create_task(client.get('https://oauth.test/slow'))
+    await started['/slow'].wait()
+    with pytest.raises(Exception, match='UPSTREAM_ERROR'):
+        await client.get('https://oauth.test/fail')
+    trial = asyncio.create_task(client.get('https://oauth.test/trial'))
+    await started['/trial'].wait()
+
+    released['/slow'].set()
+    with pytest.raises(Exception, match='UPSTREAM_ERROR'):
+        await slow
+    with pytest.raises(Exception, match='CIRCUIT_OPEN'):
+        await client.get('https://oauth.test/other')
+
+    released['/trial'].set()
+    assert (await trial).status_code == 200
+    assert not client.breaker_for('https://oauth.test/trial').is_open
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_trip_circuit():
+    client = make_client(lambda request: httpx.Response(400), failure_threshold=1)
+
+    for _ in range(3):
+        response = await client.post('https://oauth.test/token')
+        assert response.status_code == 400
+
+    assert not client.breaker_for('https://oauth.test/token').is_open
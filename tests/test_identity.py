@@ -0,0 +1,52 @@
+import asyncio
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from db import User
+from src.utils.identity import IdentityCache
+
+
+def make_cache(key_prefix: str) -> IdentityCache:
+    return IdentityCache(max_size=10, local_ttl=60, redis_ttl=60, key_prefix=key_prefix)
+
+
+@pytest_asyncio.fixture
+async def workers(redis):
+    """Identity caches of two workers sharing Redis"""
+    key_prefix = f'test:identity:{uuid.uuid4().hex}'
+    caches = [make_cache(key_prefix), make_cache(key_prefix)]
+    for cache in caches:
+        await cache.start(redis)
+    yield caches
+    for cache in caches:
+        await cache.stop()
+        await redis.delete(cache.key(1))
+
+
+@pytest.mark.asyncio
+async def test_identity_is_served_from_both_tiers(redis, workers):
+    first, second = workers
+    await first.set(redis, User(id=1, email='identity@example.com', admin=True))
+
+    user = await second.get(redis, 1)
+    assert (user.id, user.email, user.admin) == (1, 'identity@example.com', True)
+    assert second.local.get(1) is not None
+    assert await first.get(redis, 2) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_every_worker(redis, workers):
+    first, second = workers
+    await first.set(redis, User(id=1, email='identity@example.com', admin=True))
+    await second.get(redis, 1)
+
+    await first.invalidate(redis, 1)
+
+    for _ in range(100):
+        if second.local.get(1) is None:
+            break
+        await asyncio.sleep(0.01)
+    assert await first.get(redis, 1) is None
+    assert await second.get(redis, 1) is None
@@ -0,0 +1,89 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from src.utils.jwks import JWKSCache, parse_max_age
+
+
+def make_jwk(kid: str) -> tuple[dict, rsa.RSAPrivateKey]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update({'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+    return jwk, private_key
+
+
+class LocalJWKSource:
+    """Stand-in for Google's certs endpoint"""
+
+    def __init__(self, *jwks: dict, max_age: int | None = 3600):
+        self.keys = list(jwks)
+        self.max_age = max_age
+        self.calls = 0
+
+    async def fetch(self) -> tuple[dict, int | None]:
+        self.calls += 1
+        return {'keys': self.keys}, self.max_age
+
+
+def test_parse_max_age():
+    assert parse_max_age('public, max-age=19958, must-revalidate, no-transform') == 19958
+    assert parse_max_age('no-cache') is None
+    assert parse_max_age(None) is None
+
+
+@pytest.mark.asyncio
+async def test_keys_are_cached_by_kid():
+    jwk, private_key = make_jwk('k1')
+    source = LocalJWKSource(jwk)
+    cache = JWKSCache(source)
+
+    token = jwt.encode({'sub': '1'}, private_key, algorithm='RS256', headers={'kid': 'k1'})
+    for _ in range(3):
+        key = await cache.get_signing_key_from_jwt(token)
+        assert jwt.decode(token, key.key, algorithms=['RS256']) == {'sub': '1'}
+
+    assert source.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_triggers_single_refetch():
+    jwk1, _ = make_jwk('k1')
+    jwk2, _ = make_jwk('k2')
+    source = LocalJWKSource(jwk1)
+    cache = JWKSCache(source, min_refetch_interval=0)
+
+    await cache.get_signing_key('k1')
+    source.keys.append(jwk2)
+
+    assert (await cache.get_signing_key('k2')).key_id == 'k2'
+    assert source.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refetch_is_rate_limited():
+    jwk, _ = make_jwk('k1')
+    source = LocalJWKSource(jwk)
+    cache = JWKSCache(source, min_refetch_interval=60)
+
+    await cache.get_signing_key('k1')
+    for _ in range(3):
+        with pytest.raises(jwt.PyJWKClientError):
+            await cache.get_signing_key('missing')
+
+    assert source.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_before_expiry_runs_in_background():
+    jwk, _ = make_jwk('k1')
+    source = LocalJWKSource(jwk, max_age=10)
+    cache = JWKSCache(source, refresh_margin=30)
+
+    await cache.get_signing_key('k1')
+    # Still within max-age: served from cache while refresh happens in the background
+    assert (await cache.get_signing_key('k1')).key_id == 'k1'
+    assert source.calls == 1
+
+    await cache._refresh_task
+    assert source.calls == 2
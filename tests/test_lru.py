@@ -0,0 +1,40 @@
+import time
+
+from src.utils.lru import TTLCache
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats.evictions == 1
+
+
+def test_entries_expire(monkeypatch):
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set('short', 1, ttl=5)
+    cache.set('long', 2)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 10)
+
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+    assert len(cache) == 1
+
+
+def test_counts_hits_and_misses():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('b')
+
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    assert cache.stats.as_dict()['hit_ratio'] == 0.5
@@ -0,0 +1,28 @@
+import pytest
+
+from src.utils.ndjson import iter_lines
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+async def collect(data: bytes, chunk_size: int, max_line_size: int = 100) -> list:
+    return [line async for line in iter_lines(chunked(data, chunk_size), max_line_size)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])
+async def test_lines_are_split_across_chunks(chunk_size):
+    data = b'{"a": 1}\n\n{"b": 2}\r\n{"c": 3}'
+
+    assert await collect(data, chunk_size) == [(1, b'{"a": 1}'), (3, b'{"b": 2}\r'), (4, b'{"c": 3}')]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024])
+async def test_long_lines_are_skipped(chunk_size):
+    data = b'short\n' + b'x' * 50 + b'\nlast\n' + b'y' * 50
+
+    assert await collect(data, chunk_size, max_line_size=10) == [(1, b'short'), (2, None), (3, b'last'), (4, None)]
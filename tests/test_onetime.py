@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from src.utils.onetime import MemoryOneTimeBackend, OneTimeStore
+
+
+@pytest.mark.asyncio
+async def test_code_is_consumed_once():
+    store = OneTimeStore(MemoryOneTimeBackend(), 'auth:exchange', ttl=60)
+    code = await store.issue('aux-token')
+
+    assert await store.consume(code) == 'aux-token'
+    assert await store.consume(code) is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_consumers_get_single_value():
+    store = OneTimeStore(MemoryOneTimeBackend(), 'auth:exchange', ttl=60)
+    code = await store.issue('aux-token')
+
+    results = await asyncio.gather(*(store.consume(code) for _ in range(50)))
+
+    assert results.count('aux-token') == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_code_is_rejected():
+    store = OneTimeStore(MemoryOneTimeBackend(), 'oauth:state', ttl=0)
+    code = await store.issue('nonce', code='state')
+
+    assert code == 'state'
+    assert await store.consume(code) is None
+
+
+@pytest.mark.asyncio
+async def test_issue_many():
+    backend = MemoryOneTimeBackend()
+    store = OneTimeStore(backend, 'auth:exchange', ttl=60)
+
+    codes = await store.issue_many(['a', 'b', 'c'])
+
+    assert len(set(codes)) == 3
+    assert set(backend.data) == {f'auth:exchange:{code}' for code in codes}
+    assert [await store.consume(code) for code in codes] == ['a', 'b', 'c']
@@ -0,0 +1,72 @@
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import column, select, table
+from sqlalchemy.dialects import postgresql
+
+from src.utils.pagination import Explain, SortKey, decode_cursor, encode_cursor, keyset_condition
+
+
+def compile_sql(clause) -> str:
+    return str(clause.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+def test_cursor_roundtrip():
+    keys = [SortKey(column('last_played'), nullable=True, value_type=datetime), SortKey(column('id'))]
+    values = [datetime(2026, 1, 2, 3, 4, 5, tzinfo=UTC), 42]
+
+    assert decode_cursor(encode_cursor(values), keys) == values
+    assert decode_cursor(encode_cursor([None, 7]), keys) == [None, 7]
+
+
+@pytest.mark.parametrize('cursor', ['garbage!!', encode_cursor([1, 2, 3]), encode_cursor([])])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [SortKey(column('name'), value_type=str), SortKey(column('id'))])
+
+
+@pytest.mark.parametrize(
+    'values',
+    [['x', 'y'], [1, 1], [None, 1], ['x', True], ['x', 2**40], ['x', 1.5], ['x\x00', 1], [['x'], 1], ['x', '1']],
+)
+def test_cursor_values_must_match_key_types(values):
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(values), [SortKey(column('name'), value_type=str), SortKey(column('id'))])
+
+
+@pytest.mark.parametrize('values', [[7, 1], ['tomorrow', 1]])
+def test_cursor_datetime_must_be_iso_string(values):
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(values), [SortKey(column('at'), value_type=datetime), SortKey(column('id'))])
+
+
+def test_float_key_accepts_integral_values():
+    keys = [SortKey(column('rank'), value_type=float), SortKey(column('id'))]
+
+    assert decode_cursor(encode_cursor([1, 2]), keys) == [1.0, 2]
+
+
+def test_explain_sends_parameters_as_binds():
+    themes = table('themes', column('name'))
+    statement = Explain(select(themes).where(themes.c.name.ilike('%foo :bar%')))
+
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert str(compiled) == (
+        'EXPLAIN (FORMAT JSON) SELECT themes.name \nFROM themes \nWHERE themes.name ILIKE %(name_1)s'
+    )
+    assert compiled.params == {'name_1': '%foo :bar%'}
+
+
+def test_same_direction_uses_row_comparison():
+    keys = [SortKey(column('played_count'), descending=True), SortKey(column('id'), descending=True)]
+
+    assert compile_sql(keyset_condition(keys, [10, 5])) == '(played_count, id) < (10, 5)'
+
+
+def test_nullable_key_places_nulls_last():
+    keys = [SortKey(column('last_played'), nullable=True), SortKey(column('id'))]
+
+    assert compile_sql(keyset_condition(keys, [3, 5])) == (
+        'last_played > 3 OR last_played = 3 AND id > 5 OR last_played IS NULL'
+    )
+    assert compile_sql(keyset_condition(keys, [None, 5])) == 'last_played IS NULL AND id > 5'
@@ -0,0 +1,128 @@
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+from db import Theme
+from src.dal import apply_theme_plays
+from src.utils.play_counters import PlayCounters
+
+PLAYED_AT = datetime(2026, 3, 1, 12, tzinfo=UTC)
+
+
+@pytest_asyncio.fixture
+async def counters(redis):
+    counters = PlayCounters(
+        f'test:plays:{uuid.uuid4().hex}', interval=1, batch_size=10, lock_ttl=5, batch_retention=timedelta(days=1)
+    )
+    yield counters
+    if keys := await redis.keys(counters.key('*')):
+        await redis.delete(*keys)
+
+
+class Database:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.batch_ids = []
+        self.fail = fail
+
+    async def apply(self, batch_id, batch):
+        if self.fail:
+            raise ConnectionRefusedError
+        self.batch_ids.append(batch_id)
+        self.batches.append(batch)
+        return len(batch)
+
+
+@pytest.mark.asyncio
+async def test_plays_are_aggregated(redis, counters):
+    for minutes in (5, 1, 3):
+        await counters.record(redis, 1, PLAYED_AT + timedelta(minutes=minutes))
+    await counters.record(redis, 2, PLAYED_AT)
+
+    database = Database()
+    assert await counters.flush(redis, database.apply) == 2
+    assert database.batches == [[(1, 3, PLAYED_AT + timedelta(minutes=5)), (2, 1, PLAYED_AT)]]
+
+    assert await counters.flush(redis, database.apply) == 0
+    assert len(database.batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_plays(redis, counters):
+    await counters.record(redis, 1, PLAYED_AT)
+
+    with pytest.raises(ConnectionRefusedError):
+        await counters.flush(redis, Database(fail=True).apply)
+    # Played while the batch was pending, goes to the next one
+    await counters.record(redis, 1, PLAYED_AT + timedelta(minutes=1))
+
+    database = Database()
+    await counters.flush(redis, database.apply)
+    await counters.flush(redis, database.apply)
+    assert database.batches == [[(1, 1, PLAYED_AT)], [(1, 1, PLAYED_AT + timedelta(minutes=1))]]
+
+
+@pytest.mark.asyncio
+async def test_one_flush_at_a_time(redis, counters):
+    await counters.record(redis, 1, PLAYED_AT)
+    await redis.set(counters.key('lock'), '1')
+
+    database = Database()
+    assert await counters.flush(redis, database.apply) == 0
+    assert database.batches == []
+
+
+@pytest.mark.asyncio
+async def test_flush_releases_only_its_own_lock(redis, counters):
+    await counters.record(redis, 1, PLAYED_AT)
+    database = Database()
+
+    async def apply_and_lose_lock(batch_id, batch):
+        # The lock expired meanwhile and another worker took it
+        await redis.set(counters.key('lock'), 'other')
+        return await database.apply(batch_id, batch)
+
+    await counters.flush(redis, apply_and_lose_lock)
+    assert await redis.get(counters.key('lock')) == 'other'
+    await redis.delete(counters.key('lock'))
+
+    await counters.record(redis, 1, PLAYED_AT + timedelta(minutes=1))
+    await counters.flush(redis, database.apply)
+    await counters.flush(redis, database.apply)
+    assert database.batches == [[(1, 1, PLAYED_AT)], [(1, 1, PLAYED_AT + timedelta(minutes=1))]]
+    assert database.batch_ids[0] != database.batch_ids[1]
+
+
+@pytest.mark.asyncio
+async def test_retried_batch_is_applied_once(redis, counters):
+    await counters.record(redis, 1, PLAYED_AT)
+    database = Database()
+
+    async def apply_then_fail(batch_id, batch):
+        # Committed, but the worker dies before the batch is removed from Redis
+        await database.apply(batch_id, batch)
+        raise ConnectionResetError
+
+    with pytest.raises(ConnectionResetError):
+        await counters.flush(redis, apply_then_fail)
+    await counters.flush(redis, database.apply)
+
+    assert database.batches == [[(1, 1, PLAYED_AT)]] * 2
+    assert database.batch_ids[0] == database.batch_ids[1]
+    assert await counters.flush(redis, database.apply) == 0
+
+
+@pytest.mark.asyncio
+async def test_applied_batch_is_skipped(db):
+    theme = Theme(name=f'plays test {uuid.uuid4().hex}', played_count=0)
+    db.add(theme)
+    await db.flush()
+    plays, batch_id = [(theme.id, 2, PLAYED_AT)], uuid.uuid4().hex
+
+    assert await apply_theme_plays(db, batch_id, plays, 10, timedelta(days=1)) == 1
+    assert await apply_theme_plays(db, batch_id, plays, 10, timedelta(days=1)) == 0
+
+    await db.refresh(theme)
+    assert (theme.played_count, theme.last_played) == (2, PLAYED_AT)
@@ -0,0 +1,183 @@
+"""
+Query plans of theme and game listings against local Postgres configured in .env, migrated to head.
+Themes and games are seeded and analyzed inside a transaction which is rolled back, so the database is left as is.
+"""
+
+import itertools
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import Select, func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.conf import settings
+from src.dal import User, apply_games_ordering, apply_themes_ordering, get_filtered_games, get_filtered_themes
+from src.schemas.theme import ThemeOrderBy
+from src.utils.pagination import Explain
+
+THEMES = 50_000
+PAGE_SIZE = 50
+LANGUAGES = ['en', 'ru', 'fr', 'de', 'es', 'it', 'pt', 'nl', 'pl', 'tr']
+LISTED_TABLES = {'themes', 'user_to_favourite_themes', 'games'}
+
+USERS = 1000
+GAMES = 100_000
+EMAIL = 'plan-test-{}@example.com'
+
+# Most themes are private drafts, a tenth is public and half of those is verified.
+# First of the users owns a theme in a thousand, every public theme is liked by ten users.
+# Games are spread over users and a hundred themes, one in fifty is in progress.
+SEED = [
+    """
+    INSERT INTO users (email, picture, admin, created_at, updated_at)
+    SELECT replace(:email, '{}', n::text), '', false, now(), now() FROM generate_series(0, :users - 1) n
+    """,
+    """
+    INSERT INTO themes (name, language, description, played_count, last_played, created_by, public, difficulty,
+                        verified, likes_count, created_at, updated_at)
+    SELECT 'plan test theme ' || n, (CAST(:languages AS text[]))[n % 10 + 1], '{}'::jsonb, n % 997,
+           CASE WHEN n % 3 = 0 THEN now() - n * interval '1 minute' END,
+           CASE WHEN n % 1000 = 0 THEN (SELECT id FROM users WHERE email = replace(:email, '{}', '0')) END,
+           n % 10 = 0, n % 5 + 1, n % 20 = 0, n % 101, now(), now()
+    FROM generate_series(1, :themes) n
+    """,
+    """
+    INSERT INTO user_to_favourite_themes (user_id, theme_id)
+    SELECT first_user.id + (themes.id + likes.n) % :users, themes.id
+    FROM themes, generate_series(0, 9) likes(n), (SELECT min(id) AS id FROM users WHERE email LIKE replace(:email, '{}', '%')) first_user
+    WHERE themes.public AND themes.name LIKE 'plan test theme %'
+    """,
+    """
+    INSERT INTO games (theme_id, started_by, started_at, ended_at, info, points, round, skip_penalty,
+                       created_at, updated_at)
+    SELECT first_theme.id + n % 100, first_user.id + n % :users, now(), CASE WHEN n % 50 <> 0 THEN now() END,
+           '{}'::jsonb, 0, 30, n % 2 = 0, now(), now()
+    FROM generate_series(1, :games) n,
+         (SELECT min(id) AS id FROM users WHERE email LIKE replace(:email, '{}', '%')) first_user,
+         (SELECT min(id) AS id FROM themes WHERE name LIKE 'plan test theme %') first_theme
+    """,
+    'ANALYZE themes, users, user_to_favourite_themes, games',
+]
+
+
+async def seed(conn: AsyncConnection) -> User:
+    params = {'email': EMAIL, 'users': USERS, 'themes': THEMES, 'games': GAMES, 'languages': LANGUAGES}
+    for statement in SEED:
+        await conn.execute(text(statement), params)
+    user_id = await conn.scalar(text('SELECT id FROM users WHERE email = :email'), {'email': EMAIL.format(0)})
+    return User(id=user_id, email=EMAIL.format(0), admin=False)
+
+
+@pytest_asyncio.fixture(scope='module', loop_scope='module')
+async def seeded():
+    engine = create_async_engine(
+        f'postgresql+asyncpg://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}'
+    )
+    try:
+        conn = await engine.connect()
+    except OSError as e:
+        await engine.dispose()
+        pytest.skip(f'Postgres is not available: {e}')
+
+    transaction = await conn.begin()
+    try:
+        yield conn, await seed(conn)
+    finally:
+        await transaction.rollback()
+        await conn.close()
+        await engine.dispose()
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+async def explain(conn: AsyncConnection, query: Select) -> list[dict]:
+    plan = await conn.scalar(Explain(query))
+    return list(plan_nodes(plan[0]['Plan']))
+
+
+async def seq_scans(conn: AsyncConnection, query: Select) -> list[str]:
+    return [
+        node['Relation Name']
+        for node in await explain(conn, query)
+        if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in LISTED_TABLES
+    ]
+
+
+# (mine, verified, favourites) as the listing endpoints combine them
+LISTINGS = [(False, True, False), (False, False, False), (True, True, False), (True, False, False), (False, True, True)]
+FILTERS = [(None, None), ('ru', None), ('ru', 3)]
+ORDERS = [order for order in ThemeOrderBy if order != ThemeOrderBy.RELEVANCE]
+
+# Matches a handful of seeded names, both by substring and by words
+SEARCH = 'theme 4242'
+SEARCH_INDEXES = {'ix_themes_name_trgm', 'ix_themes_search'}
+
+
+@pytest.mark.asyncio(loop_scope='module')
+@pytest.mark.parametrize(('mine', 'verified', 'favourites'), LISTINGS)
+async def test_theme_listings_use_indexes(seeded, mine, verified, favourites):
+    conn, user = seeded
+    failures = []
+
+    for language, difficulty in FILTERS:
+        query = await get_filtered_themes(user, language, difficulty, None, mine, verified, favourites)
+        statements = {'count': select(func.count()).select_from(query.subquery())}
+        for order, descending in itertools.product(ORDERS, (False, True)):
+            page = await apply_themes_ordering(query, order, descending)
+            statements[f'page {order=} {descending=}'] = page.limit(PAGE_SIZE)
+
+        for name, statement in statements.items():
+            if tables := await seq_scans(conn, statement):
+                failures.append(f'{name} {language=} {difficulty=}: seq scan on {tables}')
+
+    assert not failures, '\n'.join(failures)
+
+
+@pytest.mark.asyncio(loop_scope='module')
+@pytest.mark.parametrize('order', [ThemeOrderBy.ID, ThemeOrderBy.RELEVANCE])
+async def test_theme_search_uses_search_indexes(seeded, order):
+    conn, user = seeded
+    if not await conn.scalar(text("SELECT to_regclass('ix_themes_name_trgm') IS NOT NULL")):
+        pytest.skip('pg_trgm is not installed')
+    # Nothing but the search narrows listing of an admin
+    admin = User(id=user.id, email=user.email, admin=True)
+    failures = []
+
+    for searcher, (mine, verified, favourites) in [(user, listing) for listing in LISTINGS] + [(admin, LISTINGS[1])]:
+        query = await get_filtered_themes(searcher, None, None, SEARCH, mine, verified, favourites)
+        page = (await apply_themes_ordering(query, order, search=SEARCH)).limit(PAGE_SIZE)
+        label = f'{order=} admin={searcher.admin} {mine=} {verified=} {favourites=}'
+
+        if tables := await seq_scans(conn, page):
+            failures.append(f'{label}: seq scan on {tables}')
+        if searcher.admin and (
+            unused := SEARCH_INDEXES - {node.get('Index Name') for node in await explain(conn, page)}
+        ):
+            failures.append(f'{label}: {unused} not used')
+
+    assert not failures, '\n'.join(failures)
+
+
+@pytest.mark.asyncio(loop_scope='module')
+@pytest.mark.parametrize('ended', [None, True, False])
+async def test_game_listings_use_indexes(seeded, ended):
+    conn, user = seeded
+    theme_id = await conn.scalar(text("SELECT min(id) FROM themes WHERE name LIKE 'plan test theme %'"))
+    failures = []
+
+    for theme in (None, theme_id):
+        query = await get_filtered_games(user, theme, ended)
+        statements = {'count': select(func.count()).select_from(query.subquery())}
+        for descending in (False, True):
+            page = await apply_games_ordering(query, descending=descending)
+            statements[f'page {descending=}'] = page.limit(PAGE_SIZE)
+
+        for name, statement in statements.items():
+            if tables := await seq_scans(conn, statement):
+                failures.append(f'{name} {theme=}: seq scan on {tables}')
+
+    assert not failures, '\n'.join(failures)
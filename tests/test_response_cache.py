@@ -0,0 +1,122 @@
+import asyncio
+import uuid
+
+import pytest
+
+from db import Theme, User
+from src.api.theme import PUBLIC_SCOPE, themes_list_scope, user_scope
+from src.utils.response_cache import ListingCache, themes_list_cache
+
+
+class DictRedis:
+    """Subset of Redis commands used by ListingCache, TTLs are ignored"""
+
+    def __init__(self):
+        self.data: dict[str, str] = {}
+        self.reads = 0
+
+    async def get(self, key):
+        self.reads += 1
+        return self.data.get(key)
+
+    async def mget(self, *keys):
+        self.reads += 1
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+
+
+class PageSource:
+    def __init__(self, delay: float = 0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f'page-{self.calls}'
+
+
+@pytest.mark.asyncio
+async def test_page_is_served_from_cache():
+    cache, redis, source = ListingCache('test:list', ttl=60), DictRedis(), PageSource()
+
+    assert await cache.get_or_set(redis, 'public', {'page': 1}, source) == 'page-1'
+    assert await cache.get_or_set(redis, 'public', {'page': 1}, source) == 'page-1'
+    assert await cache.get_or_set(redis, 'public', {'page': 2}, source) == 'page-2'
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_hit_is_a_single_read():
+    cache, redis, source = ListingCache('test:list', ttl=60), DictRedis(), PageSource()
+    await cache.get_or_set(redis, 'public', {}, source)
+
+    redis.reads = 0
+    assert await cache.get_or_set(redis, 'public', {}, source) == 'page-1'
+    assert redis.reads == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bumps_version():
+    cache, redis, source = ListingCache('test:list', ttl=60), DictRedis(), PageSource()
+    await cache.get_or_set(redis, 'public', {}, source)
+    await cache.get_or_set(redis, 'user:1', {}, source)
+
+    await cache.invalidate(redis, 'user:1')
+    assert await cache.get_or_set(redis, 'public', {}, source) == 'page-1'
+    assert await cache.get_or_set(redis, 'user:1', {}, source) == 'page-3'
+
+    await cache.invalidate(redis)
+    assert await cache.get_or_set(redis, 'public', {}, source) == 'page-4'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_page_once():
+    cache, redis, source = ListingCache('test:list', ttl=60), DictRedis(), PageSource(delay=0.1)
+
+    pages = await asyncio.gather(*(cache.get_or_set(redis, 'public', {}, source) for _ in range(10)))
+
+    assert pages == ['page-1'] * 10
+    assert source.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_verified_private_themes_keep_listing_out_of_shared_scope(db):
+    redis = DictRedis()
+    user = User(email=f'{uuid.uuid4().hex}@scope.test')
+    db.add(user)
+    await db.flush()
+    assert await themes_list_scope(db, redis, user, mine=False, verified=True, favourites=False) == PUBLIC_SCOPE
+
+    db.add(Theme(name=f'scope test {uuid.uuid4().hex}', created_by=user.id, verified=True, public=False))
+    await db.flush()
+    await themes_list_cache.invalidate(redis)
+    assert await themes_list_scope(db, redis, user, mine=False, verified=True, favourites=False) == user_scope(user)
+
+
+@pytest.mark.asyncio
+async def test_shared_scope_is_decided_without_database_on_hit(db):
+    redis = DictRedis()
+    user = User(email=f'{uuid.uuid4().hex}@scope.test')
+    db.add(user)
+    await db.flush()
+    await themes_list_scope(db, redis, user, mine=False, verified=True, favourites=False)
+
+    # Cached flag is served until theme changes invalidate the listings
+    db.add(Theme(name=f'scope test {uuid.uuid4().hex}', created_by=user.id, verified=True, public=False))
+    await db.flush()
+    assert await themes_list_scope(db, redis, user, mine=False, verified=True, favourites=False) == PUBLIC_SCOPE
@@ -0,0 +1,59 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import Theme, User
+from src.dal import apply_themes_ordering, get_filtered_themes, intern_words
+from src.schemas.theme import ThemeOrderBy
+
+ADMIN = User(id=0, email='search-test@example.com', admin=True)
+
+
+async def seed_themes(db: AsyncSession) -> str:
+    """Themes named with a unique prefix, so that searches can be limited to them"""
+    prefix = f'search test {uuid.uuid4().hex}'
+    themes = {'Animals': ['cats', 'dogs'], 'Food': ['apple', 'baking'], 'Cats': ['tiger', 'lion']}
+    for name, words in themes.items():
+        db.add(Theme(name=f'{prefix} {name}', language='en', word_ids=await intern_words(db, words)))
+    await db.flush()
+    return prefix
+
+
+async def search(
+    db: AsyncSession, prefix: str, name: str, order: ThemeOrderBy = ThemeOrderBy.NAME, language: str | None = None
+) -> list[str]:
+    query = await get_filtered_themes(ADMIN, language, None, name, mine=False, verified=False, favourites=False)
+    query = await apply_themes_ordering(
+        query.where(Theme.name.startswith(prefix)), order, search=name, language=language
+    )
+    return [
+        theme_name.removeprefix(f'{prefix} ') for theme_name in (await db.scalars(query.with_only_columns(Theme.name)))
+    ]
+
+
+@pytest.mark.asyncio
+async def test_name_search_matches_name_substring_and_words(db):
+    prefix = await seed_themes(db)
+
+    assert await search(db, prefix, 'NIMAL') == ['Animals']
+    assert await search(db, prefix, 'apple') == ['Food']
+    assert await search(db, prefix, 'cats') == ['Animals', 'Cats']
+    # Query is stemmed only when its language is known
+    assert await search(db, prefix, 'bakes', language='en') == ['Food']
+    assert await search(db, prefix, 'bakes') == []
+    # LIKE wildcards are matched literally
+    assert await search(db, prefix, '%') == []
+    assert await search(db, prefix, '_nimals') == []
+
+
+@pytest.mark.asyncio
+async def test_relevance_puts_name_matches_first(db):
+    if not await db.scalar(text("SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')")):
+        pytest.skip('pg_trgm is not installed')
+    prefix = await seed_themes(db)
+
+    assert await search(db, prefix, 'cats', ThemeOrderBy.RELEVANCE) == ['Cats', 'Animals']
+    assert await search(db, prefix, 'cats', ThemeOrderBy.ID) == ['Animals', 'Cats']
+    assert await search(db, prefix, 'lion', ThemeOrderBy.RELEVANCE) == ['Cats']
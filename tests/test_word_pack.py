@@ -0,0 +1,54 @@
+import gzip
+import json
+from datetime import UTC, datetime, timedelta
+
+import brotli
+import msgpack
+import pytest
+
+from src.utils.word_pack import PackFormat, WordPackCache, choose_encoding
+
+DESCRIPTION = {'words': [f'слово {i}' for i in range(200)], 'teams': [f'team {i}' for i in range(10)]}
+UPDATED_AT = datetime(2026, 3, 1, tzinfo=UTC)
+
+
+@pytest.mark.parametrize(
+    ('accept_encoding', 'expected'),
+    [
+        (None, 'identity'),
+        ('gzip, deflate', 'gzip'),
+        ('gzip;q=0.5, br', 'br'),
+        ('br;q=0.2, gzip;q=0.8', 'gzip'),
+        ('*', 'br'),
+        ('gzip;q=0, identity', 'identity'),
+        ('zstd', 'identity'),
+        ('gzip, identity;q=0', 'gzip'),
+        ('gzip;q=0, identity;q=0', None),
+        ('*;q=0', None),
+        ('gzip, *;q=0', 'gzip'),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding, ['identity', 'gzip', 'br']) == expected
+
+
+def test_pack_is_built_once_per_content():
+    cache = WordPackCache(max_size=10, ttl=60)
+    pack = cache.put(1, UPDATED_AT, DESCRIPTION)
+
+    assert cache.get(1, UPDATED_AT) is pack
+    assert cache.get(1, UPDATED_AT + timedelta(seconds=1)) is None
+    # Counters changed, content didn't
+    assert cache.put(1, UPDATED_AT + timedelta(seconds=1), DESCRIPTION) is pack
+    assert cache.put(1, UPDATED_AT + timedelta(seconds=2), DESCRIPTION | {'teams': []}) is not pack
+
+
+def test_encodings_share_content():
+    pack = WordPackCache(max_size=10, ttl=60).put(1, UPDATED_AT, DESCRIPTION)
+    body = pack.bodies[PackFormat.JSON, 'identity']
+
+    assert json.loads(body) == DESCRIPTION
+    assert gzip.decompress(pack.bodies[PackFormat.JSON, 'gzip']) == body
+    assert len(pack.bodies[PackFormat.JSON, 'gzip']) < len(body)
+    assert brotli.decompress(pack.bodies[PackFormat.JSON, 'br']) == body
+    assert msgpack.unpackb(pack.bodies[PackFormat.MSGPACK, 'identity']) == DESCRIPTION
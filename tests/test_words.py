@@ -0,0 +1,41 @@
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import Word
+from src.dal import intern_words, word_ids_cache
+
+
+async def committed_count(db: AsyncSession, words: list[str]) -> int:
+    """Words seen by another connection"""
+    async with db.bind.engine.connect() as conn:
+        return await conn.scalar(select(func.count()).where(Word.word.in_(words)))
+
+
+@pytest.mark.asyncio
+async def test_words_are_added_in_the_caller_transaction(db):
+    words = [f'intern test {uuid.uuid4().hex}' for _ in range(2)]
+
+    ids = await intern_words(db, [words[0], words[1], words[0]])
+    assert ids[0] == ids[2] != ids[1]
+    assert await intern_words(db, words) == ids[:2]
+    # Nothing is committed on behalf of the caller
+    assert db.in_transaction()
+    assert await committed_count(db, words) == 0
+    assert [word_ids_cache.get(word) for word in words] == [None, None]
+
+    await db.rollback()
+    assert [word_ids_cache.get(word) for word in words] == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_added_words_are_cached_once_committed(db):
+    words = [f'intern test {uuid.uuid4().hex}']
+
+    ids = await intern_words(db, words)
+    await db.commit()
+
+    assert [word_ids_cache.get(word) for word in words] == ids
+    assert await intern_words(db, words) == ids